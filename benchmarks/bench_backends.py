@@ -0,0 +1,63 @@
+# dict and SQLite backends side by side: bulk insert, id lookups and reports
+#   python -m benchmarks.bench_backends --size 1000000
+import argparse
+import contextlib
+import os
+import random
+import tempfile
+import time
+
+from inventory_management_search_optimized import Inventory
+from inventory_management_sqlite import SqliteInventory
+from benchmarks.synthetic import make_products, make_keywords
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    lookup_ids = ["SKU{0}".format(rng.randrange(args.size)) for _ in range(args.lookups)]
+    keywords = make_keywords(count=5)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, \
+            open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        json_path = os.path.join(tmp, "backup.json")
+        source = Inventory(load_from_backup=False, data_filepath=json_path)
+        for product in make_products(args.size):
+            source.add_item(product)
+        source.save_data()
+        del source
+
+        backends = [
+            ("dict", lambda: Inventory(load_from_backup=False, data_filepath=json_path)),
+            ("sqlite", lambda: SqliteInventory(os.path.join(tmp, "inventory.db"),
+                                               data_filepath=json_path)),
+        ]
+        for label, create in backends:
+            inventory = create()
+            results += [
+                (label, "bulk insert (load_data)", timed(inventory.load_data)),
+                (label, "{0} lookups".format(args.lookups),
+                 timed(lambda: [inventory.search_by_id(id) for id in lookup_ids])),
+                (label, "keyword search x5", timed(
+                    lambda: [inventory.search_everywhere_by_keyboard(kw) for kw in keywords])),
+                (label, "low stock items", timed(inventory.low_stock_items)),
+                (label, "generate_report", timed(inventory.generate_report)),
+            ]
+            inventory.close()
+
+    print("{: <10} {: <24} {: <12}".format("Backend", "Operation", "Time (s)"))
+    for label, operation, seconds in results:
+        print("{: <10} {: <24} {: <12.3f}".format(label, operation, seconds))
+
+if __name__ == "__main__":
+    main()
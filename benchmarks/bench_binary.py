@@ -0,0 +1,65 @@
+# Load time of the binary snapshot against the JSON backup
+#   python -m benchmarks.bench_binary --sizes 10000 100000 1000000
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+
+from inventory_management_search_optimized import Inventory
+from benchmarks.synthetic import make_products
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print("{: <10} {: <28} {: <12} {: <10}".format(
+        "Products", "Mode", "Time (s)", "File (MB)"))
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            json_path = os.path.join(tmp, "backup.json")
+            binary_path = os.path.join(tmp, "backup.bin")
+            inventory = Inventory(load_from_backup=False, data_filepath=json_path)
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                for product in make_products(size):
+                    inventory.add_item(product)
+                inventory.save_data()
+            inventory.save_binary(binary_path)
+            lookup_id = "SKU{0}".format(size // 2)
+
+            def json_load():
+                loaded = Inventory(load_from_backup=False, data_filepath=json_path)
+                loaded.load_data()
+                assert loaded.search_by_id(lookup_id)
+
+            def binary_lookup():
+                loaded = Inventory(load_from_backup=False)
+                loaded.load_binary(binary_path)
+                assert loaded.search_by_id(lookup_id)
+
+            def binary_full():
+                loaded = Inventory(load_from_backup=False)
+                loaded.load_binary(binary_path, lazy=False)
+                assert loaded.search_by_id(lookup_id)
+
+            json_mb = os.path.getsize(json_path) / 2**20
+            binary_mb = os.path.getsize(binary_path) / 2**20
+            for label, function, file_mb in (
+                    ("load_data (JSON)", json_load, json_mb),
+                    ("load_binary + lookup", binary_lookup, binary_mb),
+                    ("load_binary, lazy=False", binary_full, binary_mb)):
+                print("{: <10} {: <28} {: <12.3f} {: <10.1f}".format(
+                    size, label, timed(function), file_mb))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Rows/sec of add_items against calling add_item once per row. add_items leaves keyword
+# indexing to the next search, the last line includes that first search.
+#   python -m benchmarks.bench_bulk --rows 1000000 [--journal]
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+
+from inventory_management_search_optimized import Inventory, Product
+from benchmarks.synthetic import make_products
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--journal", action="store_true",
+                        help="journal every mutation, as the CLI does")
+    args = parser.parse_args()
+    tmp = tempfile.TemporaryDirectory()
+
+    def new_inventory():
+        return Inventory(load_from_backup=False, journal=args.journal,
+                         data_filepath=os.path.join(tmp.name, "backup.json"),
+                         compact_every=args.rows + 10)
+
+    rows = [(p.id, p.name, p.price, p.quantity) for p in make_products(args.rows)]
+    columns = [list(column) for column in zip(*rows)]
+
+    def per_item():
+        inventory = new_inventory()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for row in rows:
+                inventory.add_item(Product(*row))
+
+    def bulk_rows():
+        new_inventory().add_items(rows, alerts=False)
+
+    def bulk_columns():
+        new_inventory().add_items(
+            ids=columns[0], names=columns[1], prices=columns[2], quantities=columns[3],
+            alerts=False)
+
+    def bulk_then_search():
+        inventory = new_inventory()
+        inventory.add_items(rows, alerts=False)
+        inventory.search_everywhere_by_keyboard("phone")
+
+    print("{: <28} {: <12} {: <12}".format("Mode", "Time (s)", "Rows/sec"))
+    for label, function in (("add_item loop", per_item), ("add_items (rows)", bulk_rows),
+                            ("add_items (columns)", bulk_columns),
+                            ("add_items + first search", bulk_then_search)):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        print("{: <28} {: <12.3f} {: <12.0f}".format(label, elapsed, args.rows / elapsed))
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Mutations/sec under each journal durability level, and how long the last records of a
+# burst stay unsynced once writes stop (the idle tail)
+#   python -m benchmarks.bench_durability --mutations 20000
+import argparse
+import os
+import tempfile
+import time
+
+from inventory_management_search_optimized import Inventory, Product
+
+LEVELS = [
+    ("no journal", dict(journal=False)),
+    ("flush only", dict(journal=True)),
+    ("fsync every 100", dict(journal=True, fsync_every=100)),
+    ("fsync every 10ms", dict(journal=True, fsync_interval_ms=10)),
+    ("fsync every op", dict(journal=True, fsync_every=1)),
+]
+
+
+# Milliseconds until the records left by a burst are fsynced, None if they never are
+def idle_tail_ms(inventory, limit=1.0):
+    start = time.perf_counter()
+    while time.perf_counter() - start < limit:
+        if not inventory._unsynced:
+            return (time.perf_counter() - start) * 1000
+        time.sleep(0.001)
+    return None
+
+
+def mutations_per_second(options, mutations, products=1000):
+    with tempfile.TemporaryDirectory() as tmp:
+        inventory = Inventory(load_from_backup=False,
+                              data_filepath=os.path.join(tmp, "backup.json"),
+                              compact_every=mutations + 10, **options)
+        for i in range(products):
+            inventory.add_item(Product("SKU{0}".format(i), "Phone", 100.0, 10))
+        start = time.perf_counter()
+        for i in range(mutations):
+            inventory.update_item(
+                Product("SKU{0}".format(i % products), "Phone", 100.0, 10 + i % 50))
+        elapsed = time.perf_counter() - start
+        tail = idle_tail_ms(inventory)
+        inventory.close()
+    return mutations / elapsed, tail
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mutations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    print("{: <20} {: <15} {: <20}".format("Durability", "Mutations/sec", "Idle tail synced"))
+    for label, options in LEVELS:
+        rate, tail = mutations_per_second(options, args.mutations)
+        print("{: <20} {: <15.0f} {: <20}".format(
+            label, rate, "-" if not options["journal"] else
+            "never" if tail is None else "after {0:.1f} ms".format(tail)))
+
+
+if __name__ == "__main__":
+    main()
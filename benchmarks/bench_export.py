@@ -0,0 +1,56 @@
+# Peak memory and MB/s of the streaming export against the old DataFrame build
+#   python -m benchmarks.bench_export --size 1000000
+import argparse
+import contextlib
+import importlib.util
+import os
+import tempfile
+import time
+import tracemalloc
+
+from inventory_management_search_optimized import Inventory
+from benchmarks.synthetic import make_products
+
+
+# export_to_excel as it was: list of dicts -> DataFrame -> CSV
+def dataframe_export(inventory, filepath):
+    import pandas as pd
+    excel_data = pd.DataFrame.from_records([product.to_dict() for product in inventory.items.values()])
+    excel_data.to_csv(filepath, index=False, header=["ID", "Name", "Price", "Quantity"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    inventory = Inventory(load_from_backup=False)
+    inventory.add_items(make_products(args.size), alerts=False)
+    import pandas  # noqa: F401  Imported up front so it isn't counted in the timings
+
+    with tempfile.TemporaryDirectory() as tmp:
+        modes = [("DataFrame (old)", "old.csv",
+                  lambda path: dataframe_export(inventory, path)),
+                 ("streaming csv", "new.csv", inventory.export),
+                 ("streaming csv.gz", "new.csv.gz", inventory.export)]
+        if importlib.util.find_spec("pyarrow"):
+            modes.append(("streaming parquet", "new.parquet", inventory.export))
+
+        print("{: <20} {: <10} {: <10} {: <16}".format(
+            "Mode", "Time (s)", "MB/s", "Peak alloc (MB)"))
+        for label, filename, export in modes:
+            path = os.path.join(tmp, filename)
+            tracemalloc.start()
+            start = time.perf_counter()
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                export(path)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            megabytes = os.path.getsize(path) / 2**20
+            print("{: <20} {: <10.3f} {: <10.1f} {: <16.1f}".format(
+                label, elapsed, megabytes / elapsed, peak / 2**20))
+
+
+if __name__ == "__main__":
+    main()
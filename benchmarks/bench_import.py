@@ -0,0 +1,43 @@
+# Rows/sec of import_file on a CSV written by export
+#   python -m benchmarks.bench_import --rows 1000000
+import argparse
+import os
+import tempfile
+import time
+
+from inventory_management_search_optimized import (Inventory, read_product_chunks,
+                                                    validate_frame)
+from benchmarks.synthetic import make_products
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "export.csv")
+        source = Inventory(load_from_backup=False)
+        source.add_items(make_products(args.rows), alerts=False)
+        source.export(path)
+        del source
+        import pandas  # noqa: F401  Imported up front so it isn't counted in the timings
+
+        start = time.perf_counter()
+        rows = 0
+        for first_line, frame in read_product_chunks(path):
+            columns, _ = validate_frame(frame, first_line)
+            rows += len(columns[0])
+        read_validate = time.perf_counter() - start
+
+        start = time.perf_counter()
+        Inventory(load_from_backup=False).import_file(path)
+        full = time.perf_counter() - start
+
+    print("{: <28} {: <12} {: <12}".format("Stage", "Time (s)", "Rows/sec"))
+    print("{: <28} {: <12.3f} {: <12.0f}".format("read + validate", read_validate, rows / read_validate))
+    print("{: <28} {: <12.3f} {: <12.0f}".format("import_file (with indexes)", full, rows / full))
+
+
+if __name__ == "__main__":
+    main()
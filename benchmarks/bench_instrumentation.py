@@ -0,0 +1,65 @@
+# Cost of instrumentation: the same Zipf-skewed workload on a plain Inventory, one with
+# instrument=True and one that also samples every 100th call with cProfile.
+# Rounds are interleaved and the best round of each kept, so noise hits all alike.
+#   python -m benchmarks.bench_instrumentation --size 100000 --ops 20000 --rounds 5
+import argparse
+import time
+
+from inventory_management_search_optimized import Inventory, Product
+from benchmarks.synthetic import SEARCH_TERMS, make_products, zipf_choices
+
+MODES = ["off", "instrument", "instrument + profile"]
+
+
+def make_inventory(mode, rows):
+    inventory = Inventory(load_from_backup=False, instrument=(mode != "off"))
+    inventory.low_stock_listeners = []
+    inventory.add_items(rows, alerts=False)
+    if mode == "instrument + profile":
+        for name in ("search_by_id", "update_item", "search_everywhere_by_keyboard"):
+            inventory.profile(name, every=100)
+    return inventory
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--ops", type=int, default=20_000)
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = [(p.id, p.name, p.price, p.quantity) for p in make_products(args.size)]
+    by_id = {row[0]: row for row in rows}
+    ids = zipf_choices(by_id, args.ops)
+    updates = [Product(*by_id[id][:3], n % 500) for n, id in enumerate(ids)]
+    keywords = zipf_choices(SEARCH_TERMS, args.searches)
+    workload = {
+        "search_by_id": lambda inventory: [inventory.search_by_id(id) for id in ids],
+        "update_item": lambda inventory: [inventory.update_item(p) for p in updates],
+        "search_everywhere_by_keyboard": lambda inventory: [
+            inventory.search_everywhere_by_keyboard(keyword) for keyword in keywords],
+    }
+    calls = {"search_by_id": len(ids), "update_item": len(updates),
+             "search_everywhere_by_keyboard": len(keywords)}
+
+    inventories = {mode: make_inventory(mode, rows) for mode in MODES}
+    best = {(mode, operation): float("inf") for mode in MODES for operation in workload}
+    for _ in range(args.rounds):
+        for operation, run in workload.items():
+            for mode, inventory in inventories.items():
+                start = time.perf_counter()
+                run(inventory)
+                best[mode, operation] = min(best[mode, operation], time.perf_counter() - start)
+
+    print("{: <30} {: <22} {: <14} {: <10}".format("Operation", "Mode", "Ops/s", "Overhead"))
+    for operation in workload:
+        for mode in MODES:
+            seconds = best[mode, operation]
+            print("{: <30} {: <22} {: <14.0f} {: <10}".format(
+                operation, mode, calls[operation] / seconds,
+                "{0:+.1%}".format(seconds / best["off", operation] - 1)))
+
+
+if __name__ == "__main__":
+    main()
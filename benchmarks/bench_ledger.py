@@ -0,0 +1,82 @@
+# Movement ledger at scale: ingest rate of synthetic movements (Zipf-skewed products, one
+# per second of simulated time), then latency of time-range, per-product and rollup queries.
+# The default of 100M movements needs about 3 GB, pass --movements to run smaller:
+#   python -m benchmarks.bench_ledger --movements 100000000 --products 100000
+import argparse
+import os
+import random
+import tempfile
+import time
+from itertools import accumulate
+
+from inventory_management_ledger import MovementLedger
+from inventory_management_search_optimized import LatencyHistogram
+
+REASONS = ["sale", "sale", "sale", "receive", "return", "adjust"]
+CHUNK = 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--movements", type=int, default=100_000_000)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--window", type=int, default=3600, help="seconds per range query")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    ids = ["P{0}".format(n) for n in range(args.products)]
+    # Zipf weights over ids in order, so ids[:10] are the busiest products
+    cum_weights = list(accumulate(1 / rank ** 1.1 for rank in range(1, len(ids) + 1)))
+    ledger = MovementLedger()
+    random.seed(args.seed)
+    elapsed = 0.0
+    for offset in range(0, args.movements, CHUNK):
+        count = min(CHUNK, args.movements - offset)
+        products = random.choices(ids, cum_weights=cum_weights, k=count)
+        reasons = [random.choice(REASONS) for _ in range(count)]
+        deltas = [-1 if reason == "sale" else random.randint(1, 20) for reason in reasons]
+        append = ledger.append
+        start = time.perf_counter()
+        for row, (product_id, delta, reason) in enumerate(zip(products, deltas, reasons)):
+            append(product_id, delta, reason, float(offset + row))
+        elapsed += time.perf_counter() - start
+    print("{: <34} {: <14.0f}".format("ingest (movements/s)", args.movements / elapsed))
+
+    hot = ids[:10]
+    starts = [random.randrange(max(1, args.movements - args.window)) for _ in range(args.queries)]
+    queries = {
+        "balance": lambda n: ledger.balance(ids[n % len(ids)]),
+        "movements, all products": lambda n: sum(
+            1 for _ in ledger.movements(start=starts[n], end=starts[n] + args.window)),
+        "movements, hot product": lambda n: sum(
+            1 for _ in ledger.movements(hot[n % len(hot)], starts[n], starts[n] + args.window)),
+        "rollup, hot product (all time)": lambda n: ledger.rollup(hot[n % len(hot)]),
+        "rollups, all products": lambda n: ledger.rollups(starts[n], starts[n] + args.window),
+    }
+    print("{: <34} {: <14} {: <10} {: <10}".format("Query", "Ops/s", "p50 (ms)", "p99 (ms)"))
+    for name, query in queries.items():
+        histogram = LatencyHistogram()
+        for n in range(args.queries):
+            start = time.perf_counter()
+            query(n)
+            histogram.record(time.perf_counter() - start)
+        stats = histogram.to_dict()
+        print("{: <34} {: <14.0f} {: <10.3f} {: <10.3f}".format(
+            name, stats["count"] / histogram.total, stats["p50_ms"], stats["p99_ms"]))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ledger.bin")
+        start = time.perf_counter()
+        ledger.save(path)
+        saved = time.perf_counter() - start
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        MovementLedger.load(path)
+        loaded = time.perf_counter() - start
+    print("save {0:.2f}s, load {1:.2f}s, {2:.1f} bytes/movement".format(
+        saved, loaded, size / args.movements))
+
+
+if __name__ == "__main__":
+    main()
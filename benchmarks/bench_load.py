@@ -0,0 +1,71 @@
+# Startup time and peak RSS of the backup loaders at several file sizes
+#   python -m benchmarks.bench_load --sizes 10000 100000 1000000
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from inventory_management_search_optimized import Inventory, Product
+from benchmarks.synthetic import make_products
+
+MODES = ["json.load", "streaming", "lazy lookup"]
+
+
+def write_backup(path, size):
+    inventory = Inventory(load_from_backup=False, data_filepath=path)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for product in make_products(size):
+            inventory.add_item(product)
+        inventory.save_data()
+
+
+# Runs in a fresh interpreter so ru_maxrss only covers this one load
+def child(mode, path, lookup_id):
+    start = time.perf_counter()
+    inventory = Inventory(load_from_backup=False, data_filepath=path)
+    if mode == "json.load":
+        # load_data as it was before streaming: whole document parsed first
+        with open(path) as file:
+            for key, value in json.load(file).items():
+                inventory._store(key, Product(**value))
+    else:
+        inventory.load_data(lazy=(mode == "lazy lookup"))
+    assert inventory.search_by_id(lookup_id)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"seconds": elapsed, "peak_rss_mb": peak_kb / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(*args.child)
+
+    print("{: <10} {: <10} {: <14} {: <12} {: <14}".format(
+        "Products", "File (MB)", "Mode", "Time (s)", "Peak RSS (MB)"))
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = os.path.join(tmp, "backup_{0}.json".format(size))
+            write_backup(path, size)
+            file_mb = os.path.getsize(path) / 2**20
+            for mode in MODES:
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_load", "--child",
+                     mode, path, "SKU{0}".format(size // 100)],
+                    check=True, capture_output=True, text=True).stdout
+                result = json.loads(output.splitlines()[-1])
+                print("{: <10} {: <10.1f} {: <14} {: <12.3f} {: <14.1f}".format(
+                    size, file_mb, mode, result["seconds"], result["peak_rss_mb"]))
+
+
+if __name__ == "__main__":
+    main()
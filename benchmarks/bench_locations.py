@@ -0,0 +1,68 @@
+# Multi-location stock: per-cell updates and transfers through Inventory and on the bare
+# LocationStock, then per-location rollups and low-stock scans over every location.
+# The matrix takes size x locations x 8 bytes (800 MB for the example below):
+#   python -m benchmarks.bench_locations --size 100000 --locations 1000
+import argparse
+import random
+import time
+
+from inventory_management_search_optimized import Inventory, LatencyHistogram
+from benchmarks.synthetic import make_products, zipf_choices
+
+
+def per_call(label, calls):
+    histogram = LatencyHistogram()
+    for call in calls:
+        start = time.perf_counter()
+        call()
+        histogram.record(time.perf_counter() - start)
+    stats = histogram.to_dict()
+    print("{: <34} {: <14.0f} {: <10.4f} {: <10.4f}".format(
+        label, stats["count"] / histogram.total, stats["p50_ms"], stats["p99_ms"]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--locations", type=int, default=100)
+    parser.add_argument("--ops", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rows = [(p.id, p.name, p.price, p.quantity) for p in make_products(args.size, args.seed)]
+    locations = ["WH{0}".format(n) for n in range(args.locations)]
+    start = time.perf_counter()
+    inventory = Inventory(load_from_backup=False, locations=locations)
+    inventory.low_stock_listeners = inventory.location_low_stock_listeners = []
+    inventory.add_items(rows, alerts=False)
+    print("load {0} products x {1} locations: {2:.2f}s".format(
+        args.size, args.locations, time.perf_counter() - start))
+
+    rng = random.Random(args.seed)
+    ids = zipf_choices([row[0] for row in rows], args.ops, seed=args.seed)
+    places = [rng.choice(locations) for _ in range(args.ops)]
+    stock = inventory.stock
+    print("{: <34} {: <14} {: <10} {: <10}".format("Operation", "Ops/s", "p50 (ms)", "p99 (ms)"))
+    per_call("LocationStock.set", [
+        lambda id=id, place=place, n=n: stock.set(id, place, n % 50)
+        for n, (id, place) in enumerate(zip(ids, places))])
+    per_call("Inventory.set_stock", [
+        lambda id=id, place=place, n=n: inventory.set_stock(id, place, n % 50)
+        for n, (id, place) in enumerate(zip(ids, places))])
+    per_call("Inventory.transfer_stock", [
+        lambda id=id, place=place: inventory.transfer_stock(
+            id, locations[0], place, 1) if stock.quantity(id, locations[0]) else None
+        for id, place in zip(ids, places) if place != locations[0]])
+    per_call("LocationStock.total (per product)", [lambda id=id: stock.total(id) for id in ids])
+
+    start = time.perf_counter()
+    rollup = stock.rollup()
+    print("rollup of {0} locations: {1:.3f}s".format(len(rollup), time.perf_counter() - start))
+    start = time.perf_counter()
+    for location in locations:
+        stock.low_stock(location, inventory.low_alert_threshold)
+    print("low stock scan of every location: {0:.3f}s".format(time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
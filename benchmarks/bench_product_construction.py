@@ -0,0 +1,50 @@
+# Products built per second through the validating constructor and the trusted paths,
+# and load_data of the same snapshot with and without a matching checksum
+#   python -m benchmarks.bench_product_construction --size 1000000
+import argparse
+import os
+import tempfile
+import time
+
+from inventory_management_search_optimized import CHECKSUM_SUFFIX, Inventory, Product
+from benchmarks.synthetic import make_products
+
+
+def per_second(function, count):
+    start = time.perf_counter()
+    function()
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rows = [(p.id, p.name, p.price, p.quantity) for p in make_products(args.size)]
+    constructors = {
+        "Product(...)": lambda: [Product(*row) for row in rows],
+        "Product.trusted": lambda: [Product.trusted(*row) for row in rows],
+        "Product.trusted_many": lambda: Product.trusted_many(rows),
+    }
+    print("{: <28} {: <14}".format("Path", "Products/s"))
+    for label, construct in constructors.items():
+        print("{: <28} {: <14.0f}".format(label, per_second(construct, len(rows))))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "backup.json")
+        inventory = Inventory(load_from_backup=False, data_filepath=path)
+        inventory.low_stock_listeners = []
+        inventory.add_items(rows, alerts=False)
+        inventory._write_snapshot()
+        trusted = per_second(
+            lambda: Inventory(load_from_backup=False, data_filepath=path).load_data(), len(rows))
+        os.remove(path + CHECKSUM_SUFFIX)
+        validated = per_second(
+            lambda: Inventory(load_from_backup=False, data_filepath=path).load_data(), len(rows))
+        print("{: <28} {: <14.0f}".format("load_data, no checksum", validated))
+        print("{: <28} {: <14.0f}".format("load_data, checksum matches", trusted))
+
+
+if __name__ == "__main__":
+    main()
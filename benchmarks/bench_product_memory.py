@@ -0,0 +1,52 @@
+# Bytes per product for the slotted Product against the old __dict__ based one
+#   python -m benchmarks.bench_product_memory --size 1000000
+import argparse
+import gc
+import random
+import tracemalloc
+
+from inventory_management_search_optimized import Product
+
+
+# Product as it was before __slots__ (same properties, per-instance __dict__)
+class DictProduct:
+    def __init__(self, id, name, price, quantity) -> None:
+        self.id = id
+        self.name = name
+        self.price = price
+        self.quantity = quantity
+
+    id = property(Product.id.fget, Product.id.fset)
+    name = property(Product.name.fget, Product.name.fset)
+    price = property(Product.price.fget, Product.price.fset)
+    quantity = property(Product.quantity.fget, Product.quantity.fset)
+
+
+def bytes_per_product(cls, size, seed=42):
+    rng = random.Random(seed)
+    rows = [("SKU{0}".format(i), "Phone {0}".format(i % 1000),
+             round(rng.uniform(50, 3000), 2), rng.randint(0, 500))
+            for i in range(size)]
+    gc.collect()
+    tracemalloc.start()
+    items = {}
+    for row in rows:
+        items[row[0]] = cls(*row)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return current / size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print("{: <20} {: <20}".format("Mode", "Bytes per product"))
+    for label, cls in (("__dict__ (old)", DictProduct), ("__slots__", Product)):
+        print("{: <20} {: <20.1f}".format(label, bytes_per_product(cls, args.size)))
+
+
+if __name__ == "__main__":
+    main()
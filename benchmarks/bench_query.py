@@ -0,0 +1,61 @@
+# Structured queries through the price/quantity indexes against the same filter as a full scan
+#   python -m benchmarks.bench_query --sizes 100000 1000000 --queries 200
+import argparse
+import random
+import time
+
+from inventory_management_search_optimized import Inventory, LatencyHistogram
+from inventory_management_query import Field
+from benchmarks.synthetic import make_products
+
+price, quantity, name = Field("price"), Field("quantity"), Field("name")
+
+
+def make_queries(count, seed=42):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        low = round(rng.uniform(50, 2900), 2)
+        queries.append(rng.choice([
+            ("narrow price range", price.between(low, low + 5), {}),
+            ("price & quantity", price.between(low, low + 100) & (quantity < 10), {}),
+            ("low stock by price", (quantity <= 2) & (price > low), {"order_by": "price",
+                                                                      "limit": 20}),
+            ("name & price", name.contains("pro") & price.between(low, low + 50), {}),
+        ]))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    print("{: <10} {: <22} {: <16} {: <16}".format(
+        "Products", "Query", "Indexed p50 (ms)", "Scan p50 (ms)"))
+    for size in args.sizes:
+        inventory = Inventory(load_from_backup=False)
+        inventory.low_stock_listeners = []
+        inventory.add_items([(p.id, p.name, p.price, p.quantity) for p in make_products(size)],
+                            alerts=False)
+        indexed, scanned = {}, {}
+        for label, where, options in make_queries(args.queries):
+            start = time.perf_counter()
+            result = list(inventory.query(where, **options))
+            indexed.setdefault(label, LatencyHistogram()).record(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            expected = [product for product in inventory.items.values() if where.matches(product)]
+            if "order_by" in options:
+                expected.sort(key=lambda product: product.price)
+                expected = expected[:options["limit"]]
+            scanned.setdefault(label, LatencyHistogram()).record(time.perf_counter() - start)
+            assert len(result) == len(expected), label
+        for label in indexed:
+            print("{: <10} {: <22} {: <16.3f} {: <16.3f}".format(
+                size, label, indexed[label].to_dict()["p50_ms"], scanned[label].to_dict()["p50_ms"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Zipf-distributed keyword searches, with a few updates mixed in, at several search cache sizes
+#   python -m benchmarks.bench_search_cache --size 1000000 --queries 100000 --cache-sizes 0 64 256 1024
+import argparse
+import random
+import time
+
+from inventory_management_search_optimized import Inventory, Product
+from benchmarks.synthetic import BRANDS, MODELS, make_products
+
+
+# Vocabulary of distinct keywords, most popular first
+def make_vocabulary(products, count, seed=42):
+    rng = random.Random(seed)
+    vocabulary = dict.fromkeys([b.lower() for b in BRANDS] + [m.lower() for m in MODELS])
+    while len(vocabulary) < count:
+        product = rng.choice(products)
+        word = rng.choice([product.name.lower(), product.id.lower(), str(product.price)])
+        start = rng.randrange(len(word))
+        vocabulary[word[start:start + rng.randint(3, 8)]] = None
+    keywords = list(vocabulary)
+    rng.shuffle(keywords)
+    return keywords
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=100_000)
+    parser.add_argument("--vocabulary", type=int, default=5000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of keyword popularity")
+    parser.add_argument("--update-rate", type=float, default=0.01,
+                        help="fraction of operations that are update_item")
+    parser.add_argument("--cache-sizes", type=int, nargs="+", default=[0, 64, 256, 1024])
+    args = parser.parse_args()
+
+    products = list(make_products(args.size))
+    rows = [(p.id, p.name, p.price, p.quantity) for p in products]
+    keywords = make_vocabulary(products, args.vocabulary)
+    weights = [1 / rank ** args.zipf for rank in range(1, len(keywords) + 1)]
+    rng = random.Random(7)
+    workload = rng.choices(keywords, weights, k=args.queries)
+    updates = [rng.random() < args.update_rate for _ in workload]
+
+    print("{: <12} {: <12} {: <10} {: <12} {: <14}".format(
+        "Cache size", "Queries/s", "Hit rate", "Evictions", "Invalidations"))
+    for cache_size in args.cache_sizes:
+        inventory = Inventory(load_from_backup=False, search_cache_size=cache_size)
+        inventory.low_stock_listeners = []
+        inventory.add_items(rows, alerts=False)
+        update_rng = random.Random(11)
+        start = time.perf_counter()
+        for keyword, update in zip(workload, updates):
+            if update:
+                product = update_rng.choice(products)
+                inventory.update_item(Product(product.id, product.name, product.price,
+                                              update_rng.randint(0, 500)))
+            inventory.search_everywhere_by_keyboard(keyword)
+        elapsed = time.perf_counter() - start
+        stats = inventory.search_cache.to_dict() if inventory.search_cache else None
+        print("{: <12} {: <12.0f} {: <10} {: <12} {: <14}".format(
+            cache_size, args.queries / elapsed,
+            "{0:.1%}".format(stats["hits"] / args.queries) if stats else "-",
+            stats["evictions"] if stats else "-", stats["invalidations"] if stats else "-"))
+
+
+if __name__ == "__main__":
+    main()
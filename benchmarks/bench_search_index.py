@@ -0,0 +1,62 @@
+# Compare the trigram indexed keyword search with the old linear scan
+#   python -m benchmarks.bench_search_index --sizes 10000 100000 1000000
+import argparse
+import contextlib
+import os
+import time
+
+from inventory_management_search_optimized import Inventory
+from benchmarks.synthetic import make_products, make_keywords
+
+
+# The search as it was before the index: one full pass per query
+def linear_search(inventory, keyword):
+    matches = []
+    keyword = keyword.lower()
+    for item in inventory.items.values():
+        if keyword in str(item.id).lower() or keyword in str(
+                item.name).lower() or keyword in str(
+                    item.quantity).lower() or keyword in str(
+                        item.price).lower():
+            matches.append(item)
+    return matches
+
+
+def time_queries(search, inventory, keywords):
+    start = time.perf_counter()
+    for keyword in keywords:
+        search(inventory, keyword)
+    return (time.perf_counter() - start) / len(keywords) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    keywords = make_keywords(count=args.queries)
+    print("{: <10} {: <12} {: <14} {: <14} {: <10}".format(
+        "Products", "Build (s)", "Linear (ms)", "Indexed (ms)", "Speedup"))
+    for size in args.sizes:
+        inventory = Inventory(load_from_backup=False)
+        start = time.perf_counter()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for product in make_products(size):
+                inventory.add_item(product)
+        build = time.perf_counter() - start
+
+        for keyword in keywords:
+            assert linear_search(inventory, keyword) == \
+                inventory.search_everywhere_by_keyboard(keyword), keyword
+        linear = time_queries(linear_search, inventory, keywords)
+        indexed = time_queries(
+            lambda inv, kw: inv.search_everywhere_by_keyboard(kw), inventory,
+            keywords)
+        print("{: <10} {: <12.2f} {: <14.3f} {: <14.3f} {: <10.1f}".format(
+            size, build, linear, indexed, linear / indexed))
+
+
+if __name__ == "__main__":
+    main()
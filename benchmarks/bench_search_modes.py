@@ -0,0 +1,67 @@
+# Latency of each search mode with a result limit, per catalog size
+#   python -m benchmarks.bench_search_modes --sizes 100000 1000000 --queries 500 --limit 10
+import argparse
+import random
+import time
+
+from inventory_management_search_optimized import Inventory, LatencyHistogram
+from benchmarks.synthetic import BRANDS, MODELS, make_keywords, make_products
+
+
+def typo(word, rng):
+    i = rng.randrange(len(word))
+    return rng.choice([word[:i] + word[i + 1:],  # Missing letter
+                       word[:i] + rng.choice("aeiou") + word[i + 1:],  # Wrong letter
+                       word[:i] + word[i + 1:i + 2] + word[i:i + 1] + word[i + 2:]])  # Swapped
+
+
+def make_queries(count, size, seed=42):
+    rng = random.Random(seed)
+    words = BRANDS + MODELS
+    return {
+        "prefix": [rng.choice([rng.choice(words)[:rng.randint(2, 4)],
+                               "SKU{0}".format(rng.randrange(size))[:rng.randint(4, 7)]])
+                   for _ in range(count)],
+        "fuzzy": [typo(rng.choice(BRANDS).lower(), rng) for _ in range(count)],
+        "ranked": make_keywords(seed, count),
+        "substring": make_keywords(seed, count),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    print("{: <10} {: <12} {: <14} {: <10} {: <10}".format(
+        "Products", "Mode", "First call (s)", "p50 (ms)", "p99 (ms)"))
+    for size in args.sizes:
+        inventory = Inventory(load_from_backup=False)
+        inventory.low_stock_listeners = []
+        inventory.add_items([(p.id, p.name, p.price, p.quantity) for p in make_products(size)],
+                            alerts=False)
+        searches = {
+            "prefix": inventory.search_prefix,
+            "fuzzy": inventory.search_fuzzy,
+            "ranked": inventory.search_ranked,
+            "substring": inventory.search_everywhere_by_keyboard,
+        }
+        for mode, queries in make_queries(args.queries, size).items():
+            # The first call of prefix/fuzzy/ranked builds the word index
+            start = time.perf_counter()
+            searches[mode](queries[0], limit=args.limit)
+            first_call = time.perf_counter() - start
+            histogram = LatencyHistogram()
+            for query in queries:
+                start = time.perf_counter()
+                searches[mode](query, limit=args.limit)
+                histogram.record(time.perf_counter() - start)
+            stats = histogram.to_dict()
+            print("{: <10} {: <12} {: <14.3f} {: <10.3f} {: <10.3f}".format(
+                size, mode, first_call, stats["p50_ms"], stats["p99_ms"]))
+
+
+if __name__ == "__main__":
+    main()
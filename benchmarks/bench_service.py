@@ -0,0 +1,89 @@
+# Load generator for inventory_service: throughput and client-side p50/p99
+#   python -m benchmarks.bench_service --products 100000 --clients 16 --requests 20000 --pipeline 32
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from inventory_management_search_optimized import Inventory, LatencyHistogram
+from inventory_service import InventoryServer
+from benchmarks.synthetic import make_keywords, make_products
+
+
+def make_requests(products, keywords, count, seed):
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(count):
+        roll = rng.random()
+        product = rng.choice(products)
+        if roll < 0.6:
+            request = {"op": "get", "id": product.id}
+        elif roll < 0.8:
+            request = {"op": "search", "keyword": rng.choice(keywords), "limit": 20}
+        elif roll < 0.95:
+            request = {"op": "update", "product": dict(product.to_dict(),
+                                                      quantity=rng.randint(0, 50))}
+        else:
+            request = {"op": "report"}
+        requests.append((json.dumps(request) + "\n").encode("utf-8"))
+    return requests
+
+
+# Keeps up to `pipeline` requests in flight on one connection
+async def client(address, requests, pipeline, histogram):
+    reader, writer = await asyncio.open_connection(*address)
+    for start in range(0, len(requests), pipeline):
+        window = requests[start:start + pipeline]
+        sent_at = time.perf_counter()
+        writer.write(b"".join(window))
+        await writer.drain()
+        for _ in window:
+            await reader.readline()
+            histogram.record(time.perf_counter() - sent_at)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run(args):
+    inventory = Inventory(load_from_backup=False)
+    inventory.low_stock_listeners = []
+    products = list(make_products(args.products))
+    inventory.add_items([(p.id, p.name, p.price, p.quantity) for p in products], alerts=False)
+    server = InventoryServer(inventory)
+    await server.start(port=0)
+
+    per_client = args.requests // args.clients
+    workloads = [make_requests(products, make_keywords(seed=i, count=100), per_client, seed=i)
+                 for i in range(args.clients)]
+    histogram = LatencyHistogram()
+    start = time.perf_counter()
+    await asyncio.gather(*(client(server.address, workload, args.pipeline, histogram)
+                           for workload in workloads))
+    elapsed = time.perf_counter() - start
+    await server.close()
+
+    summary = histogram.to_dict()
+    print("{: <10} {: <10} {: <12} {: <10} {: <10}".format(
+        "Clients", "Pipeline", "Requests/s", "p50 (ms)", "p99 (ms)"))
+    print("{: <10} {: <10} {: <12.0f} {: <10.3f} {: <10.3f}".format(
+        args.clients, args.pipeline, summary["count"] / elapsed,
+        summary["p50_ms"], summary["p99_ms"]))
+    print("Server-side per-op latency:")
+    for op, histogram in sorted(server.latency.items()):
+        stats = histogram.to_dict()
+        print("  {: <8} n={: <8} p50={:.3f}ms p99={:.3f}ms".format(
+            op, stats["count"], stats["p50_ms"], stats["p99_ms"]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--pipeline", type=int, default=32)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
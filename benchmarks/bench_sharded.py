@@ -0,0 +1,52 @@
+# Scan throughput of ShardedInventory from 1 to N worker processes, against Inventory
+#   python -m benchmarks.bench_sharded --size 1000000 --shards 1 2 4 8
+import argparse
+import os
+import time
+
+from inventory_management_search_optimized import Inventory
+from inventory_management_sharded import ShardedInventory
+from benchmarks.synthetic import make_keywords, make_products
+
+
+def per_second(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return repeat / (time.perf_counter() - start)
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--shards", type=int, nargs="+",
+                        default=sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1))))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = [(p.id, p.name, p.price, p.quantity) for p in make_products(args.size)]
+    # Short keywords can't use the trigram index and scan every product
+    scans = {
+        "scan search/s": lambda inventory: inventory.search_everywhere_by_keyboard("qz"),
+        "indexed search/s": lambda inventory: [inventory.search_everywhere_by_keyboard(keyword)
+                                               for keyword in make_keywords(count=5)],
+        "recompute totals/s": lambda inventory: inventory.recompute_totals(),
+    }
+    print("{: <12}".format("Shards") + "".join("{: <22}".format(label) for label in scans))
+
+    def run(label, inventory):
+        inventory.low_stock_listeners = []
+        inventory.add_items(rows, alerts=False)
+        print("{: <12}".format(label) + "".join(
+            "{: <22.2f}".format(per_second(lambda: scan(inventory), args.repeat))
+            for scan in scans.values()))
+        inventory.close()
+
+    run("Inventory", Inventory(load_from_backup=False))
+    for shards in args.shards:
+        run(str(shards), ShardedInventory(shards=shards, load_from_backup=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Writers during a long export: a thread updates products while another exports the whole
+# catalog, once holding the writer lock for the whole export (how exports used to run)
+# and once reading a snapshot. Also the cost of taking a snapshot, and of writes while
+# one is open.
+#   python -m benchmarks.bench_snapshot --size 1000000 --updates 20000
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from inventory_management_search_optimized import Inventory, LatencyHistogram, Product
+from benchmarks.synthetic import make_products, zipf_choices
+
+
+def run_writer(inventory, updates, histogram, stop):
+    for product in updates:
+        if stop.is_set():
+            break
+        start = time.perf_counter()
+        inventory.update_item(product)
+        histogram.record(time.perf_counter() - start)
+
+
+def during_export(inventory, updates, path, locked):
+    histogram, stop = LatencyHistogram(), threading.Event()
+    writer = threading.Thread(target=run_writer, args=(inventory, updates, histogram, stop))
+    start = time.perf_counter()
+    writer.start()
+    if locked:
+        with inventory._lock:
+            inventory.export(path)
+    else:
+        inventory.export(path)
+    exported = time.perf_counter() - start
+    stop.set()
+    writer.join()
+    return exported, histogram
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--updates", type=int, default=20_000)
+    args = parser.parse_args()
+
+    products = list(make_products(args.size))
+    inventory = Inventory(load_from_backup=False, thread_safe=True)
+    inventory.low_stock_listeners = []
+    inventory.add_items([(p.id, p.name, p.price, p.quantity) for p in products], alerts=False)
+    by_id = {p.id: p for p in products}
+    updates = [Product(by_id[id].id, by_id[id].name, by_id[id].price, n % 500)
+               for n, id in enumerate(zipf_choices(by_id, args.updates))]
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        inventory.snapshot().close()
+    print("take + close a snapshot: {0:.1f} µs".format((time.perf_counter() - start) * 1000))
+
+    for label, open_snapshot in [("updates, no snapshot", False), ("updates, snapshot open", True)]:
+        snapshot = inventory.snapshot() if open_snapshot else None
+        start = time.perf_counter()
+        for product in updates:
+            inventory.update_item(product)
+        print("{: <30} {: <14.0f} ops/s".format(label, len(updates) / (time.perf_counter() - start)))
+        if snapshot is not None:
+            snapshot.close()
+
+    print("{: <30} {: <12} {: <12} {: <10} {: <10}".format(
+        "Export", "Seconds", "Writes", "p50 (ms)", "Max (ms)"))
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, locked in [("holding the lock", True), ("snapshot", False)]:
+            exported, histogram = during_export(inventory, updates, os.path.join(tmp, "out.csv"),
+                                                locked)
+            stats = histogram.to_dict()
+            print("{: <30} {: <12.2f} {: <12} {: <10.3f} {: <10.3f}".format(
+                label, exported, stats["count"], stats["p50_ms"], stats["max_ms"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# Cold start: import time of each module (python -X importtime) and the wall time of a
+# fresh process doing one lookup, median of several runs. The slowest imports are listed.
+#   python -m benchmarks.bench_startup --runs 10
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = ["inventory_management_query", "inventory_management_search_optimized",
+           "inventory_management_sqlite", "inventory_management_sharded", "inventory_service"]
+LOOKUP = ("from inventory_management_search_optimized import Inventory\n"
+          "Inventory(load_from_backup=False, data_filepath='data/backup.json')"
+          ".load_data(lazy=True)\n")
+
+
+# {module: (self, cumulative) microseconds} of one fresh interpreter importing module
+def import_times(module):
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                            capture_output=True, text=True, check=True).stderr
+    times = {}
+    for line in output.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            times[fields[2].strip()] = (int(fields[0].split(":")[1]), int(fields[1]))
+            if fields[2].strip() == "site":  # Interpreter startup, not the module
+                times.clear()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=5, help="slowest imports listed per module")
+    args = parser.parse_args()
+
+    print("{: <40} {: <16}".format("Module", "Import (ms)"))
+    for module in MODULES:
+        runs = [import_times(module) for _ in range(args.runs)]
+        print("{: <40} {: <16.1f}".format(
+            module, statistics.median(run[module][1] for run in runs) / 1000))
+        slowest = sorted(runs[-1].items(), key=lambda item: item[1][0], reverse=True)
+        for name, (self_us, _) in slowest[:args.top]:
+            print("    {: <36} {: <16.1f}".format(name, self_us / 1000))
+
+    walls = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", LOOKUP], check=True)
+        walls.append(time.perf_counter() - start)
+    print("{: <40} {: <16.1f}".format("cold process, lazy load (wall)",
+                                      statistics.median(walls) * 1000))
+
+
+if __name__ == "__main__":
+    main()
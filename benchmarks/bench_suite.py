@@ -0,0 +1,202 @@
+# Hot paths of Inventory, and of the list-based archived/inventory_management.py as a
+# baseline, on seeded synthetic catalogs with Zipf-skewed ids and keywords.
+# Results are written as JSON, and a run can be checked against an earlier one:
+#   python -m benchmarks.bench_suite --sizes 1000 10000 100000 1000000 --output results.json
+#   python -m benchmarks.bench_suite --sizes 1000 10000 --compare results.json
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from archived import inventory_management as archived
+from inventory_management_search_optimized import Inventory, LatencyHistogram, Product
+from benchmarks.synthetic import SEARCH_TERMS, make_products, zipf_choices
+
+# Timed over the whole catalog (best of --repeat runs), the others call by call
+WHOLE_CATALOG = ["save_data", "load_data", "generate_report", "export_to_excel"]
+PER_CALL = ["search_by_id", "search_everywhere_by_keyboard", "update_item", "add_item",
+            "delete_item"]
+
+
+# The current dict-based Inventory, everything not defined here is the Inventory's own
+class CurrentTarget:
+    label = "inventory"
+    product = Product
+
+    def __init__(self, path) -> None:
+        self.path = path
+        self.inventory = self.create()
+
+    def __getattr__(self, name):
+        return getattr(self.inventory, name)
+
+    def create(self):
+        inventory = Inventory(load_from_backup=False, data_filepath=self.path)
+        inventory.low_stock_listeners = []
+        return inventory
+
+    def populate(self, rows):
+        self.inventory.add_items(rows, alerts=False)
+
+    # A fresh inventory reading what save_data wrote
+    def load_data(self):
+        self.inventory = self.create()
+        self.inventory.load_data()
+
+
+# The original list-based implementation, its backup path is hard-coded to data/backup.json
+class ArchivedTarget(CurrentTarget):
+    label = "archived"
+    product = archived.Product
+
+    def create(self):
+        inventory = archived.Inventory(load_from_backup=False)
+        inventory._Inventory__data_filepath = self.path
+        return inventory
+
+    def populate(self, rows):
+        self.inventory.items = [archived.Product(*row) for row in rows]
+
+    def search_by_id(self, id):
+        return self.inventory.get_product_by_id(id)
+
+    export_to_excel = None  # Not in the baseline
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+# Whole-catalog operations are few and noisy, the best of repeat runs is kept
+def best(repeat, function, *args):
+    return min(timed(function, *args) for _ in range(repeat))
+
+
+def run(target, rows, args, tmp):
+    size = len(rows)
+    ids = zipf_choices([row[0] for row in rows], args.ops, args.zipf, args.seed)
+    keywords = zipf_choices(SEARCH_TERMS, args.searches, args.zipf, args.seed)
+    by_id = {row[0]: row for row in rows}
+    calls = {
+        "search_by_id": ids,
+        "search_everywhere_by_keyboard": keywords,
+        "update_item": [target.product(*by_id[id][:3], (by_id[id][3] + n) % 500)
+                        for n, id in enumerate(ids)],
+        "add_item": [target.product("NEW{0}".format(n), "New Phone", 99.0, 10)
+                     for n in range(args.ops)],
+        "delete_item": ["NEW{0}".format(n) for n in range(args.ops)],
+    }
+
+    target.populate(rows)
+    results = {"save_data": best(args.repeat, target.save_data),
+               "load_data": best(args.repeat, target.load_data)}
+    for operation in PER_CALL:
+        histogram = LatencyHistogram()
+        function = getattr(target, operation)
+        for argument in calls[operation]:
+            histogram.record(timed(function, argument))
+        results[operation] = histogram
+    results["generate_report"] = best(args.repeat, target.generate_report)
+    if target.export_to_excel is not None:
+        results["export_to_excel"] = best(args.repeat, target.export_to_excel,
+                                          os.path.join(tmp, "export.csv"))
+
+    records = []
+    for operation in WHOLE_CATALOG + PER_CALL:
+        result = results.get(operation)
+        if result is None:
+            continue
+        record = {"target": target.label, "size": size, "operation": operation}
+        if isinstance(result, LatencyHistogram):
+            stats = result.to_dict()
+            record.update(calls=stats["count"], seconds=result.total,
+                          ops_per_sec=stats["count"] / result.total,
+                          p50_ms=stats["p50_ms"], p99_ms=stats["p99_ms"])
+        else:
+            record.update(calls=1, seconds=result, ops_per_sec=1 / result,
+                          products_per_sec=size / result)
+        records.append(record)
+    return records
+
+
+def environment(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": sys.version.split()[0],
+            "platform": platform.platform(), "machine": platform.machine(),
+            "cpus": os.cpu_count(), "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": vars(args)}
+
+
+# Operations whose time per call grew by more than threshold against an earlier run
+def regressions(records, baseline, threshold):
+    before = {(r["target"], r["size"], r["operation"]): r for r in baseline["results"]}
+    slower = []
+    for record in records:
+        old = before.get((record["target"], record["size"], record["operation"]))
+        if old is not None and old["ops_per_sec"] / record["ops_per_sec"] > 1 + threshold:
+            slower.append((record, old["ops_per_sec"] / record["ops_per_sec"]))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--ops", type=int, default=1000, help="calls per id-based operation")
+    parser.add_argument("--searches", type=int, default=100, help="keyword searches")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of ids and keywords")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs of each whole-catalog operation, the best is kept")
+    parser.add_argument("--baseline-max-size", type=int, default=100_000,
+                        help="largest catalog the O(n) archived baseline runs on")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON of an earlier run to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="slowdown that counts as a regression, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    records = []
+    print("{: <10} {: <10} {: <30} {: <14} {: <10} {: <10}".format(
+        "Target", "Products", "Operation", "Ops/s", "p50 (ms)", "p99 (ms)"))
+    for size in args.sizes:
+        rows = [(p.id, p.name, p.price, p.quantity) for p in make_products(size, args.seed)]
+        targets = [CurrentTarget] + ([ArchivedTarget] if size <= args.baseline_max_size else [])
+        for target_class in targets:
+            with tempfile.TemporaryDirectory() as tmp:
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    target = target_class(os.path.join(tmp, "backup.json"))
+                    results = run(target, rows, args, tmp)
+                del target
+            for record in results:
+                print("{: <10} {: <10} {: <30} {: <14.1f} {: <10} {: <10}".format(
+                    record["target"], size, record["operation"], record["ops_per_sec"],
+                    "{0:.3f}".format(record["p50_ms"]) if "p50_ms" in record else "-",
+                    "{0:.3f}".format(record["p99_ms"]) if "p99_ms" in record else "-"))
+            records += results
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"environment": environment(args), "results": records}, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            slower = regressions(records, json.load(file), args.threshold)
+        for record, ratio in slower:
+            print("Regression: {0} {1} at {2} products is {3:.2f}x slower".format(
+                record["target"], record["operation"], record["size"], ratio))
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
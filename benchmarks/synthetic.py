@@ -0,0 +1,40 @@
+import random
+from itertools import accumulate
+
+from inventory_management_search_optimized import Product
+
+BRANDS = ["iPhone", "Samsung", "Oneplus", "Redmi", "Oppo", "Vivo", "Pixel",
+          "Nokia", "Motorola", "Realme", "Sony", "Asus", "Huawei", "Honor"]
+MODELS = ["Pro", "Max", "Mini", "Lite", "Ultra", "Plus", "Neo", "Edge", "Note",
+          "Fold", "Flip", "Go"]
+
+
+# Deterministic catalog of n products, ids are SKU0..SKU{n-1}
+def make_products(n, seed=42):
+    rng = random.Random(seed)
+    for i in range(n):
+        name = "{0} {1} {2}".format(rng.choice(BRANDS), rng.randint(1, 30),
+                                    rng.choice(MODELS))
+        price = round(rng.uniform(50, 3000), 2)
+        quantity = rng.randint(0, 500)
+        yield Product("SKU{0}".format(i), name, price, quantity)
+
+
+# Keywords that look like what users type into the search box
+SEARCH_TERMS = ([b.lower()[:4] for b in BRANDS] + [m.lower() for m in MODELS] +
+                ["sku1", "sku42", "99.9", "12 pro", "galaxy"])
+
+
+def make_keywords(seed=42, count=20):
+    rng = random.Random(seed)
+    return [rng.choice(SEARCH_TERMS) for _ in range(count)]
+
+
+# count picks from population where the k-th most popular is picked with weight
+# 1 / k ** exponent. Popularity ranks are shuffled, so hot items are spread out.
+def zipf_choices(population, count, exponent=1.1, seed=42):
+    rng = random.Random(seed)
+    ranked = list(population)
+    rng.shuffle(ranked)
+    cum_weights = list(accumulate(1 / rank ** exponent for rank in range(1, len(ranked) + 1)))
+    return rng.choices(ranked, cum_weights=cum_weights, k=count)
@@ -0,0 +1,40 @@
+import os
+from contextlib import contextmanager
+
+
+# Make a rename inside directory durable (no-op where directories can't be opened)
+def fsync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+# Write filepath through a temporary file next to it, fsynced and renamed over it on
+# success: a crash or an error leaves the old file whole (and readers that mapped it
+# keep reading it), never a cut-short one. The old file's permissions are kept.
+@contextmanager
+def atomic_write(filepath, mode="w"):
+    import shutil
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp_filepath = tempfile.mkstemp(
+        dir=directory, prefix=os.path.basename(filepath), suffix=".tmp")
+    try:
+        if os.path.isfile(filepath):
+            shutil.copymode(filepath, tmp_filepath)
+        with os.fdopen(fd, mode) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_filepath, filepath)
+    except BaseException:
+        os.remove(tmp_filepath)
+        raise
+    fsync_directory(directory)
@@ -0,0 +1,172 @@
+import json
+import time
+from array import array
+from bisect import bisect_left
+
+from inventory_management_files import atomic_write
+
+LEDGER_MAGIC = "INVL1"
+
+
+# Append-only log of stock movements (timestamp, product id, delta, reason) kept as
+# parallel arrays, about 26 bytes per movement. Product ids and reasons are stored as
+# small integer codes. Every product also has the list of its row numbers, and rows
+# are in time order, so time ranges of all products or of one are a binary search away.
+class MovementLedger:
+    def __init__(self, clock=time.time) -> None:
+        self.clock = clock
+        self.timestamps = array("d")
+        self.products = array("I")  # Row -> product code
+        self.deltas = array("q")
+        self.reasons = array("H")  # Row -> reason code
+        self.ids = []  # Product code -> id
+        self.codes = {}  # Product id -> code
+        self.reason_names = []
+        self.reason_codes = {}
+        self.rows = []  # Product code -> array of its row numbers
+        self.balances = array("q")  # Product code -> sum of its deltas
+
+    def __len__(self) -> int:
+        return len(self.deltas)
+
+    def _code(self, product_id):
+        code = self.codes.get(product_id)
+        if code is None:
+            code = self.codes[product_id] = len(self.ids)
+            self.ids.append(product_id)
+            self.rows.append(array("I"))
+            self.balances.append(0)
+        return code
+
+    def _reason_code(self, reason):
+        code = self.reason_codes.get(reason)
+        if code is None:
+            code = self.reason_codes[reason] = len(self.reason_names)
+            self.reason_names.append(reason)
+        return code
+
+    # Record delta units of product_id (negative = out). Timestamps default to now and
+    # must not go back in time.
+    def append(self, product_id, delta, reason="", timestamp=None):
+        last = self.timestamps[-1] if self.timestamps else float("-inf")
+        if timestamp is None:
+            timestamp = max(self.clock(), last)  # A clock step back must not break the order
+        elif timestamp < last:
+            raise ValueError("Movements must be appended in time order")
+        code = self._code(product_id)
+        self.rows[code].append(len(self.deltas))
+        self.timestamps.append(timestamp)
+        self.products.append(code)
+        self.deltas.append(delta)
+        self.reasons.append(self._reason_code(reason))
+        self.balances[code] += delta
+
+    # Record the movement that takes product_id to quantity, nothing if it is there already
+    def settle(self, product_id, quantity, reason="", timestamp=None):
+        delta = quantity - self.balance(product_id)
+        if delta:
+            self.append(product_id, delta, reason, timestamp)
+
+    # Units of product_id after every movement so far, O(1)
+    def balance(self, product_id):
+        code = self.codes.get(product_id)
+        return 0 if code is None else self.balances[code]
+
+    # First row of rows (ascending row numbers) at or after timestamp
+    def _first_at(self, rows, timestamp):
+        timestamps = self.timestamps
+        low, high = 0, len(rows)
+        while low < high:
+            middle = (low + high) // 2
+            if timestamps[rows[middle]] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    # Row numbers in start <= timestamp < end (either bound may be None), in time order
+    def _rows(self, product_id=None, start=None, end=None):
+        if product_id is None:
+            low = 0 if start is None else bisect_left(self.timestamps, start)
+            high = len(self.deltas) if end is None else bisect_left(self.timestamps, end)
+            return range(low, high)
+        code = self.codes.get(product_id)
+        if code is None:
+            return ()
+        rows = self.rows[code]
+        low = 0 if start is None else self._first_at(rows, start)
+        high = len(rows) if end is None else self._first_at(rows, end)
+        return rows[low:high]
+
+    # (timestamp, product id, delta, reason) of every movement in the range, oldest first
+    def movements(self, product_id=None, start=None, end=None):
+        timestamps, products, deltas, reasons = \
+            self.timestamps, self.products, self.deltas, self.reasons
+        for row in self._rows(product_id, start, end):
+            yield (timestamps[row], self.ids[products[row]], deltas[row],
+                   self.reason_names[reasons[row]])
+
+    # Totals of one product's movements in the range (all products with product_id=None)
+    def rollup(self, product_id=None, start=None, end=None):
+        deltas = self.deltas
+        units_in = units_out = count = 0
+        for row in self._rows(product_id, start, end):
+            delta = deltas[row]
+            if delta > 0:
+                units_in += delta
+            else:
+                units_out -= delta
+            count += 1
+        return {
+            'movements': count,
+            'units_in': units_in,
+            'units_out': units_out,
+            'net': units_in - units_out
+        }
+
+    # Net change of every product that moved in the range
+    def rollups(self, start=None, end=None):
+        deltas, products = self.deltas, self.products
+        net = {}
+        for row in self._rows(None, start, end):
+            code = products[row]
+            net[code] = net.get(code, 0) + deltas[row]
+        return {self.ids[code]: change for code, change in net.items()}
+
+    # Rebuild quantities by replaying the movements up to (not including) until.
+    # Every product of the ledger is there, deleted or not yet stocked ones with 0.
+    def replay(self, until=None):
+        quantities = [0] * len(self.ids)
+        deltas, products = self.deltas, self.products
+        for row in self._rows(None, None, until):
+            quantities[products[row]] += deltas[row]
+        return dict(zip(self.ids, quantities))
+
+    # One JSON header line (ids, reasons, row count) followed by the raw columns
+    def save(self, filepath):
+        header = {"magic": LEDGER_MAGIC, "movements": len(self), "ids": self.ids,
+                  "reasons": self.reason_names}
+        with atomic_write(filepath, "wb") as file:
+            file.write(json.dumps(header).encode("utf-8") + b"\n")
+            for column in (self.timestamps, self.products, self.deltas, self.reasons):
+                column.tofile(file)
+
+    @classmethod
+    def load(cls, filepath, clock=time.time):
+        ledger = cls(clock)
+        with open(filepath, "rb") as file:
+            header = json.loads(file.readline())
+            if header.get("magic") != LEDGER_MAGIC:
+                raise ValueError("{0} is not a movement ledger".format(filepath))
+            count = header["movements"]
+            for column in (ledger.timestamps, ledger.products, ledger.deltas, ledger.reasons):
+                column.fromfile(file, count)
+        for product_id in header["ids"]:
+            ledger._code(product_id)
+        for reason in header["reasons"]:
+            ledger._reason_code(reason)
+        rows, balances = ledger.rows, ledger.balances
+        for row, (code, delta) in enumerate(zip(ledger.products, ledger.deltas)):
+            rows[code].append(row)
+            balances[code] += delta
+        return ledger
@@ -0,0 +1,277 @@
+import json
+from contextlib import contextmanager
+from array import array
+from itertools import compress
+
+from inventory_management_files import atomic_write
+
+STOCK_MAGIC = "INVS2"
+GROWTH = 1024  # Rows added to the matrix at once
+ROLLUP_CELLS = 1 << 20  # Cells per vectorized rollup step, bounds its float copy to 8 MB
+
+
+# Quantities of every product at every location as a product x location matrix: one
+# row-major array, 8 bytes a cell, a row per product (rows of deleted products are reused).
+# Totals per product and per location are kept up to date on every change, so both are
+# O(1) to read. Rollups and low-stock scans run vectorized over a numpy view of the matrix
+# (numpy is only imported for those).
+# Changes that don't name a location (settle) land on the first one, and decreases are
+# taken from it first, then from the others in order.
+class LocationStock:
+    def __init__(self, locations=()) -> None:
+        self.locations = []  # Column -> location name
+        self.location_codes = {}  # Location name -> column
+        self.cells = array("q")  # Row-major, cells[row * len(locations) + column]
+        self.location_totals = array("q")
+        self.ids = []  # Row -> product id, None for a free row
+        self.rows = {}  # Product id -> row
+        self.free = []  # Rows of deleted products
+        self.product_totals = array("q")  # Row -> units over every location
+        self.prices = array("d")  # Row -> price, for location values
+        self._undo = None  # What a running transaction changed, see rollback
+        self._keeping = False  # Inside kept() while a transaction runs
+        for name in locations:
+            self.add_location(name)
+
+    def add_location(self, name):
+        if name in self.location_codes:
+            raise ValueError("Location already exists: {0}".format(name))
+        width = len(self.locations)
+        if self.product_totals:  # Rows get one cell wider, O(cells)
+            cells = array("q", bytes(8 * len(self.product_totals) * (width + 1)))
+            for row in range(len(self.product_totals)):
+                cells[row * (width + 1):row * (width + 1) + width] = \
+                    self.cells[row * width:(row + 1) * width]
+            self.cells = cells
+        self.location_codes[name] = width
+        self.locations.append(name)
+        self.location_totals.append(0)
+
+    def _column(self, location):
+        column = self.location_codes.get(location)
+        if column is None:
+            raise KeyError("Unknown location: {0}".format(location))
+        return column
+
+    def _row(self, product_id):
+        row = self.rows.get(product_id)
+        if row is None:
+            reused = bool(self.free) and not self._keeping  # See kept
+            if reused:
+                row = self.free.pop()
+                self.ids[row] = product_id
+            else:
+                row = len(self.ids)
+                self.ids.append(product_id)
+                if row == len(self.product_totals):
+                    self._grow()
+            self.rows[product_id] = row
+            if self._undo is not None:
+                self._undo.append(("row", product_id, row, reused))
+        return row
+
+    def _grow(self):
+        padding = bytes(8 * GROWTH)
+        self.cells.frombytes(padding * len(self.locations))
+        self.product_totals.frombytes(padding)
+        self.prices.frombytes(padding)
+
+    # The one place cells change, O(1)
+    def _set(self, row, column, quantity):
+        cell = row * len(self.locations) + column
+        change = quantity - self.cells[cell]
+        if change:
+            if self._undo is not None:
+                self._undo.append(("cell", row, column, self.cells[cell]))
+            self.cells[cell] = quantity
+            self.product_totals[row] += change
+            self.location_totals[column] += change
+
+    def quantity(self, product_id, location):
+        column = self._column(location)
+        row = self.rows.get(product_id)
+        return 0 if row is None else self.cells[row * len(self.locations) + column]
+
+    # {location: units} of one product, locations without any left out
+    def quantities(self, product_id):
+        row = self.rows.get(product_id)
+        if row is None:
+            return {}
+        width = len(self.locations)
+        return {name: quantity for name, quantity
+                in zip(self.locations, self.cells[row * width:(row + 1) * width]) if quantity}
+
+    def total(self, product_id):
+        row = self.rows.get(product_id)
+        return 0 if row is None else self.product_totals[row]
+
+    def location_total(self, location):
+        return self.location_totals[self._column(location)]
+
+    def set(self, product_id, location, quantity):
+        if not isinstance(quantity, int):
+            raise TypeError("Quantity must be a number")
+        elif quantity < 0:
+            raise ValueError("Quantity cannot be negative")
+        column = self._column(location)
+        self._set(self._row(product_id), column, quantity)
+
+    # Move quantity units of a product between two locations, both or neither change
+    def transfer(self, product_id, source, destination, quantity):
+        if not isinstance(quantity, int):
+            raise TypeError("Quantity must be a number")
+        elif quantity <= 0:
+            raise ValueError("Transfer quantity must be positive")
+        source, destination = self._column(source), self._column(destination)
+        available = self.quantity(product_id, self.locations[source])
+        if available < quantity:
+            raise ValueError("Only {0} units of {1} at {2}".format(
+                available, product_id, self.locations[source]))
+        row = self._row(product_id)
+        self._set(row, source, available - quantity)
+        self._set(row, destination,
+                  self.cells[row * len(self.locations) + destination] + quantity)
+
+    # Bring a product's total to quantity without naming a location (see the class comment)
+    def settle(self, product_id, quantity, price=0.0):
+        if not self.locations:
+            raise ValueError("Stock needs at least one location")
+        row = self._row(product_id)
+        self._set_price(row, price)
+        change = quantity - self.product_totals[row]
+        first = row * len(self.locations)
+        if change > 0:
+            self._set(row, 0, self.cells[first] + change)
+        for column in range(len(self.locations)):
+            if change >= 0:
+                break
+            held = self.cells[first + column]
+            taken = min(held, -change)
+            self._set(row, column, held - taken)
+            change += taken
+
+    def remove(self, product_id):
+        row = self.rows.pop(product_id, None)
+        if row is None:
+            return
+        for column in range(len(self.locations)):
+            self._set(row, column, 0)
+        self._set_price(row, 0.0)
+        self.ids[row] = None
+        if not self._keeping:  # Left out of reuse until saved and loaded again, see kept
+            self.free.append(row)
+        if self._undo is not None:
+            self._undo.append(("free", product_id, row))
+
+    def _set_price(self, row, price):
+        if self._undo is not None and self.prices[row] != price:
+            self._undo.append(("price", row, self.prices[row]))
+        self.prices[row] = price
+
+    def clear_products(self):
+        for product_id in list(self.rows):
+            self.remove(product_id)
+
+    # Rows in use as a numpy (rows, locations) view over the cells, no copy. The view holds
+    # on to the buffer, so it must be gone before the matrix grows again.
+    def _matrix(self):
+        import numpy as np
+        width, height = len(self.locations), len(self.ids)
+        return np.frombuffer(self.cells, np.int64, width * height).reshape(height, width)
+
+    # Ids of the products with threshold units or less at location
+    def low_stock(self, location, threshold):
+        column = self._column(location)
+        if not self.ids:
+            return []
+        found = list(compress(self.ids, (self._matrix()[:, column] <= threshold).tolist()))
+        if len(self.rows) < len(self.ids):  # Free rows hold zeros, so they always match
+            found = [product_id for product_id in found if product_id is not None]
+        return found
+
+    # {location: {'units', 'value'}} of every location: prices x matrix, vectorized over
+    # every location at once, ROLLUP_CELLS cells a step
+    def rollup(self):
+        import numpy as np
+        values = np.zeros(len(self.locations))
+        if self.ids and self.locations:
+            matrix = self._matrix()
+            prices = np.frombuffer(self.prices, np.float64, len(self.ids))
+            step = max(1, ROLLUP_CELLS // len(self.locations))
+            for start in range(0, len(self.ids), step):
+                values += prices[start:start + step] @ matrix[start:start + step]
+        return {
+            name: {'units': units, 'value': value}
+            for name, units, value in zip(self.locations, self.location_totals, values.tolist())
+        }
+
+    # Changes between begin and rollback are undone, see Inventory.transaction
+    def begin(self):
+        self._undo = []
+
+    def commit(self):
+        self._undo = None
+
+    # Changes made inside stay even if the running transaction rolls back. New rows are
+    # appended then and removed ones not reused, the free list is left as rollback
+    # expects it.
+    @contextmanager
+    def kept(self):
+        undo, self._undo = self._undo, None
+        self._keeping = undo is not None
+        try:
+            yield
+        finally:
+            self._undo, self._keeping = undo, False
+
+    # Undone newest first, so rows go back on (or off) the free list in the order they left it
+    def rollback(self):
+        undo, self._undo = self._undo, None
+        for change in reversed(undo):
+            if change[0] == "cell":
+                self._set(*change[1:])
+            elif change[0] == "price":
+                self.prices[change[1]] = change[2]
+            elif change[0] == "row":  # Allocated, give it back
+                _, product_id, row, reused = change
+                del self.rows[product_id]
+                if reused or row != len(self.ids) - 1:  # Kept rows came after it
+                    self.ids[row] = None
+                    self.free.append(row)
+                else:
+                    self.ids.pop()
+            else:  # free, the product gets its row back
+                _, product_id, row = change
+                self.free.pop()
+                self.ids[row] = product_id
+                self.rows[product_id] = row
+
+    # One JSON header line (locations, row ids) followed by the raw arrays, cells last
+    def save(self, filepath):
+        header = {"magic": STOCK_MAGIC, "locations": self.locations, "ids": self.ids,
+                  "capacity": len(self.product_totals)}
+        with atomic_write(filepath, "wb") as file:
+            file.write(json.dumps(header).encode("utf-8") + b"\n")
+            for values in (self.location_totals, self.product_totals, self.prices, self.cells):
+                values.tofile(file)
+
+    @classmethod
+    def load(cls, filepath):
+        with open(filepath, "rb") as file:
+            header = json.loads(file.readline())
+            if header.get("magic") != STOCK_MAGIC:
+                raise ValueError("{0} is not a location stock file".format(filepath))
+            stock = cls(header["locations"])
+            stock.location_totals = array("q")
+            stock.location_totals.fromfile(file, len(stock.locations))
+            capacity = header["capacity"]
+            for name in ("product_totals", "prices"):
+                getattr(stock, name).fromfile(file, capacity)
+            stock.cells.fromfile(file, capacity * len(stock.locations))
+        stock.ids = header["ids"]
+        for row, product_id in enumerate(stock.ids):
+            if product_id is None:
+                stock.free.append(row)
+            else:
+                stock.rows[product_id] = row
+        return stock
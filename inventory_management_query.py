@@ -0,0 +1,221 @@
+from itertools import chain
+
+FIELDS = ("id", "name", "price", "quantity")
+
+
+# Base of the query predicates, combined with & (and), | (or) and ~ (not).
+# matches checks one product. plan says how an index can find the candidates:
+# (estimated count, function returning candidate keys), or None when only a scan
+# can. Candidates may be a superset, Inventory.query always checks matches.
+class Predicate:
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+    def matches(self, product) -> bool:
+        raise NotImplementedError
+
+    # stop: estimates above it are not worth counting exactly
+    def plan(self, inventory, stop):
+        return None
+
+
+# low <= field <= high on price or quantity (either bound may be None)
+class Range(Predicate):
+    def __init__(self, field, low=None, high=None, inclusive=(True, True)) -> None:
+        self.field = field
+        self.low = low
+        self.high = high
+        self.inclusive = inclusive
+
+    def __repr__(self) -> str:
+        return "Range({0!r}, {1!r}, {2!r}, {3!r})".format(
+            self.field, self.low, self.high, self.inclusive)
+
+    def matches(self, product):
+        value = getattr(product, self.field)
+        if self.low is not None and (value < self.low or
+                                     (value == self.low and not self.inclusive[0])):
+            return False
+        if self.high is not None and (value > self.high or
+                                      (value == self.high and not self.inclusive[1])):
+            return False
+        return True
+
+    def plan(self, inventory, stop):
+        index = inventory.field_index(self.field)
+        if index is None:
+            return None
+        estimate = index.count(self.low, self.high, self.inclusive, stop)
+        return estimate, lambda: index.range(self.low, self.high, self.inclusive)
+
+
+# field is one of values (== is the single value case)
+class In(Predicate):
+    def __init__(self, field, values) -> None:
+        self.field = field
+        self.values = list(dict.fromkeys(values))
+
+    def __repr__(self) -> str:
+        return "In({0!r}, {1!r})".format(self.field, self.values)
+
+    def matches(self, product):
+        return getattr(product, self.field) in self.values
+
+    def plan(self, inventory, stop):
+        if self.field == "id":  # Ids are the keys
+            return len(self.values), lambda: iter(self.values)
+        index = inventory.field_index(self.field)
+        if index is None:
+            return None
+        return (sum(len(index.buckets.get(value, ())) for value in self.values),
+                lambda: chain.from_iterable(index.buckets.get(value, ())
+                                            for value in self.values))
+
+
+# Case-insensitive substring of id or name, found through the keyword search index
+class Contains(Predicate):
+    def __init__(self, field, text) -> None:
+        self.field = field
+        self.text = text.lower()
+
+    def __repr__(self) -> str:
+        return "Contains({0!r}, {1!r})".format(self.field, self.text)
+
+    def matches(self, product):
+        return self.text in str(getattr(product, self.field)).lower()
+
+    def plan(self, inventory, stop):
+        index = inventory.search_index
+        if index is None or len(self.text) < index.n:
+            return None
+        index.flush()
+        # The rarest ngram bounds the result, no need to search if that can't beat stop
+        grams = [self.text[i:i + index.n] for i in range(len(self.text) - index.n + 1)]
+        if min(len(index.postings.get(gram, ())) for gram in grams) >= stop:
+            return None
+        keys = index.search(self.text)  # Matches in any field, a superset
+        return len(keys), lambda: iter(keys)
+
+
+# Case-insensitive prefix of id or name
+class StartsWith(Predicate):
+    def __init__(self, field, text) -> None:
+        self.field = field
+        self.text = text.lower()
+
+    def __repr__(self) -> str:
+        return "StartsWith({0!r}, {1!r})".format(self.field, self.text)
+
+    def matches(self, product):
+        return str(getattr(product, self.field)).lower().startswith(self.text)
+
+
+class And(Predicate):
+    def __init__(self, *predicates) -> None:
+        self.predicates = predicates
+
+    def __repr__(self) -> str:
+        return "And{0!r}".format(self.predicates)
+
+    def matches(self, product):
+        return all(predicate.matches(product) for predicate in self.predicates)
+
+    # Candidates of the most selective part, the rest is checked per product.
+    # Substring parts are planned last, a small enough stop lets them skip the search.
+    def plan(self, inventory, stop):
+        best = None
+        for predicate in sorted(self.predicates, key=lambda p: isinstance(p, Contains)):
+            plan = predicate.plan(inventory, stop)
+            if plan is not None and (best is None or plan[0] < best[0]):
+                best = plan
+                stop = plan[0]
+        return best
+
+
+class Or(Predicate):
+    def __init__(self, *predicates) -> None:
+        self.predicates = predicates
+
+    def __repr__(self) -> str:
+        return "Or{0!r}".format(self.predicates)
+
+    def matches(self, product):
+        return any(predicate.matches(product) for predicate in self.predicates)
+
+    # Union of every part's candidates, only possible when every part has an index
+    def plan(self, inventory, stop):
+        plans = []
+        for predicate in self.predicates:
+            plan = predicate.plan(inventory, stop)
+            if plan is None:
+                return None
+            plans.append(plan)
+
+        def union():
+            seen = set()
+            for _, candidates in plans:
+                for key in candidates():
+                    if key not in seen:
+                        seen.add(key)
+                        yield key
+        return sum(estimate for estimate, _ in plans), union
+
+
+class Not(Predicate):
+    def __init__(self, predicate) -> None:
+        self.predicate = predicate
+
+    def __repr__(self) -> str:
+        return "Not({0!r})".format(self.predicate)
+
+    def matches(self, product):
+        return not self.predicate.matches(product)
+
+
+# Builds predicates from comparisons:
+#     price, quantity = Field("price"), Field("quantity")
+#     (price >= 500) & (price <= 1500) & (quantity < 10)
+class Field:
+    def __init__(self, name) -> None:
+        if name not in FIELDS:
+            raise ValueError("Unknown field {0!r}, expected one of: {1}".format(
+                name, ", ".join(FIELDS)))
+        self.name = name
+
+    def __lt__(self, value):
+        return Range(self.name, high=value, inclusive=(True, False))
+
+    def __le__(self, value):
+        return Range(self.name, high=value)
+
+    def __gt__(self, value):
+        return Range(self.name, low=value, inclusive=(False, True))
+
+    def __ge__(self, value):
+        return Range(self.name, low=value)
+
+    def __eq__(self, value):
+        return In(self.name, [value])
+
+    def __ne__(self, value):
+        return Not(In(self.name, [value]))
+
+    __hash__ = None
+
+    def between(self, low, high):
+        return Range(self.name, low, high)
+
+    def isin(self, values):
+        return In(self.name, values)
+
+    def contains(self, text):
+        return Contains(self.name, text)
+
+    def startswith(self, text):
+        return StartsWith(self.name, text)
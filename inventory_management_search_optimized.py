@@ -1,12 +1,56 @@
 import os
 import json
 import re
-import pandas as pd
+import codecs
+import mmap
+import struct
+import zlib
+import math
+from bisect import bisect_left, bisect_right, insort
+from array import array
+import time
+import threading
+import functools
+import heapq
+import types
+import weakref
+from contextlib import contextmanager, nullcontext
+from collections import OrderedDict
+from collections.abc import ItemsView, Mapping, ValuesView
+from itertools import chain, islice
+from operator import attrgetter, mul
+
+from inventory_management_files import atomic_write
+from inventory_management_query import FIELDS
+from inventory_management_ledger import MovementLedger
+from inventory_management_locations import LocationStock
 
 ALPHANUMERIC_REGEX = "^[a-zA-Z0-9_]*$"
+ID_PATTERN = re.compile(ALPHANUMERIC_REGEX)
+# Whole id, unlike ALPHANUMERIC_REGEX's "$" it doesn't let a trailing newline through
+ID_FULL_PATTERN = re.compile(r"[a-zA-Z0-9_]+")
+NGRAM_SIZE = 3
+WORD_REGEX = re.compile(r"\w+")
+MAX_EDIT_DISTANCE = 2  # Largest typo distance the fuzzy search index is built for
+LOAD_CHUNK_SIZE = 1 << 16  # Bytes read per step by the streaming loader
+JOURNAL_SUFFIX = ".log"  # Journal lives next to the snapshot, e.g. backup.json.log
+CHECKSUM_SUFFIX = ".crc"  # crc32 and size of the snapshot we last wrote, e.g. backup.json.crc
+EXPORT_CHUNK_SIZE = 10000  # Rows per Parquet/Arrow record batch
+EXPORT_COLUMNS = {"id": "ID", "name": "Name", "price": "Price", "quantity": "Quantity"}
+# Public methods Instrumentation leaves unwrapped: menu operations that print, and profile
+CONSOLE_METHODS = ("print_product_list", "generate_report", "export_to_excel", "profile")
+QUERY_SORT_BUFFER = 100000  # Largest candidate set query sorts in memory instead of walking an index
+IMPORT_CHUNK_SIZE = 100000  # Rows validated and stored per step by import_file
+BINARY_MAGIC = b"INVB"
+BINARY_VERSION = 1
+# magic, version, flags, product count, string table size, crc32 of everything after the header
+BINARY_HEADER = struct.Struct("<4sHHQQI4x")
 
 
 class Product:
+    # No per-instance __dict__, keeps memory per product small for big catalogs
+    __slots__ = ("_id", "_name", "_price", "_quantity")
+
     def __init__(self, id, name, price, quantity) -> None:
         self.id = id
         self.name = name
@@ -38,7 +82,7 @@ class Product:
     # Setters with validations
     @id.setter
     def id(self, value):
-        if (value == None or value == "" or re.search(ALPHANUMERIC_REGEX,value)==None):
+        if (value == None or value == "" or ID_PATTERN.search(value)==None):
             raise ValueError("id can only be alphanumeric")
         self._id = value
 
@@ -72,39 +116,1928 @@ class Product:
             'quantity':self.quantity
         }
 
+    # Build a Product without running the setters, only for values known to be valid:
+    # rows checked by validate_columns or read from a snapshot whose checksum matches.
+    # Anything else from outside goes through Product(...).
+    @classmethod
+    def trusted(cls, id, name, price, quantity):
+        product = object.__new__(cls)
+        product._id = id
+        product._name = name
+        product._price = price
+        product._quantity = quantity
+        return product
+
+    # List of trusted Products from (id, name, price, quantity) rows, the loop is
+    # inlined as it is about 1.5x faster than calling trusted per row
+    @classmethod
+    def trusted_many(cls, rows):
+        new = object.__new__
+        products = []
+        append = products.append
+        for id, name, price, quantity in rows:
+            product = new(cls)
+            product._id = id
+            product._name = name
+            product._price = price
+            product._quantity = quantity
+            append(product)
+        return products
+
+
+# Turn products given as Product objects, (id, name, price, quantity) tuples or dicts,
+# or as separate columns, into four lists
+def to_columns(products=None, ids=None, names=None, prices=None, quantities=None):
+    if products is not None:
+        ids, names, prices, quantities = [], [], [], []
+        for row in products:
+            if isinstance(row, Product):
+                row = (row.id, row.name, row.price, row.quantity)
+            elif isinstance(row, dict):
+                row = (row["id"], row["name"], row["price"], row["quantity"])
+            id, name, price, quantity = row
+            ids.append(id)
+            names.append(name)
+            prices.append(price)
+            quantities.append(quantity)
+        return ids, names, prices, quantities
+    columns = []
+    for column in (ids, names, prices, quantities):
+        if column is None:
+            raise TypeError("Pass products or all of ids, names, prices and quantities")
+        # NumPy arrays / pandas Series hold NumPy scalars, tolist gives Python ones
+        columns.append(column.tolist() if hasattr(column, "tolist") else list(column))
+    if len(set(map(len, columns))) > 1:
+        raise ValueError("Columns must all have the same length")
+    return tuple(columns)
+
+
+# Same rules as the Product setters, checked a column at a time. Raises the same
+# error types as the setters, naming the first bad row.
+def validate_columns(ids, names, prices, quantities):
+    if not (set(map(type, ids)) <= {str} and all(map(ID_FULL_PATTERN.fullmatch, ids))):
+        for row, id in enumerate(ids):
+            if not isinstance(id, str) or ID_FULL_PATTERN.fullmatch(id) is None:
+                raise ValueError("Row {0}: id can only be alphanumeric".format(row))
+    if not set(map(type, names)) <= {str}:
+        for row, name in enumerate(names):
+            if not isinstance(name, str):
+                raise TypeError("Row {0}: Name must be string".format(row))
+    if not (set(map(type, prices)) <= {int, float} and (not prices or min(prices) >= 0)):
+        for row, price in enumerate(prices):
+            if not (isinstance(price, float) or isinstance(price, int)):
+                raise TypeError("Row {0}: Price must be a number".format(row))
+            elif price < 0:
+                raise ValueError("Row {0}: Price cannot be negative".format(row))
+    if not (set(map(type, quantities)) <= {int} and (not quantities or min(quantities) >= 0)):
+        for row, quantity in enumerate(quantities):
+            if not isinstance(quantity, int):
+                raise TypeError("Row {0}: Quantity must be a number".format(row))
+            elif quantity < 0:
+                raise ValueError("Row {0}: Quantity cannot be negative".format(row))
+
+
+# Stream (product_id, fields) pairs out of an id-keyed JSON backup one entry at a time,
+# only the current chunk and entry are held in memory.
+# progress(bytes_read, total_bytes) is called after every chunk.
+def iter_backup(filepath, chunk_size=LOAD_CHUNK_SIZE, progress=None):
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    total_bytes = os.path.getsize(filepath)
+    bytes_read = 0
+    with open(filepath, "rb") as file:
+        buffer, pos, eof = "", 0, False
+
+        def read_more():
+            nonlocal buffer, pos, eof, bytes_read
+            chunk = file.read(chunk_size)
+            bytes_read += len(chunk)
+            eof = not chunk
+            buffer = buffer[pos:] + utf8.decode(chunk, final=eof)
+            pos = 0
+            if progress is not None:
+                progress(bytes_read, total_bytes)
+
+        def next_token():
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer[pos]
+                if eof:
+                    raise ValueError("Unexpected end of backup file")
+                read_more()
+
+        def decode_value():
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    if end < len(buffer) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                read_more()  # Value is cut off at the end of the chunk
+
+        read_more()
+        if next_token() != "{":
+            raise ValueError("Backup must be a JSON object keyed by product id")
+        pos += 1
+        if next_token() == "}":
+            return
+        while True:
+            key = decode_value()
+            if next_token() != ":":
+                raise ValueError("Expected ':' after key {0!r}".format(key))
+            pos += 1
+            next_token()
+            yield key, decode_value()
+            token = next_token()
+            pos += 1
+            if token == "}":
+                return
+            if token != ",":
+                raise ValueError("Expected ',' or '}}' after entry {0!r}".format(key))
+            next_token()
+
+
+# Fixed-record binary snapshot, read through mmap so nothing is decoded until asked for.
+# Layout after the header, every section 8-byte aligned:
+#   string offsets  uint64[3n+1]  key, id and name of record i are strings 3i, 3i+1, 3i+2
+#   sorted order    uint64[n]     record numbers sorted by key bytes, for binary search
+#   prices          float64[n]
+#   quantities      int64[n]
+#   price is int    uint8[n]      so 300 and 300.0 come back as they went in
+#   string table    utf-8 bytes
+class BinarySnapshot:
+    def __init__(self, filepath) -> None:
+        self.filepath = filepath
+        with open(filepath, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, count, strings_size, self.checksum = \
+            BINARY_HEADER.unpack_from(self._mmap)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            self.close()
+            raise ValueError("{0} is not a binary inventory snapshot".format(filepath))
+        self.count = count
+        self.verified = False  # Set by verify, verified records skip Product validation
+        self.position = 0  # Records handed out by __iter__ so far
+        view = memoryview(self._mmap)
+        offset = BINARY_HEADER.size
+
+        def section(nbytes, fmt):
+            nonlocal offset
+            column = view[offset:offset + nbytes].cast(fmt)
+            offset += _padded(nbytes)
+            return column
+
+        self._offsets = section(8 * (3 * count + 1), "Q")
+        self._order = section(8 * count, "Q")
+        self._prices = section(8 * count, "d")
+        self._quantities = section(8 * count, "q")
+        self._price_is_int = section(count, "B")
+        self._strings_start = offset
+        if offset + strings_size != len(self._mmap):
+            self.close()
+            raise ValueError("{0} is truncated".format(filepath))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self):
+        for name in ("_offsets", "_order", "_prices", "_quantities", "_price_is_int"):
+            column = getattr(self, name, None)
+            if column is not None:
+                column.release()
+        self._mmap.close()
+
+    def verify(self):
+        checksum = 0
+        for start in range(BINARY_HEADER.size, len(self._mmap), LOAD_CHUNK_SIZE):
+            checksum = zlib.crc32(self._mmap[start:start + LOAD_CHUNK_SIZE], checksum)
+        self.verified = checksum == self.checksum
+        return self.verified
+
+    def _bytes(self, n):
+        start = self._strings_start
+        return self._mmap[start + self._offsets[n]:start + self._offsets[n + 1]]
+
+    def key_at(self, record):
+        return self._bytes(3 * record).decode("utf-8")
+
+    def product_at(self, record):
+        price = self._prices[record]
+        if self._price_is_int[record]:
+            price = int(price)
+        factory = Product.trusted if self.verified else Product
+        return factory(self._bytes(3 * record + 1).decode("utf-8"),
+                       self._bytes(3 * record + 2).decode("utf-8"),
+                       price, self._quantities[record])
+
+    # Binary search over the sorted order, O(log n)
+    def find(self, key):
+        target = key.encode("utf-8")
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._bytes(3 * self._order[middle]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._bytes(3 * self._order[low]) == target:
+            return self._order[low]
+        return None
+
+    def get(self, key):
+        record = self.find(key)
+        return None if record is None else self.product_at(record)
+
+    def __iter__(self):
+        for record in range(self.count):
+            self.position = record + 1
+            yield self.key_at(record), self.product_at(record)
+
+    # Add the records from start on, bar the skipped ones, to totals straight from the
+    # columns: no Product is built
+    def add_totals(self, totals, start=0, skip=()):
+        with self._prices[start:] as prices, self._quantities[start:] as quantities:
+            totals.add_many(prices, quantities)
+        for record in skip:
+            if record >= start:
+                totals.remove(self._prices[record], self._quantities[record])
+        return totals
+
+    @staticmethod
+    def write(filepath, items):
+        offsets, strings = array("Q", [0]), bytearray()
+        prices, quantities, price_is_int = array("d"), array("q"), array("B")
+        keys = []
+        for key, product in items.items():
+            encoded_key = key.encode("utf-8")
+            keys.append(encoded_key)
+            for text in (encoded_key, product.id.encode("utf-8"),
+                         product.name.encode("utf-8")):
+                strings += text
+                offsets.append(len(strings))
+            prices.append(product.price)
+            quantities.append(product.quantity)
+            price_is_int.append(isinstance(product.price, int))
+        order = array("Q", sorted(range(len(keys)), key=keys.__getitem__))
+
+        body = bytearray()
+        for column in (offsets, order, prices, quantities, price_is_int):
+            column = column.tobytes()
+            body += column + bytes(_padded(len(column)) - len(column))
+        body += strings
+        header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, len(keys),
+                                    len(strings), zlib.crc32(body))
+        with atomic_write(filepath, "wb") as file:
+            file.write(header)
+            file.write(body)
+
+
+def _padded(nbytes):
+    return (nbytes + 7) & ~7
+
+
+# Converters between the JSON backup and the binary snapshot
+def json_to_binary(json_filepath, binary_filepath):
+    items = {key: Product(**fields) for key, fields in iter_backup(json_filepath)}
+    BinarySnapshot.write(binary_filepath, items)
+
+
+def binary_to_json(binary_filepath, json_filepath):
+    snapshot = BinarySnapshot(binary_filepath)
+    try:
+        with open(json_filepath, "w") as file:
+            json.dump({key: product.to_dict() for key, product in snapshot}, file)
+    finally:
+        snapshot.close()
+
+
+# Sorted list of values split into chunks, so inserts and removals only shift one
+# chunk instead of the whole list (O(sqrt n) worst case, range lookups O(log n))
+class SortedList:
+    CHUNK_SIZE = 512
+
+    # Bulk load from any iterable, one sort instead of an insort per value
+    def __init__(self, values=()) -> None:
+        values = sorted(values)
+        self._chunks = [values[i:i + self.CHUNK_SIZE]
+                        for i in range(0, len(values), self.CHUNK_SIZE)]
+        self._maxes = [chunk[-1] for chunk in self._chunks]  # Largest value of every chunk
+        self._length = len(values)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield from chunk
+
+    def add(self, value):
+        self._length += 1
+        if not self._maxes:
+            self._chunks.append([value])
+            self._maxes.append(value)
+            return
+        i = bisect_left(self._maxes, value)
+        if i == len(self._maxes):
+            i -= 1
+            self._chunks[i].append(value)
+            self._maxes[i] = value
+        else:
+            insort(self._chunks[i], value)
+        chunk = self._chunks[i]
+        if len(chunk) > 2 * self.CHUNK_SIZE:
+            tail = chunk[self.CHUNK_SIZE:]
+            del chunk[self.CHUNK_SIZE:]
+            self._maxes[i] = chunk[-1]
+            self._chunks.insert(i + 1, tail)
+            self._maxes.insert(i + 1, tail[-1])
+
+    def remove(self, value):
+        i = bisect_left(self._maxes, value)
+        chunk = self._chunks[i] if i < len(self._chunks) else []
+        j = bisect_left(chunk, value)
+        if j == len(chunk) or chunk[j] != value:
+            raise ValueError("{0!r} not in list".format(value))
+        del chunk[j]
+        self._length -= 1
+        if chunk:
+            self._maxes[i] = chunk[-1]
+        else:
+            del self._chunks[i]
+            del self._maxes[i]
+
+    # Values between low and high in ascending order, descending with reverse=True
+    # (None means unbounded)
+    def irange(self, low=None, high=None, inclusive=(True, True), reverse=False):
+        chunks, maxes = self._chunks, self._maxes
+        if not chunks:
+            return
+        # First position at or after low
+        if low is None:
+            i, start = 0, 0
+        else:
+            find = bisect_left if inclusive[0] else bisect_right
+            i = find(maxes, low)
+            if i == len(chunks):
+                return
+            start = find(chunks[i], low)
+        # Position just after high
+        j, end = len(chunks) - 1, len(chunks[-1])
+        if high is not None:
+            find = bisect_right if inclusive[1] else bisect_left
+            k = find(maxes, high)
+            if k < len(chunks):
+                j, end = k, find(chunks[k], high)
+        if (i, start) >= (j, end):
+            return
+        for k in (range(j, i - 1, -1) if reverse else range(i, j + 1)):
+            chunk = chunks[k]
+            values = chunk[start if k == i else 0:end if k == j else len(chunk)]
+            yield from (reversed(values) if reverse else values)
+
+
+# Product keys grouped by the value of one field, in value order. Answers
+# "every key with value <= k" in O(log n + result).
+class SortedIndex:
+    def __init__(self) -> None:
+        self.buckets = {}  # value -> keys with that value (dict used as an ordered set)
+        self.values = SortedList()  # Distinct values
+
+    def __len__(self) -> int:
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def add(self, key, value):
+        bucket = self.buckets.get(value)
+        if bucket is None:
+            bucket = self.buckets[value] = {}
+            self.values.add(value)
+        bucket[key] = None
+
+    # add for many (key, value) pairs, new values are sorted in once for the batch
+    def add_many(self, pairs):
+        buckets, new_values = self.buckets, []
+        for key, value in pairs:
+            bucket = buckets.get(value)
+            if bucket is None:
+                bucket = buckets[value] = {}
+                new_values.append(value)
+            bucket[key] = None
+        if len(new_values) > len(self.values) // 8:
+            self.values = SortedList(chain(self.values, new_values))
+        else:
+            for value in new_values:
+                self.values.add(value)
+
+    def discard(self, key, value):
+        bucket = self.buckets.get(value)
+        if bucket is None or key not in bucket:
+            return
+        del bucket[key]
+        if not bucket:
+            del self.buckets[value]
+            self.values.remove(value)
+
+    def clear(self):
+        self.buckets.clear()
+        self.values = SortedList()
+
+    # Keys whose value is in the range, ordered by value
+    def range(self, low=None, high=None, inclusive=(True, True), reverse=False):
+        for value in self.values.irange(low, high, inclusive, reverse):
+            yield from self.buckets[value]
+
+    # How many keys range would give, counting stops once past stop
+    def count(self, low=None, high=None, inclusive=(True, True), stop=None):
+        total = 0
+        for value in self.values.irange(low, high, inclusive):
+            total += len(self.buckets[value])
+            if stop is not None and total > stop:
+                break
+        return total
+
+    def at_most(self, limit):
+        return self.range(high=limit)
+
+
+# Default low stock listener, the alert the CLI has always shown
+def print_low_stock_alert(product: Product):
+    print("⚠ Low inventory alert for {0}".format(product))
+
+
+def print_location_low_stock_alert(product: Product, location):
+    print("⚠ Low inventory alert for {0} at {1}".format(product, location))
+
+
+# Running totals for reports, kept up to date by every add/update/delete in O(1)
+class InventoryTotals:
+    __slots__ = ("products", "units", "value")
+
+    def __init__(self) -> None:
+        self.products = 0
+        self.units = 0
+        self.value = 0
+
+    def __eq__(self, other) -> bool:
+        return (self.products == other.products and self.units == other.units
+                and math.isclose(self.value, other.value, rel_tol=1e-9, abs_tol=1e-6))
+
+    def __repr__(self) -> str:
+        return 'InventoryTotals(products={0.products}, units={0.units}, value={0.value})'.format(self)
+
+    def add(self, price, quantity):
+        self.products += 1
+        self.units += quantity
+        self.value += price * quantity
+
+    def remove(self, price, quantity):
+        self.products -= 1
+        self.units -= quantity
+        self.value -= price * quantity
+
+    # A whole batch of new products at once
+    def add_many(self, prices, quantities):
+        self.products += len(quantities)
+        self.units += sum(quantities)
+        self.value += sum(map(mul, prices, quantities))
+
+    def copy(self):
+        totals = InventoryTotals()
+        totals.products, totals.units, totals.value = self.products, self.units, self.value
+        return totals
+
+    def to_dict(self):
+        return {
+            'products': self.products,
+            'units': self.units,
+            'total_value': self.value
+        }
+
+
+# Read-only view of the products as they were when Inventory.snapshot was called.
+# Taking one copies nothing: it remembers how long the inventory's key log was, and
+# until it is closed every write first saves the product it replaces here (None for
+# ids that did not exist yet), so the live dict plus these saved products give the old
+# state. Readers never iterate the live dict, writers can go on while they scan.
+class InventorySnapshot(Mapping):
+    def __init__(self, items, keys, totals, moves=None, registry=None) -> None:
+        self._items = items
+        self._keys = keys  # Only appended to by writers, a replaced log stays ours
+        self._count = len(keys)
+        self._moves = {} if moves is None else moves  # Key -> later positions in keys
+        self._before = {}  # Key -> product at snapshot time (None = did not exist)
+        self._registry = registry
+        self.totals = totals
+        if registry is not None:
+            registry[id(self)] = self
+
+    def __str__(self) -> str:
+        return 'Inventory (Ids: {0}, Length: {1})'.format(list(self), len(self))
+
+    def __getitem__(self, key):
+        # Live value first: a write saves the old product before changing the dict
+        product = self._before.get(key, self._items.get(key))
+        if product is None:
+            raise KeyError(key)
+        return product
+
+    def __len__(self):
+        return self.totals.products
+
+    def __iter__(self):
+        for key, _ in self._walk():
+            yield key
+
+    def _walk(self):
+        keys, items, before, moves, count = \
+            self._keys, self._items, self._before, self._moves, self._count
+        for position in range(count):
+            key = keys[position]
+            moved = moves.get(key)
+            if moved and any(position < later < count for later in moved):
+                continue  # Deleted and added again, it comes later
+            product = before.get(key, items.get(key))
+            if product is not None:
+                yield key, product
+
+    def values(self):
+        return SnapshotValues(self)
+
+    def items(self):
+        return SnapshotItemsView(self)
+
+    # Stop collecting replaced products, the snapshot must not be read afterwards
+    def close(self):
+        if self._registry is not None:
+            self._registry.pop(id(self), None)
+            self._registry = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SnapshotValues(ValuesView):
+    def __iter__(self):
+        for _, product in self._mapping._walk():
+            yield product
+
+
+class SnapshotItemsView(ItemsView):
+    def __iter__(self):
+        yield from self._mapping._walk()
+
+
+# Write rows (tuples in the order of columns) to filepath without holding them all.
+# The format comes from the extension: .csv, .csv.gz / .gz, .parquet, .arrow / .feather
+def export_rows(rows, filepath, columns, chunk_size=EXPORT_CHUNK_SIZE):
+    import csv
+    import gzip
+    header = [EXPORT_COLUMNS[column] for column in columns]
+    if filepath.endswith((".parquet", ".arrow", ".feather")):
+        return _export_arrow(rows, filepath, columns, header, chunk_size)
+    if filepath.endswith(".gz"):
+        file = gzip.open(filepath, "wt", newline="", encoding="utf-8")
+    else:
+        file = open(filepath, "w", newline="", encoding="utf-8")
+    if "price" in columns:
+        rows = _float_column(rows, columns.index("price"))
+    count = 0
+    with file:
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(header)
+        for chunk in iter(lambda: list(islice(rows, chunk_size)), []):
+            writer.writerows(chunk)
+            count += len(chunk)
+    return count
+
+
+# Prices go out as floats, the way the float64 column of a DataFrame wrote them (300 as 300.0)
+def _float_column(rows, index):
+    for row in rows:
+        yield row[:index] + (float(row[index]),) + row[index + 1:]
+
+
+def _export_arrow(rows, filepath, columns, header, chunk_size):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet/Arrow export needs pyarrow: pip install pyarrow")
+    types = {"id": pa.string(), "name": pa.string(), "price": pa.float64(),
+             "quantity": pa.int64()}
+    schema = pa.schema([(label, types[column]) for column, label in zip(columns, header)])
+    if filepath.endswith(".parquet"):
+        writer = pq.ParquetWriter(filepath, schema)
+    else:
+        writer = pa.ipc.new_file(filepath, schema)
+    count = 0
+    with writer:
+        for chunk in iter(lambda: list(islice(rows, chunk_size)), []):
+            writer.write_batch(pa.record_batch([list(values) for values in zip(*chunk)],
+                                               schema=schema))
+            count += len(chunk)
+    return count
+
+
+# Log-linear latency histogram: 4 buckets per power of two of microseconds, so
+# percentiles are within ~19% and recording is O(1) with fixed memory
+class LatencyHistogram:
+    SUB_BUCKETS = 4
+
+    def __init__(self) -> None:
+        self.counts = {}  # bucket -> number of samples
+        self.count = 0
+        self.total = 0.0  # seconds
+        self.max = 0.0
+
+    def record(self, seconds):
+        microseconds = seconds * 1e6
+        bucket = 0 if microseconds < 1 else int(math.log2(microseconds) * self.SUB_BUCKETS) + 1
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    # Upper bound (seconds) of the bucket holding the p-th percentile, p in 0..100
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(2 ** (bucket / self.SUB_BUCKETS) / 1e6, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'max_ms': self.max * 1000
+        }
+
+
+# Opt-in timings and I/O counters of one Inventory, see Inventory(instrument=True).
+# Only then are its public methods wrapped, on the instance, so a plain Inventory
+# still runs the class methods untouched.
+class Instrumentation:
+    def __init__(self) -> None:
+        self.methods = {}  # method name -> LatencyHistogram of its calls
+        self.counters = {}  # bytes_read, bytes_written, items_scanned (by keyword search)
+        self._lock = threading.Lock()
+        self._local = threading.local()  # .timing is set while a wrapped call of the thread runs
+
+    # Only the outermost wrapped call of a thread is timed: add_item calling update_item
+    # counts as one add_item, its time isn't counted again under update_item
+    def wrap(self, name, method):
+        histogram = self.methods.setdefault(name, LatencyHistogram())
+        lock, local, perf_counter = self._lock, self._local, time.perf_counter
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            if getattr(local, "timing", False):
+                return method(*args, **kwargs)
+            local.timing = True
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                local.timing = False
+                with lock:
+                    histogram.record(elapsed)
+        return timed
+
+    def count(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    # iter_backup progress callback that also counts the bytes read
+    def reading(self, progress=None):
+        last = 0
+
+        def counted(bytes_read, total_bytes):
+            nonlocal last
+            self.count("bytes_read", bytes_read - last)
+            last = bytes_read
+            if progress is not None:
+                progress(bytes_read, total_bytes)
+        return counted
+
+    # Call count, cumulative time and latency percentiles of every method called so far
+    def to_dict(self):
+        with self._lock:
+            return {
+                'methods': {name: dict(histogram.to_dict(), total_s=histogram.total)
+                            for name, histogram in self.methods.items() if histogram.count},
+                'counters': dict(self.counters)
+            }
+
+    def dump(self, filepath):
+        with open(filepath, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def dump_at_exit(self, filepath):
+        import atexit
+        atexit.register(self.dump, filepath)
+
+
+# Runs every n-th call of a method under cProfile, and with memory=True under tracemalloc
+# too, keeping the largest peak of traced memory. See Inventory.profile.
+class ProfileHook:
+    _active = False  # cProfile can't nest, calls made while one is profiled run as usual
+
+    def __init__(self, every=1, memory=False) -> None:
+        import cProfile
+        self.every = every
+        self.memory = memory
+        self.profile = cProfile.Profile()
+        self.calls = 0
+        self.sampled = 0
+        self.memory_peak = 0  # bytes
+
+    def wrap(self, method):
+        @functools.wraps(method)
+        def sampled(*args, **kwargs):
+            self.calls += 1
+            if self.calls % self.every or ProfileHook._active:
+                return method(*args, **kwargs)
+            ProfileHook._active = True
+            self.sampled += 1
+            if self.memory:
+                import tracemalloc
+                tracing = tracemalloc.is_tracing()
+                if tracing:
+                    tracemalloc.reset_peak()
+                else:
+                    tracemalloc.start()
+            try:
+                return self.profile.runcall(method, *args, **kwargs)
+            finally:
+                ProfileHook._active = False
+                if self.memory:
+                    self.memory_peak = max(self.memory_peak, tracemalloc.get_traced_memory()[1])
+                    if not tracing:
+                        tracemalloc.stop()
+        return sampled
+
+    # pstats.Stats of the sampled calls, e.g. hook.stats().print_stats(10)
+    def stats(self, sort="cumulative"):
+        import pstats
+        return pstats.Stats(self.profile).sort_stats(sort)
+
+    # Profile in the format snakeviz / pstats read
+    def dump(self, filepath):
+        self.profile.dump_stats(filepath)
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'sampled': self.sampled,
+            'memory_peak_bytes': self.memory_peak
+        }
+
+
+# What import_file did: rows stored and (line, message) for every rejected row
+class ImportReport:
+    def __init__(self) -> None:
+        self.imported = 0
+        self.errors = []
+
+    def __str__(self) -> str:
+        return 'Imported {0} products, {1} rows rejected'.format(self.imported, len(self.errors))
+
+
+# (line number of the first row, DataFrame) chunks of a file written by export:
+# CSV (optionally gzip-compressed) or Parquet. For Parquet the "line" is the row number.
+def read_product_chunks(filepath, chunk_size=IMPORT_CHUNK_SIZE):
+    import pandas as pd
+    if filepath.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        line = 1
+        for batch in pq.ParquetFile(filepath).iter_batches(batch_size=chunk_size):
+            yield line, batch.to_pandas()
+            line += batch.num_rows
+        return
+    # Ids and names stay text, prices and quantities are parsed by the C reader
+    # (a chunk with a non-numeric value comes back as text and validate_frame sorts it out)
+    header = pd.read_csv(filepath, nrows=0).columns
+    text_columns = {column: str for column in header
+                    if str(column).strip().lower() in ("id", "name")}
+    line = 2  # Line 1 is the header
+    with pd.read_csv(filepath, chunksize=chunk_size, dtype=text_columns,
+                     keep_default_na=False, skip_blank_lines=False) as reader:
+        for chunk in reader:
+            yield line, chunk
+            line += len(chunk)
+
+
+# Validate a whole DataFrame chunk with column operations. Returns the good rows as
+# (ids, names, prices, quantities) lists and (line, message) for the bad ones.
+def validate_frame(frame, first_line):
+    import pandas as pd
+    frame = frame.rename(columns=lambda column: str(column).strip().lower())
+    missing = [column for column in EXPORT_COLUMNS if column not in frame.columns]
+    if missing:
+        raise ValueError("Missing columns: {0}".format(", ".join(missing)))
+    ids = frame["id"].astype(str)
+    prices = pd.to_numeric(frame["price"], errors="coerce")
+    quantities = pd.to_numeric(frame["quantity"], errors="coerce")
+    checks = [
+        (frame["id"].notna() & ids.str.fullmatch(r"[a-zA-Z0-9_]+"), "id can only be alphanumeric"),
+        (frame["name"].notna(), "Name must be string"),
+        (prices.notna(), "Price must be a number"),
+        (prices >= 0, "Price cannot be negative"),
+        (quantities.notna() & (quantities == quantities.round()), "Quantity must be a number"),
+        (quantities >= 0, "Quantity cannot be negative"),
+    ]
+    valid = pd.Series(True, index=frame.index)
+    for passed, _ in checks:
+        valid &= passed.fillna(False).astype(bool)
+
+    errors = []
+    if not valid.all():
+        for position in (~valid).to_numpy().nonzero()[0]:
+            index = frame.index[position]
+            message = next(message for passed, message in checks if not passed.get(index, False))
+            errors.append((first_line + int(position), message))
+    good = valid.to_numpy()
+    columns = (ids[good].tolist(), frame["name"][good].astype(str).tolist(),
+               prices[good].astype("float64").tolist(),
+               quantities[good].astype("int64").tolist())
+    return columns, errors
+
+
+# crc32 of a whole file, read in chunks
+def file_checksum(filepath):
+    checksum = 0
+    with open(filepath, "rb") as file:
+        for chunk in iter(lambda: file.read(LOAD_CHUNK_SIZE), b""):
+            checksum = zlib.crc32(chunk, checksum)
+    return checksum
+
+
+# Keep the crc32 and size of a snapshot next to it (backup.json.crc)
+def write_checksum(filepath, checksum):
+    with open(filepath + CHECKSUM_SUFFIX, "w") as file:
+        file.write("{0} {1}\n".format(checksum, os.path.getsize(filepath)))
+
+
+# True when the snapshot is still byte for byte the one its checksum was written for.
+# A missing, stale or unreadable checksum file only means the snapshot is not trusted.
+def checksum_matches(filepath):
+    try:
+        with open(filepath + CHECKSUM_SUFFIX) as file:
+            checksum, size = map(int, file.read().split())
+    except (OSError, ValueError):
+        return False
+    return os.path.getsize(filepath) == size and file_checksum(filepath) == checksum
+
+
+# Lower-cased text of every field that keyword search looks into
+def searchable_fields(product: Product):
+    return (str(product.id).lower(), str(product.name).lower(),
+            str(product.quantity).lower(), str(product.price).lower())
+
+
+def ngrams(text: str, n=NGRAM_SIZE):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+# Optimal string alignment distance (insert, delete, substitute, swap neighbours),
+# giving up with limit + 1 as soon as the distance must exceed limit
+def edit_distance(a: str, b: str, limit=MAX_EDIT_DISTANCE):
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+# Every string left after deleting up to distance characters from word (SymSpell)
+def deletes(word: str, distance):
+    variants, frontier = {word}, {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        variants |= frontier
+    return variants
+
+
+# Typo distance allowed for a query word: short words need to be closer
+def allowed_distance(word: str):
+    return 0 if len(word) <= 2 else 1 if len(word) <= 5 else 2
+
+
+# First limit distinct keys of (score, key) pairs that come best first
+def first_matches(matches, limit=None):
+    found = {}
+    for score, key in matches:
+        if key not in found:
+            found[key] = score
+            if len(found) == limit:
+                break
+    return found
+
+
+# Word-level index behind prefix, fuzzy and ranked search. Terms are the lower-cased
+# id and every word of the name. Terms are kept sorted for prefix ranges, and name
+# words get SymSpell delete variants so typos are found without comparing against
+# the whole vocabulary.
+class WordIndex:
+    def __init__(self, max_distance=MAX_EDIT_DISTANCE) -> None:
+        self.max_distance = max_distance
+        self.postings = {}  # term -> {key: None}, keys in the order they got the term
+        self.terms = SortedList()  # Distinct terms
+        self.name_words = {}  # word -> number of products with it in their name
+        self.deletes = {}  # word minus up to max_distance characters -> words
+        self.keys = {}  # key -> (id term, name words) it is indexed under
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @staticmethod
+    def terms_of(product: Product):
+        return (str(product.id).lower(),
+                tuple(dict.fromkeys(WORD_REGEX.findall(str(product.name).lower()))))
+
+    # Index everything at once, sorting the terms a single time
+    def build(self, items):
+        new_terms = []
+        for key, product in items:
+            new_terms += self._index(key, self.terms_of(product))
+        self.terms = SortedList(new_terms)
+
+    def add(self, key, product: Product):
+        terms = self.terms_of(product)
+        old = self.keys.get(key)
+        if old == terms:
+            return
+        if old is not None:
+            self.discard(key)
+        for term in self._index(key, terms):
+            self.terms.add(term)
+
+    # Returns the terms seen for the first time
+    def _index(self, key, terms):
+        self.keys[key] = terms
+        id_term, words = terms
+        new_terms = []
+        for term in (id_term,) + words:
+            keys = self.postings.get(term)
+            if keys is None:
+                self.postings[term] = {key: None}
+                new_terms.append(term)
+            else:
+                keys[key] = None
+        for word in words:
+            count = self.name_words.get(word, 0)
+            self.name_words[word] = count + 1
+            if not count:
+                for variant in deletes(word, self.max_distance):
+                    self.deletes.setdefault(variant, set()).add(word)
+        return new_terms
+
+    def discard(self, key):
+        terms = self.keys.pop(key, None)
+        if terms is None:
+            return
+        id_term, words = terms
+        for term in (id_term,) + words:
+            keys = self.postings.get(term)
+            if keys is None:
+                continue  # The id was also a word of the name, already gone
+            keys.pop(key, None)
+            if not keys:
+                del self.postings[term]
+                self.terms.remove(term)
+        for word in words:
+            count = self.name_words[word] - 1
+            if count:
+                self.name_words[word] = count
+                continue
+            del self.name_words[word]
+            for variant in deletes(word, self.max_distance):
+                words_left = self.deletes[variant]
+                words_left.discard(word)
+                if not words_left:
+                    del self.deletes[variant]
+
+    def clear(self):
+        self.__init__(self.max_distance)
+
+    # (term, key) for every term starting with prefix, in term order
+    def prefix(self, prefix: str):
+        for term in self.terms.irange(prefix, prefix + "\U0010ffff"):
+            for key in self.postings[term]:
+                yield term, key
+
+    # Name words within distance of word -> their distance
+    def similar_words(self, word: str, distance):
+        distance = min(distance, self.max_distance)
+        found, checked = {}, set()
+        for variant in deletes(word, distance):
+            for candidate in self.deletes.get(variant, ()):
+                if candidate not in checked:
+                    checked.add(candidate)
+                    d = edit_distance(word, candidate, distance)
+                    if d <= distance:
+                        found[candidate] = d
+        return found
+
+    # Name words close to each word of query, an empty dict for a word with none
+    def similar_query(self, query: str, max_distance=None):
+        return [self.similar_words(
+                    word, allowed_distance(word) if max_distance is None else max_distance)
+                for word in WORD_REGEX.findall(query)]
+
+    # Products under the close words of each query word, see fuzzy
+    def fuzzy_counts(self, query: str, max_distance=None):
+        return [sum(len(self.postings[w]) for w in words)
+                for words in self.similar_query(query, max_distance)]
+
+    # ((distance, word), key) for products whose name has a word close to every query
+    # word, closest first, then by word and posting order. Candidates come from the
+    # rarest query word (by counts when given, see ShardedInventory), so a limit on the
+    # results bounds the work whatever the catalog size.
+    def fuzzy(self, query: str, max_distance=None, counts=None):
+        similar = self.similar_query(query, max_distance)
+        if not similar or not all(similar):
+            return
+        if counts is None:
+            counts = [sum(len(self.postings[w]) for w in words) for words in similar]
+        driving = counts.index(min(counts))
+        others = similar[:driving] + similar[driving + 1:]
+        for word, distance in sorted(similar[driving].items(),
+                                     key=lambda item: (item[1], item[0])):
+            for key in self.postings[word]:
+                name_words = self.keys[key][1]
+                if word in name_words and all(any(w in words for w in name_words)
+                                              for words in others):
+                    yield (distance, word), key
+
+
+# Bounded LRU cache of keyword -> matching product keys for keyword search. Entries
+# older than ttl seconds are dropped when looked up. Mutations only drop the keywords
+# whose set of matches they change (see invalidate), the rest stay cached.
+class SearchCache:
+    def __init__(self, maxsize=256, ttl=None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # lower-cased keyword -> (expiry time or None, keys)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0  # Dropped to stay within maxsize
+        self.expirations = 0  # Dropped for being older than ttl
+        self.invalidations = 0  # Dropped because a mutation changed their matches
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, keyword):
+        entry = self.entries.get(keyword)
+        if entry is not None:
+            expires, keys = entry
+            if expires is None or time.monotonic() < expires:
+                self.hits += 1
+                self.entries.move_to_end(keyword)
+                return keys
+            del self.entries[keyword]
+            self.expirations += 1
+        self.misses += 1
+        return None
+
+    def put(self, keyword, keys):
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        self.entries[keyword] = (expires, keys)
+        self.entries.move_to_end(keyword)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    # A product's searchable fields went from old_fields to new_fields (None when it
+    # didn't exist / no longer exists): drop the keywords it starts or stops matching.
+    # Keywords it matches both before and after stay, results are looked up by key.
+    def invalidate(self, old_fields, new_fields):
+        stale = [keyword for keyword in self.entries
+                 if any(keyword in text for text in old_fields or ())
+                 != any(keyword in text for text in new_fields or ())]
+        self._drop(stale)
+
+    # invalidate for a batch of products that didn't exist before. Their fields are
+    # joined so each keyword takes one substring search; a keyword spanning two fields
+    # only drops an entry that could have stayed.
+    def invalidate_new(self, fields):
+        if self.entries:
+            text = "\n".join(chain.from_iterable(fields))
+            self._drop([keyword for keyword in self.entries if keyword in text])
+
+    # Every product is gone, only keywords that matched nothing are still right
+    def invalidate_all(self):
+        self._drop([keyword for keyword, (_, keys) in self.entries.items() if keys])
+
+    def _drop(self, stale):
+        for keyword in stale:
+            del self.entries[keyword]
+        self.invalidations += len(stale)
+
+    def clear(self):
+        self.entries.clear()
+
+    def to_dict(self):
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations
+        }
+
+
+# Incremental trigram index used by keyword search, kept in sync with Inventory.items
+class TrigramIndex:
+    def __init__(self, n=NGRAM_SIZE) -> None:
+        self.n = n
+        self.postings = {}  # ngram -> set of product keys
+        self.fields = {}  # product key -> searchable fields
+        self.positions = {}  # product key -> insertion sequence (same order as dict)
+        self._next_position = 0
+        self.unposted = set()  # Keys added with add_later, posted on the next search
+        self.scanned = 0  # Products the last search checked
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def _grams(self, fields):
+        n = self.n
+        return {text[i:i + n] for text in fields for i in range(len(text) - n + 1)}
+
+    def _post(self, grams, key):
+        postings = self.postings
+        for gram in grams:
+            keys = postings.get(gram)
+            if keys is None:
+                postings[gram] = {key}
+            else:
+                keys.add(key)
+
+    # Index a new product or re-index an existing one (only changed ngrams are touched)
+    def add(self, key, product: Product):
+        fields = searchable_fields(product)
+        old_fields = self.fields.get(key)
+        if old_fields is None:
+            self.positions[key] = self._next_position
+            self._next_position += 1
+            self._post(self._grams(fields), key)
+        elif old_fields != fields and key not in self.unposted:
+            new_grams = self._grams(fields)
+            old_grams = self._grams(old_fields)
+            for gram in old_grams - new_grams:
+                self._unpost(gram, key)
+            self._post(new_grams - old_grams, key)
+        self.fields[key] = fields
+
+    # Index a product not in the index yet, its ngrams are only posted by the next flush
+    # (bulk inserts don't pay for them until someone searches)
+    def add_later(self, key, product: Product):
+        self.positions[key] = self._next_position
+        self._next_position += 1
+        self.fields[key] = searchable_fields(product)
+        self.unposted.add(key)
+
+    # Give keys back earlier positions (deletes rolled back), short keyword scans follow
+    def restore_positions(self, positions):
+        self.positions.update(positions)
+        self.fields = dict(sorted(self.fields.items(), key=lambda item: self.positions[item[0]]))
+
+    def flush(self):
+        fields = self.fields
+        for key in self.unposted:
+            self._post(self._grams(fields[key]), key)
+        self.unposted.clear()
+
+    def discard(self, key):
+        fields = self.fields.pop(key, None)
+        if fields is None:
+            return
+        del self.positions[key]
+        if key in self.unposted:
+            self.unposted.discard(key)
+            return
+        for gram in self._grams(fields):
+            self._unpost(gram, key)
+
+    def _unpost(self, gram, key):
+        keys = self.postings[gram]
+        keys.discard(key)
+        if not keys:
+            del self.postings[gram]
+
+    def clear(self):
+        self.postings.clear()
+        self.fields.clear()
+        self.positions.clear()
+        self.unposted.clear()
+
+    # Keys whose fields contain the lower-cased keyword, in insertion order
+    def search(self, keyword: str):
+        if len(keyword) < self.n:
+            # Too short for ngrams, check the cached lower-cased fields instead
+            self.scanned = len(self.fields)
+            return [key for key, fields in self.fields.items()
+                    if any(keyword in text for text in fields)]
+
+        if self.unposted:
+            self.flush()
+        self.scanned = 0
+        candidates = None
+        for gram in sorted(ngrams(keyword, self.n),
+                           key=lambda g: len(self.postings.get(g, ()))):
+            keys = self.postings.get(gram)
+            if not keys:
+                return []
+            candidates = set(keys) if candidates is None else candidates & keys
+            if not candidates:
+                return []
+
+        fields = self.fields
+        self.scanned = len(candidates)
+        matches = [key for key in candidates
+                   if any(keyword in text for text in fields[key])]
+        matches.sort(key=self.positions.__getitem__)
+        return matches
+
+
+# Run the method holding the inventory's writer lock (see Inventory(thread_safe=True))
+def synchronized(method):
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return locked
+
 
 class Inventory:
-    def __init__(self, load_from_backup=True, low_alert_threshold=2) -> None:
-        self.items = {}
+    # debug_totals=True checks the running totals against a full recompute on every report.
+    # journal=True appends every add/update/delete to <data_filepath>.log so nothing is
+    # lost if the process dies before save_data; the log is folded back into the
+    # snapshot every compact_every records.
+    # Journal records reach the disk (fsync) once fsync_every records or fsync_interval_ms
+    # have passed since the last sync, whichever comes first. With fsync_interval_ms a
+    # background timer also syncs records left over when writes stop, so an idle tail
+    # reaches the disk at most fsync_interval_ms after the last sync. fsync_every=1 syncs
+    # every mutation, leaving both unset only flushes to the OS (survives a process
+    # crash, not a power loss).
+    # search_cache_size > 0 caches that many keyword search results (see SearchCache),
+    # each for at most search_cache_ttl seconds when set.
+    # thread_safe=True lets worker threads share the inventory: changes, reports and scans
+    # take one writer lock, while search_by_id / product_exists never wait for it since
+    # every change swaps in a whole new Product.
+    # instrument=True times every public method and counts bytes read/written and items
+    # scanned by keyword search, see self.instrumentation (None when off).
+    # ledger=True (or a MovementLedger to continue) records every quantity change in
+    # self.ledger. An empty ledger starts with the loaded quantities as "opening" movements.
+    # locations=[names] (or a LocationStock to continue) keeps every product's units per
+    # location in self.stock, a product's quantity is then its total over the locations.
+    # Changes that name no location (add/update, bulk, import) land on the first one.
+    def __init__(self, load_from_backup=True, low_alert_threshold=2,
+                 data_filepath="data/backup_test.json", journal=False,
+                 compact_every=10000, fsync_every=0, fsync_interval_ms=None,
+                 debug_totals=False, thread_safe=False, search_cache_size=0,
+                 search_cache_ttl=None, instrument=False, ledger=False,
+                 locations=None) -> None:
+        self.thread_safe = thread_safe
+        self._lock = threading.RLock() if thread_safe else nullcontext()
+        self._undo = None  # key -> product before the running transaction, or None
+        self._deferred = None  # Journal records held back until the transaction commits
+        self._deferred_moves = None  # Same for the ledger, (records, reason) pairs
+        self._undo_positions = None  # key -> search position before the transaction deleted it
+        self.ledger = MovementLedger() if ledger is True else (ledger or None)
+        self._snapshots = weakref.WeakValueDictionary()  # id -> open snapshot, see snapshot
+        self.stock = (locations if isinstance(locations, LocationStock)
+                      else LocationStock(locations) if locations else None)
+        self.totals = InventoryTotals()
+        self.debug_totals = debug_totals
+        self.search_cache = (SearchCache(search_cache_size, search_cache_ttl)
+                             if search_cache_size else None)
+        self.word_index = None  # Built on first prefix/fuzzy/ranked search, see _words
+        # Called with the product whenever an add/update takes it to low_alert_threshold or below
+        self.low_stock_listeners = [print_low_stock_alert]
+        # Called with (product, location) when a location's units drop to the threshold or below
+        self.location_low_stock_listeners = [print_location_low_stock_alert]
+        self._init_storage()
         self.low_alert_threshold = low_alert_threshold
-        self.__data_filepath = "data/backup_test.json"  # Private variable
+        self.__data_filepath = data_filepath  # Private variable
+        self._pending = None  # Rest of a lazy load, see load_data(lazy=True)
+        self._pending_lookup = None  # Random access into it, when the format allows
+        self._pending_binary = None  # The BinarySnapshot being loaded, see report_summary
+        self._resolved = set()  # Ids changed while a lazy load is pending
+        self.compact_every = compact_every
+        self._journal = None
+        self._journal_records = 0
+        self.fsync_every = fsync_every
+        self.fsync_interval_ms = fsync_interval_ms
+        self._unsynced = 0  # Journal records written since the last fsync
+        self._last_sync = time.monotonic()
+        self._sync_timer = None  # Pending sync of an idle journal tail, see _write_records
+        self._sync_lock = threading.Lock()  # Sync state, shared with the timer thread
+        self.instrumentation = None
+        self.profiles = {}  # method name -> ProfileHook, see profile
+        if instrument:
+            self._instrument()
         if (load_from_backup):
             try:
                 self.load_data()
                 print("Data loaded!")
-            except:
-                print("Error while loading data")
+            except Exception as error:
+                print("Error while loading data: {0}".format(error))
+        if self.ledger is not None and not len(self.ledger):
+            for key, product in self.items.items():
+                self.ledger.settle(key, product.quantity, "opening")
+        if self.stock is not None:
+            self._settle_stock_all()
+        if journal:
+            self._journal = open(self.journal_filepath, "a", encoding="utf-8")
+            if not load_from_backup:
+                # Starting from scratch, a replay must not bring back the old snapshot
+                self._log("clear")
+
+    # Wrap every public data method of this instance in a timer, see Instrumentation.
+    # The console ones (prompts waiting on input, printed reports) are left out.
+    def _instrument(self):
+        self.instrumentation = Instrumentation()
+        for name in dir(type(self)):
+            if (not name.startswith(("_", "prompt_")) and name not in CONSOLE_METHODS
+                    and isinstance(getattr(type(self), name), types.FunctionType)):
+                setattr(self, name, self.instrumentation.wrap(name, getattr(self, name)))
 
+    # Sample every n-th call of one method with cProfile (and tracemalloc with memory=True):
+    #     hook = inventory.profile("search_everywhere_by_keyboard", every=100)
+    #     hook.stats().print_stats(10)
+    def profile(self, name, every=1, memory=False):
+        hook = ProfileHook(every, memory)
+        setattr(self, name, hook.wrap(getattr(self, name)))
+        self.profiles[name] = hook
+        return hook
+
+    @synchronized
     def __str__(self) -> str:
+        self._ensure_loaded()
         return 'Inventory (Ids: {0}, Length: {1})'.format(
             list(self.items.keys()), len(self.items))
 
-    # Load Data from JSON and create List of Products
-    def load_data(self):
+    # Storage backends (see inventory_management_sqlite.py) override these
+    def _init_storage(self):
+        self.items = {}
+        self._key_log = []  # Keys in dict order, for snapshots to walk
+        self._key_moves = {}  # Key -> positions it was added again at after a delete
+        self._dead_keys = set()  # Deleted keys that are still in the log
+        self._stale_keys = 0  # Log entries left behind by deletes
+        self.search_index = TrigramIndex()
+        self.quantity_index = SortedIndex()
+        self.price_index = SortedIndex()
+
+    # Every change to self.items goes through these two so indexes stay in sync
+    def _store(self, key, product: Product):
+        old = self.items.get(key)
+        if self._snapshots:
+            self._preserve(key, old)
+        if self.search_cache:
+            self.search_cache.invalidate(old and searchable_fields(old), searchable_fields(product))
+        if old is not None:
+            self.totals.remove(old.price, old.quantity)
+            if old.quantity != product.quantity:
+                self.quantity_index.discard(key, old.quantity)
+            if old.price != product.price:
+                self.price_index.discard(key, old.price)
+        self.items[key] = product
+        if old is None:
+            self._log_key(key)
+        self.totals.add(product.price, product.quantity)
+        self.search_index.add(key, product)
+        if self.word_index is not None:
+            self.word_index.add(key, product)
+        if old is None or old.quantity != product.quantity:
+            self.quantity_index.add(key, product.quantity)
+        if old is None or old.price != product.price:
+            self.price_index.add(key, product.price)
+
+    # A key new to self.items goes at the end of the key log (see snapshot)
+    def _log_key(self, key):
+        if key in self._dead_keys:
+            self._dead_keys.discard(key)
+            self._key_moves.setdefault(key, []).append(len(self._key_log))
+        self._key_log.append(key)
+
+    # _store for a batch of (key, product) pairs. New keys are stored in one pass, with
+    # totals and the sorted indexes updated once for the batch and keyword indexing
+    # left to the next search; products replacing others go through _store.
+    def _store_batch(self, pairs):
+        items, search_index, word_index = self.items, self.search_index, self.word_index
+        fresh = []
+        for key, product in pairs:
+            if key in items:
+                self._add_fresh(fresh)  # Whatever it replaces must be indexed first
+                fresh = []
+                self._store(key, product)
+                continue
+            if self._snapshots:
+                self._preserve(key, None)
+            items[key] = product
+            self._log_key(key)
+            search_index.add_later(key, product)
+            if word_index is not None:
+                word_index.add(key, product)
+            fresh.append((key, product))
+        self._add_fresh(fresh)
+
+    def _add_fresh(self, pairs):
+        if not pairs:
+            return
+        if self.search_cache:
+            self.search_cache.invalidate_new([searchable_fields(product) for _, product in pairs])
+        keys = [key for key, _ in pairs]
+        prices = [product.price for _, product in pairs]
+        quantities = [product.quantity for _, product in pairs]
+        self.totals.add_many(prices, quantities)
+        self.quantity_index.add_many(zip(keys, quantities))
+        self.price_index.add_many(zip(keys, prices))
+
+    def _unstore(self, key):
+        if self._undo_positions is not None:
+            self._undo_positions.setdefault(key, self.search_index.positions.get(key))
+        if self._snapshots:
+            self._preserve(key, self.items[key])
+        old = self.items.pop(key)
+        self._dead_keys.add(key)
+        self._stale_keys += 1
+        if 2 * self._stale_keys > len(self._key_log):
+            # New objects, open snapshots keep walking the old ones
+            self._key_log, self._key_moves = list(self.items), {}
+            self._dead_keys, self._stale_keys = set(), 0
+        if self.search_cache:
+            self.search_cache.invalidate(searchable_fields(old), None)
+        self.totals.remove(old.price, old.quantity)
+        self.search_index.discard(key)
+        if self.word_index is not None:
+            self.word_index.discard(key)
+        self.quantity_index.discard(key, old.quantity)
+        self.price_index.discard(key, old.price)
+
+    def _clear(self):
+        if self._snapshots:
+            for key, product in self.items.items():
+                self._preserve(key, product)
+        self.items.clear()
+        self._key_log, self._key_moves = [], {}
+        self._dead_keys, self._stale_keys = set(), 0
+        self.totals = InventoryTotals()
+        if self.search_cache is not None:
+            self.search_cache.invalidate_all()
+        if self.word_index is not None:
+            self.word_index.clear()
+        self.search_index.clear()
+        self.quantity_index.clear()
+        self.price_index.clear()
+
+    # Keep the product a write is about to replace in every open snapshot (first write wins)
+    def _preserve(self, key, old):
+        for snapshot in self._snapshots.values():
+            snapshot._before.setdefault(key, old)
+
+    # Point-in-time, read-only view of the products (an InventorySnapshot), O(1) to take.
+    # Reports and exports read one, so writers don't wait for them:
+    #     with inventory.snapshot() as snapshot:
+    #         for id, product in snapshot.items():
+    #             ...
+    # Each open snapshot costs writers a dict entry per product they change; close it
+    # (or leave the with block) when done.
+    @synchronized
+    def snapshot(self):
+        self._ensure_loaded()
+        return InventorySnapshot(self.items, self._key_log, self.totals.copy(), self._key_moves,
+                                 self._snapshots)
+
+    # Snapshot holding its own copy of every product, for storages that can't share theirs
+    def _copied_snapshot(self):
+        self._ensure_loaded()
+        items = dict(self.items.items())
+        return InventorySnapshot(items, list(items), self.totals.copy())
+
+    # Totals from a full scan, what self.totals must always agree with
+    @synchronized
+    def recompute_totals(self):
+        self._ensure_loaded()
+        totals = InventoryTotals()
+        for item in self.items.values():
+            totals.add(item.price, item.quantity)
+        return totals
+
+    @synchronized
+    def check_totals(self):
+        expected = self.recompute_totals()
+        if self.totals != expected:
+            raise AssertionError("Running totals {0} differ from recomputed {1}".format(
+                self.totals, expected))
+
+    # Products, units and total value from the running totals, no scan needed
+    # While a binary load is pending the records not loaded yet are summed from its columns
+    @synchronized
+    def report_summary(self):
+        snapshot = self._pending_binary
+        if snapshot is None:
+            self._ensure_loaded()
+            return self.totals.to_dict()
+        # Records already handed out, or whose id changed since, are in self.totals
+        skip = {snapshot.find(key) for key in self._resolved} - {None}
+        return snapshot.add_totals(self.totals.copy(), snapshot.position, skip).to_dict()
+
+    # Load Data from JSON and create List of Products, the file is streamed entry by entry.
+    # With lazy=True nothing is read up front: lookups pull entries until the id shows up
+    # and anything that needs every product (reports, search, save) finishes the load.
+    # A snapshot we wrote ourselves (checksum still matches) skips per-field validation,
+    # lazy loads don't read the file up front to check it and always validate.
+    # A journal left over from an unsaved session is replayed on top of the snapshot.
+    @synchronized
+    def load_data(self, lazy=False, progress=None):
         if os.path.isfile(self.__data_filepath):
-            with open(self.__data_filepath, "r") as file:
-                data = json.load(file)
-                for product_id, product in data.items():
-                    product_obj = Product(**product)
-                    self.items[product_id] = product_obj
+            trusted = not lazy and checksum_matches(self.__data_filepath)
+            factory = Product.trusted if trusted else Product
+            if self.instrumentation is not None:
+                progress = self.instrumentation.reading(progress)
+            self._pending = ((product_id, factory(**product)) for product_id, product
+                             in iter_backup(self.__data_filepath, progress=progress))
+        self._replay_journal()
+        if not lazy:
+            self._ensure_loaded()
 
-    # Save Data to JSON
-    def save_data(self):
-        with open(self.__data_filepath, "w") as file:
-            json.dump(self.items,
+    # Load a binary snapshot (see BinarySnapshot) through mmap. Lookups binary search
+    # the file and only decode the product asked for; the rest is decoded on first
+    # full scan, or right away with lazy=False, which checks the crc32 first so that
+    # a matching snapshot skips per-field validation.
+    @synchronized
+    def load_binary(self, filepath, lazy=True):
+        snapshot = BinarySnapshot(filepath)
+        if not lazy:
+            snapshot.verify()
+
+        def drain():
+            try:
+                yield from snapshot
+            finally:
+                snapshot.close()
+
+        self._pending = drain()
+        self._pending_lookup = snapshot.get
+        self._pending_binary = snapshot
+        if not lazy:
+            self._ensure_loaded()
+
+    @synchronized
+    def save_binary(self, filepath):
+        self._ensure_loaded()
+        BinarySnapshot.write(filepath, self.items)
+        if self.instrumentation is not None:
+            self.instrumentation.count("bytes_written", os.path.getsize(filepath))
+
+    @property
+    def loaded(self):
+        return self._pending is None
+
+    def _drop_pending(self):
+        if self._pending is not None:
+            self._pending.close()
+        self._pending = None
+        self._pending_lookup = None
+        self._pending_binary = None
+        self._resolved.clear()
+
+    # Load one more entry of a pending lazy load, False once the backup is exhausted
+    def _load_next(self):
+        try:
+            product_id, product = next(self._pending)
+        except StopIteration:
+            self._drop_pending()
+            return False
+        except Exception:
+            self._drop_pending()
+            raise
+        if product_id not in self._resolved:
+            self._store_loaded(product_id, product)
+        return True
+
+    def _ensure_loaded(self):
+        while self._pending is not None:
+            self._load_next()
+
+    def _fault_in(self, key):
+        if self._pending is None or key in self.items or key in self._resolved:
+            return
+        if self._pending_lookup is not None:
+            product = self._pending_lookup(key)
+            self._resolved.add(key)  # Already loaded, the rest of the load skips it
+            if product is not None:
+                self._store_loaded(key, product)
+            return
+        while (self._pending is not None and key not in self.items
+               and key not in self._resolved):
+            self._load_next()
+
+    # Products a load brings in (backup, binary snapshot, journal replay) open their ledger
+    # balance and location rows as they are. Outside any running transaction: rolling
+    # it back doesn't unload them either.
+    def _store_loaded(self, key, product):
+        self._store(key, product)
+        if self.ledger is not None or self.stock is not None:
+            self._open([self._journal_record("put", key, product)])
+
+    def _open(self, records):
+        if self.stock is not None:
+            with self.stock.kept():
+                self._settle_stock(records)
+        if self.ledger is not None:
+            self._record_movements(records, "opening")
+
+    # Called before changing a product so a pending lazy load never overwrites the change
+    def _touch(self, key):
+        if self._pending is not None:
+            self._fault_in(key)
+            self._resolved.add(key)
+        if self._undo is not None:
+            self._remember(key)
+
+    # First change to a product inside a transaction, keep what to put back on rollback
+    def _remember(self, key):
+        if key not in self._undo:
+            self._undo[key] = self.items.get(key)
+
+    # Put back every product a failed transaction touched (None = it did not exist)
+    def _restore(self, undo):
+        for key, product in undo.items():
+            if product is not None:
+                self._store(key, product)
+            elif key in self.items:
+                self._unstore(key)
+
+    # Deleted products _restore put back go back where they were: their search position
+    # and their place in self.items (a new dict, in search position order, so lock-free
+    # readers never miss a key). The word index is rebuilt on the next search that
+    # needs it, in that order.
+    def _restore_order(self, positions):
+        if not positions:  # Only recorded by the dict storage's _unstore
+            return
+        restored = {key: position for key, position in positions.items()
+                    if position is not None and key in self.items}
+        if not restored:
+            return
+        index_positions = self.search_index.positions
+        self.search_index.restore_positions(restored)
+        self.items = dict(sorted(self.items.items(), key=lambda item: index_positions[item[0]]))
+        self._key_log, self._key_moves = list(self.items), {}
+        self._dead_keys, self._stale_keys = set(), 0
+        self.word_index = None
+
+    # Group changes into one all-or-nothing unit:
+    #     with inventory.transaction():
+    #         inventory.update_item(...)
+    #         inventory.delete_item(...)
+    # Other writers wait until it ends, its journal records are written together on
+    # success and an exception puts back every product it touched before re-raising.
+    # Nested transactions join the outer one. Point lookups don't wait, so they can see
+    # changes of a transaction that has not finished yet.
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            if self._undo is not None:
+                yield
+                return
+            self._undo, self._deferred, self._deferred_moves = {}, [], []
+            self._undo_positions = {}
+            stock = self.stock
+            if stock is not None:
+                stock.begin()
+            try:
+                yield
+            except BaseException:
+                undo, positions = self._undo, self._undo_positions
+                self._undo = self._deferred = self._deferred_moves = None
+                self._undo_positions = None
+                self._restore(undo)
+                self._restore_order(positions)
+                if stock is not None:
+                    stock.rollback()
+                raise
+            records, moves = self._deferred, self._deferred_moves
+            self._undo = self._deferred = self._deferred_moves = None
+            self._undo_positions = None
+            if stock is not None:
+                stock.commit()
+            for moved, reason in moves:
+                self._record_movements(moved, reason)
+            self._write_records(records)
+
+    @property
+    def data_filepath(self):
+        return self.__data_filepath
+
+    @property
+    def journal_filepath(self):
+        return self.__data_filepath + JOURNAL_SUFFIX
+
+    # Append one compact record to the journal, O(1) whatever the inventory size
+    def _log(self, op, key=None, product: Product = None, reason=None):
+        if self._journal is not None or self.ledger is not None or self.stock is not None:
+            self._log_records([self._journal_record(op, key, product)], reason)
+
+    @staticmethod
+    def _journal_record(op, key=None, product: Product = None):
+        if op == "put":
+            return [op, key, product.id, product.name, product.price, product.quantity]
+        elif op == "del":
+            return [op, key]
+        return [op]
+
+    # Every change is logged here: journal records go to the journal, the ledger
+    # records the movements they make (reason defaults to "set" for puts) and location
+    # stock follows the new quantities right away (a failed transaction rolls it back)
+    def _log_records(self, records, reason=None):
+        if self.stock is not None and records:
+            self._settle_stock(records)
+        if self.ledger is not None and records:
+            if self._deferred_moves is not None:
+                self._deferred_moves.append((records, reason))
+            else:
+                self._record_movements(records, reason)
+        self._write_records(records)
+
+    # Append records to the journal with a single write and flush
+    def _write_records(self, records):
+        if self._journal is None or not records:
+            return
+        if self._deferred is not None:
+            self._deferred += records
+            return
+        text = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        self._journal.write(text)
+        self._journal.flush()
+        if self.instrumentation is not None:
+            self.instrumentation.count("bytes_written", len(text.encode("utf-8")))
+        self._journal_records += len(records)
+        with self._sync_lock:
+            self._unsynced += len(records)
+            waited = (time.monotonic() - self._last_sync) * 1000
+            if ((self.fsync_every and self._unsynced >= self.fsync_every)
+                    or (self.fsync_interval_ms is not None and waited >= self.fsync_interval_ms)):
+                self._fsync()
+            elif self.fsync_interval_ms is not None and self._sync_timer is None:
+                # Nothing may come after these records, sync them once the interval is up
+                self._sync_timer = threading.Timer(
+                    (self.fsync_interval_ms - waited) / 1000, self._sync_idle)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+        if self._journal_records >= self.compact_every:
+            self.compact()
+
+    def _record_movements(self, records, reason):
+        ledger = self.ledger
+        for record in records:
+            if record[0] == "put":
+                ledger.settle(record[1], record[5], reason or "set")
+            elif record[0] == "del":
+                ledger.settle(record[1], 0, reason or "delete")
+            else:  # clear
+                for product_id in ledger.ids:
+                    ledger.settle(product_id, 0, reason or "clear")
+
+    def _settle_stock(self, records):
+        stock = self.stock
+        for record in records:
+            if record[0] == "put":
+                stock.settle(record[1], record[5], record[4])
+            elif record[0] == "del":
+                stock.remove(record[1])
+            else:  # clear
+                stock.clear_products()
+
+    def _settle_stock_all(self):
+        for key, product in self.items.items():
+            self.stock.settle(key, product.quantity, product.price)
+
+    # Force journal records written so far to disk
+    @synchronized
+    def sync(self):
+        with self._sync_lock:
+            self._fsync()
+
+    # Callers hold self._sync_lock
+    def _fsync(self):
+        if self._sync_timer is not None:
+            self._sync_timer.cancel()
+            self._sync_timer = None
+        if self._journal is not None and self._unsynced:
+            os.fsync(self._journal.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    # Runs on the timer thread fsync_interval_ms after records were left unsynced
+    def _sync_idle(self):
+        with self._lock, self._sync_lock:
+            if self._sync_timer is threading.current_thread():  # Not cancelled meanwhile
+                self._fsync()
+
+    def _replay_journal(self):
+        if not os.path.isfile(self.journal_filepath):
+            return
+        if self.instrumentation is not None:
+            self.instrumentation.count("bytes_read", os.path.getsize(self.journal_filepath))
+        with open(self.journal_filepath, "r", encoding="utf-8") as file:
+            for line in file:
+                if not line.endswith("\n"):
+                    break  # Last record was cut short by a crash
+                record = json.loads(line)
+                op = record[0]
+                if op == "clear":
+                    self._drop_pending()
+                    self._clear()
+                    if self.ledger is not None or self.stock is not None:
+                        self._open([record])
+                    continue
+                key = record[1]
+                if self._pending is not None:
+                    self._resolved.add(key)
+                if op == "put":
+                    self._store_loaded(key, Product(*record[2:]))
+                elif key in self.items:
+                    self._unstore(key)
+                    if self.ledger is not None or self.stock is not None:
+                        self._open([record])
+                self._journal_records += 1
+
+    # Fold the journal back into the snapshot
+    @synchronized
+    def compact(self):
+        self._write_snapshot()
+
+    # Written to a temp file that replaces the snapshot in one rename, so a crash
+    # leaves either the old or the new snapshot on disk, never half of one
+    def _write_snapshot(self):
+        self._ensure_loaded()
+        # Backends whose items are a mapping view (SQLite, shards) are copied out first
+        items = self.items if isinstance(self.items, dict) else dict(self.items.items())
+        with atomic_write(self.__data_filepath) as file:
+            json.dump(items,
                       file,
                       default=lambda a: a.to_dict())
-            print("Data Saved!")
+        checksum = file_checksum(self.__data_filepath)
+        # Written after the rename: a crash in between leaves a stale checksum,
+        # which only makes the next load validate every product
+        write_checksum(self.__data_filepath, checksum)
+        if self.instrumentation is not None:
+            self.instrumentation.count("bytes_written", os.path.getsize(self.__data_filepath))
+        # The snapshot now holds everything the journal had
+        if self._journal is not None:
+            self._journal.seek(0)
+            self._journal.truncate()
+            os.fsync(self._journal.fileno())
+            self._unsynced = 0
+        elif os.path.isfile(self.journal_filepath):
+            os.remove(self.journal_filepath)
+        self._journal_records = 0
+
+    # Save Data to JSON
+    @synchronized
+    def save_data(self):
+        self._write_snapshot()
+        print("Data Saved!")
+
+    @synchronized
+    def close(self):
+        if self._journal is not None:
+            self.sync()
+            self._journal.close()
+            self._journal = None
 
     # Function to get valid ID
     def prompt_to_get_id(self):
@@ -143,13 +2076,26 @@ class Inventory:
 
     # Check if product exists return boolean value
     def product_exists(self, product_id):
+        if self._pending is not None:
+            with self._lock:
+                self._fault_in(product_id)
         return product_id in self.items
 
+    # Notify listeners only when the product crosses into low stock, not on every change
+    def _check_low_stock(self, old: Product, product: Product):
+        threshold = self.low_alert_threshold
+        if product.quantity <= threshold and (old is None or old.quantity > threshold):
+            for listener in self.low_stock_listeners:
+                listener(product)
+
     # Funtions to perform Operation #1: Add new item
+    @synchronized
     def add_item(self, new_product: Product):
-        self.items[new_product.id] = new_product
-        if (new_product.quantity <= 2):
-            print("⚠ Low inventory alert for {0}".format(new_product))
+        self._touch(new_product.id)
+        old = self.items.get(new_product.id)
+        self._store(new_product.id, new_product)
+        self._log("put", new_product.id, new_product)
+        self._check_low_stock(old, new_product)
 
     def prompt_to_add_item(self, id=None):
         if id == None:
@@ -173,13 +2119,17 @@ class Inventory:
                 self.prompt_to_update_item(id)
 
     # Funtions to perform Operation #2: Update existing item
+    @synchronized
     def update_item(self, new_product: Product):
-        if (new_product.id in self.items):
-            self.items[new_product.id].name = new_product.name
-            self.items[new_product.id].id = new_product.id
-            self.items[new_product.id].quantity = new_product.quantity
-            if (new_product.quantity <= 2):
-                print("⚠ Low inventory alert for {0}".format(new_product))
+        self._touch(new_product.id)
+        current = self.items.get(new_product.id)
+        if current is not None:
+            # Stored as a new Product, so readers see the old or the new one, never a mix
+            product = Product(new_product.id, new_product.name, new_product.price,
+                              new_product.quantity)
+            self._store(new_product.id, product)
+            self._log("put", new_product.id, product)
+            self._check_low_stock(current, product)
         else:
             print("Item not found!")
 
@@ -205,12 +2155,163 @@ class Inventory:
                 self.prompt_to_add_item(id)
 
     # Funtions to perform Operation #3: Delete existing Item
+    @synchronized
     def delete_item(self, product_id):
+        self._touch(product_id)
         if product_id in self.items:
-            del self.items[product_id]
+            self._unstore(product_id)
+            self._log("del", product_id)
             return True
         return False
 
+    # Bulk versions of add_item / update_item / delete_item. The whole batch is validated
+    # first (see validate_columns) and nothing is changed if any row is bad. Journal
+    # records are written in one go and alerts=False skips low stock notifications.
+    @synchronized
+    def add_items(self, products=None, ids=None, names=None, prices=None,
+                  quantities=None, alerts=True):
+        columns = to_columns(products, ids, names, prices, quantities)
+        validate_columns(*columns)
+        return self._put_batch(columns, alerts)
+
+    # Every product must already exist, otherwise KeyError and nothing is updated
+    @synchronized
+    def update_items(self, products=None, ids=None, names=None, prices=None,
+                     quantities=None, alerts=True):
+        columns = to_columns(products, ids, names, prices, quantities)
+        validate_columns(*columns)
+        for id in columns[0]:
+            self._fault_in(id)
+        missing = [id for id in columns[0] if id not in self.items]
+        if missing:
+            raise KeyError("Items not found: {0}".format(", ".join(missing)))
+        return self._put_batch(columns, alerts)
+
+    def _put_batch(self, columns, alerts, reason=None):
+        records, crossed, pairs, batch = [], [], [], {}
+        threshold = self.low_alert_threshold
+        items = self.items
+        for id, name, price, quantity in zip(*columns):
+            if self._pending is not None or self._undo is not None:
+                self._touch(id)
+            old = batch.get(id) or items.get(id)
+            product = batch[id] = Product.trusted(id, name, price, quantity)
+            pairs.append((id, product))
+            records.append(self._journal_record("put", id, product))
+            if quantity <= threshold and (old is None or old.quantity > threshold):
+                crossed.append(product)
+        self._store_batch(pairs)
+        self._log_records(records, reason)
+        if alerts:
+            for product in crossed:
+                for listener in self.low_stock_listeners:
+                    listener(product)
+        return len(records)
+
+    # Receive (delta > 0) or take out (delta < 0) units of one product, recorded in the
+    # ledger with reason. ValueError if that would leave less than none in stock, or
+    # at location when one is given.
+    @synchronized
+    def move_stock(self, product_id, delta, reason="move", location=None):
+        self._touch(product_id)
+        current = self.items.get(product_id)
+        if current is None:
+            raise KeyError("Item not found: {0}".format(product_id))
+        product = Product(current.id, current.name, current.price, current.quantity + delta)
+        if location is None:
+            self._put_batch(([product.id], [product.name], [product.price], [product.quantity]),
+                            alerts=True, reason=reason)
+            return product
+        return self.set_stock(product_id, location,
+                              self._locations().quantity(product_id, location) + delta, reason)
+
+    # Add a location (the first one turns location stock on, see Inventory(locations=...))
+    @synchronized
+    def add_location(self, name):
+        if self.stock is None:
+            self._ensure_loaded()
+            self.stock = LocationStock([name])
+            self._settle_stock_all()
+        else:
+            self.stock.add_location(name)
+
+    def _locations(self):
+        if self.stock is None:
+            raise ValueError("Inventory has no locations, see add_location")
+        return self.stock
+
+    # Set the units of a product at one location, the product's quantity follows
+    @synchronized
+    def set_stock(self, product_id, location, quantity, reason="count"):
+        stock = self._locations()
+        self._touch(product_id)
+        current = self.items.get(product_id)
+        if current is None:
+            raise KeyError("Item not found: {0}".format(product_id))
+        before = stock.quantity(product_id, location)
+        with self.transaction():
+            stock.set(product_id, location, quantity)
+            product = Product.trusted(current.id, current.name, current.price,
+                                      stock.total(product_id))
+            self._put_batch(([product.id], [product.name], [product.price], [product.quantity]),
+                            alerts=True, reason=reason)
+        self._check_location_stock(product, location, before, quantity)
+        return product
+
+    # Move units of a product from one location to another in one step: either both
+    # change or, when source has too few units (ValueError), neither does.
+    # Returns the product's units per location.
+    @synchronized
+    def transfer_stock(self, product_id, source, destination, quantity):
+        stock = self._locations()
+        self._ensure_loaded()
+        if product_id not in self.items:
+            raise KeyError("Item not found: {0}".format(product_id))
+        before = stock.quantity(product_id, source)
+        with self.transaction():
+            stock.transfer(product_id, source, destination, quantity)
+        self._check_location_stock(self.items[product_id], source, before, before - quantity)
+        return stock.quantities(product_id)
+
+    def _check_location_stock(self, product: Product, location, before, after):
+        threshold = self.low_alert_threshold
+        if after <= threshold < before:
+            for listener in self.location_low_stock_listeners:
+                listener(product, location)
+
+    # Products with threshold units or less (low_alert_threshold by default) at location
+    @synchronized
+    def low_stock_at(self, location, threshold=None):
+        stock = self._locations()
+        self._ensure_loaded()
+        if threshold is None:
+            threshold = self.low_alert_threshold
+        return [self.items[key] for key in stock.low_stock(location, threshold)]
+
+    # Returns how many of the ids were found and deleted
+    @synchronized
+    def delete_items(self, product_ids):
+        records = []
+        for product_id in product_ids:
+            self._touch(product_id)
+            if product_id in self.items:
+                self._unstore(product_id)
+                records.append(self._journal_record("del", product_id))
+        self._log_records(records)
+        return len(records)
+
+    # Bulk import from CSV / gzip CSV / Parquet as written by export. Rows are validated
+    # a chunk at a time (see validate_frame), good rows are stored in bulk and bad ones
+    # are reported with their line number in the returned ImportReport.
+    @synchronized
+    def import_file(self, filepath, chunk_size=IMPORT_CHUNK_SIZE, alerts=False):
+        report = ImportReport()
+        for first_line, frame in read_product_chunks(filepath, chunk_size):
+            columns, errors = validate_frame(frame, first_line)
+            report.errors += errors
+            report.imported += self._put_batch(columns, alerts)
+        return report
+
     def prompt_to_delete_item(self):
         id = self.prompt_to_get_id()
 
@@ -223,34 +2324,49 @@ class Inventory:
         print("=" * 80 + "\n\n")
 
     # Funtions to perform Operation #4: Print all Items
+    # Reads a snapshot, changes made while it prints don't show up and don't wait
     def print_product_list(self):
-        print("=" * 80)
-        print(self)
-        print("=" * 80)
-        for item in self.items.values():
-            print(item)
-        print("=" * 80 + "\n\n")
+        with self.snapshot() as snapshot:
+            print("=" * 80)
+            print(snapshot)
+            print("=" * 80)
+            for item in snapshot.values():
+                print(item)
+            print("=" * 80 + "\n\n")
 
     # Funtions to perform Operation #5: Print tabular report
-    def generate_report(self):
-        total_inventory_value = 0
-        print("=" * 80)
-        print(self)
-        print("=" * 80)
-        print("{: <10} {: <30} {: <10} {: <10} {: <10}".format("Id", "Name", "Quantity", "Price", "Alert Status"))
-        for id, item in self.items.items():
-            print("{: <10} {: <30} {: <10} {: <10} {: <10}".format(item.id, item.name, item.quantity, item.price, "Low 🛑" if item.quantity <= self.low_alert_threshold else "Ok ✅"))
-            total_inventory_value += item.price * item.quantity
+    # Also reads a snapshot, so the rows and the totals are of the same moment.
+    # by_location=True adds units and value per location, one pass over each column.
+    def generate_report(self, by_location=False):
+        if self.debug_totals:
+            self.check_totals()
+        with self.snapshot() as snapshot:
+            summary = snapshot.totals.to_dict()
+            print("=" * 80)
+            print(snapshot)
+            print("Products: {0}, Units: {1}".format(summary["products"], summary["units"]))
+            print("=" * 80)
+            print("{: <10} {: <30} {: <10} {: <10} {: <10}".format("Id", "Name", "Quantity", "Price", "Alert Status"))
+            for id, item in snapshot.items():
+                print("{: <10} {: <30} {: <10} {: <10} {: <10}".format(item.id, item.name, item.quantity, item.price, "Low 🛑" if item.quantity <= self.low_alert_threshold else "Ok ✅"))
 
-        print("=" * 80)
-        print("Total inventory value: ${0}".format(total_inventory_value))
-        print("=" * 80 + "\n\n")
+            print("=" * 80)
+            print("Total inventory value: ${0:.2f}".format(summary["total_value"]))
+            print("=" * 80 + "\n\n")
+        if by_location and self.stock is not None:
+            with self._lock:
+                rollup = self.stock.rollup()
+            print("{: <30} {: <15} {: <15}".format("Location", "Units", "Value"))
+            for location, totals in rollup.items():
+                print("{: <30} {: <15} {: <15.2f}".format(location, totals["units"], totals["value"]))
+            print("=" * 80 + "\n\n")
 
     # Funtions to perform Operation #6: Search by ID
     def search_by_id(self, id):
-        if (id in self.items):
-            return self.items[id]
-        return False
+        if self._pending is not None:
+            with self._lock:
+                self._fault_in(id)
+        return self.items.get(id, False)  # One lookup, a concurrent delete can't slip in between
 
     def prompt_to_view_item(self):
         id = self.prompt_to_get_id()
@@ -264,16 +2380,72 @@ class Inventory:
         print("=" * 80 + "\n\n")
 
     # Funtions to perform Operation #7: Search everywhere by keyword
-    def search_everywhere_by_keyboard(self, keyword: str):
-        matches = []
+    # Only products sharing every trigram of the keyword are checked
+    @synchronized
+    def search_everywhere_by_keyboard(self, keyword: str, limit=None):
+        self._ensure_loaded()
         keyword = keyword.lower()  # To make the search case-insensitive
-        for product_id, item in self.items.items():
-            if keyword in str(item.id).lower() or keyword in str(
-                    item.name).lower() or keyword in str(
-                        item.quantity).lower() or keyword in str(
-                            item.price).lower():
-                matches.append(item)
-        return matches
+        keys = None if self.search_cache is None else self.search_cache.get(keyword)
+        if keys is None:
+            keys = self.search_index.search(keyword)
+            if self.search_cache is not None:
+                self.search_cache.put(keyword, keys)
+            if self.instrumentation is not None:
+                self.instrumentation.count("items_scanned", self.search_index.scanned)
+        return [self.items[key] for key in keys[:limit]]
+
+    # Word index for the search modes below, built on first use and then kept up to
+    # date by _store/_unstore, so inventories that never use them don't pay for it
+    def _words(self):
+        if self.word_index is None:
+            self._ensure_loaded()
+            index = WordIndex()
+            index.build(self.items.items())
+            self.word_index = index
+        return self.word_index
+
+    # (score, key) pairs of a search mode, best first: "prefix" scores by the matching
+    # term, "fuzzy" by typo distance and word and "ranked" by how good the match is (see
+    # _ranked). Ties come in posting order, except ranked tiers 3 and 4 in items order.
+    def _matches(self, mode, query, *options):
+        if mode == "prefix":
+            return self._words().prefix(query)
+        if mode == "fuzzy":
+            return self._words().fuzzy(query, *options)
+        return self._ranked(query)
+
+    # Best match first: 0 exact id, 1 whole word of the name, 2 prefix of the id or of a
+    # name word, 3 anywhere in the id or name, 4 only in quantity or price. Each tier is
+    # worked out only when the ones before it didn't fill the limit.
+    def _ranked(self, keyword):
+        words = self._words()
+        keys = words.postings.get(keyword, {})
+        yield from (((0,), key) for key in keys if words.keys[key][0] == keyword)
+        yield from (((1,), key) for key in keys if keyword in words.keys[key][1])
+        yield from (((2, term), key) for term, key in words.prefix(keyword))
+        matches = self.search_everywhere_by_keyboard(keyword)
+        yield from (((3,), product.id) for product in matches
+                    if keyword in str(product.id).lower() or keyword in str(product.name).lower())
+        yield from (((4,), product.id) for product in matches)
+
+    # Autocomplete: products whose id or a name word starts with prefix, by that word
+    @synchronized
+    def search_prefix(self, prefix: str, limit=10):
+        matches = self._matches("prefix", prefix.lower())
+        return [self.items[key] for key in first_matches(matches, limit)]
+
+    # Typo tolerant: every word of the query must be within max_distance edits of a
+    # word of the name (by default 0 up to 2 letters, 1 up to 5, else 2), closest first
+    @synchronized
+    def search_fuzzy(self, query: str, limit=10, max_distance=None):
+        matches = self._matches("fuzzy", query.lower(), max_distance)
+        return [self.items[key] for key in first_matches(matches, limit)]
+
+    # Substring search like search_everywhere_by_keyboard, best matches first (see _ranked)
+    @synchronized
+    def search_ranked(self, keyword: str, limit=10):
+        matches = self._matches("ranked", keyword.lower())
+        return [self.items[key] for key in first_matches(matches, limit)]
 
     def prompt_to_search_by_keyboard(self):
         keyword = input("Enter keyword to search: ")
@@ -286,32 +2458,125 @@ class Inventory:
             print("No products found matching the keyword.")
         print("=" * 80 + "\n\n")
 
+    # Sorted index of a field, None when the backend has none for it
+    def field_index(self, field):
+        return {"price": self.price_index, "quantity": self.quantity_index}.get(field)
+
+    # Structured query with predicates from inventory_management_query, e.g.
+    #     price, quantity = Field("price"), Field("quantity")
+    #     inventory.query(price.between(500, 1500) & (quantity < 10), order_by="price")
+    # Candidates come from the most selective index the predicate can use (price and
+    # quantity ranges, ids, id/name substrings), the rest is checked product by product.
+    # Returns a lazy iterator, in insertion or index order unless order_by is given. It
+    # reads the inventory as it was when query was called: candidate keys are copied out
+    # of the index under the lock and products come from a snapshot, so changes made while
+    # it is consumed neither show up in it nor break it.
+    @synchronized
+    def query(self, where=None, order_by=None, descending=False, limit=None):
+        self._ensure_loaded()
+        if order_by is not None and order_by not in FIELDS:
+            raise ValueError("Unknown order_by field {0!r}, expected one of: {1}".format(
+                order_by, ", ".join(FIELDS)))
+        items = self._query_items()
+        plan = where.plan(self, len(items)) if where is not None else None
+        sort_index = self.field_index(order_by) if order_by is not None else None
+        if plan is not None and (sort_index is None or plan[0] <= QUERY_SORT_BUFFER):
+            keys = list(plan[1]())
+            products = (product for product in map(items.get, keys) if product is not None)
+        elif sort_index is not None:
+            # Walking the sort index keeps fetching products lazy, only keys are copied
+            keys = sort_index.range(reverse=descending)
+            keys = list(keys if where is not None or limit is None else islice(keys, limit))
+            products = map(items.__getitem__, keys)
+            order_by = None
+        else:
+            products = iter(items.values())
+        if where is not None:
+            products = filter(where.matches, products)
+        if order_by is not None:
+            key = attrgetter(order_by)
+            if limit is not None:
+                select = heapq.nlargest if descending else heapq.nsmallest
+                products = select(limit, products, key=key)
+            else:
+                products = sorted(products, key=key, reverse=descending)
+            self._end_query(items)
+            return iter(products)
+        return self._closing_query(islice(products, limit), items)
+
+    # What query reads products from, see query
+    def _query_items(self):
+        return self.snapshot()
+
+    def _end_query(self, items):
+        if items is not self.items:
+            items.close()
+
+    def _closing_query(self, products, items):
+        try:
+            yield from products
+        finally:
+            self._end_query(items)
+
     # Funtions to perform Operation #8: List low stock items
+    # Items with quantity <= threshold (low_alert_threshold by default), lowest first
+    @synchronized
+    def low_stock_items(self, threshold=None):
+        self._ensure_loaded()
+        if threshold is None:
+            threshold = self.low_alert_threshold
+        return [self.items[key] for key in self.quantity_index.at_most(threshold)]
+
+    # The n items with the lowest stock, lowest first
+    @synchronized
+    def lowest_stock_items(self, n):
+        self._ensure_loaded()
+        keys = self.quantity_index.range()
+        return [self.items[key] for key, _ in zip(keys, range(n))]
+
     def prompt_to_list_low_stock(self):
+        low_stock = self.low_stock_items()
         print("=" * 80)
-        low_stock_found = False
-        for item in self.items.values():
-            if item.quantity <= self.low_alert_threshold:
-                low_stock_found = True
-                print(item)
-        if (not low_stock_found):
+        for item in low_stock:
+            print(item)
+        if (not low_stock):
             print("No product with low stock🥳")
         print("=" * 80 + "\n\n")
 
     # Funtions to perform Operation #9: Export to excel
-    def export_to_excel(self):
-        excel_data=pd.DataFrame.from_records([product.to_dict() for product in self.items.values()])
-        excel_data.to_csv("exported_output.csv",index=False,header=["ID","Name","Price","Quantity"])
+    def export_to_excel(self, filepath="exported_output.csv"):
+        self.export(filepath)
         print("=" * 80)
-        print("Export data to exported_output.csv succesfully!")
+        print("Export data to {0} succesfully!".format(filepath))
         print("=" * 80 + "\n\n")
 
+    # Stream products to filepath chunk by chunk (see export_rows for the formats).
+    # columns picks and orders the fields, e.g. ["id", "quantity"]. Returns rows written.
+    # Writes a snapshot, so a long export doesn't hold up changes.
+    def export(self, filepath="exported_output.csv", columns=None,
+               chunk_size=EXPORT_CHUNK_SIZE):
+        columns = list(columns or EXPORT_COLUMNS)
+        unknown = [column for column in columns if column not in EXPORT_COLUMNS]
+        if unknown:
+            raise ValueError("Unknown export columns: {0}".format(", ".join(unknown)))
+        fields = attrgetter(*columns)
+        with self.snapshot() as snapshot:
+            if len(columns) == 1:
+                rows = ((fields(product),) for product in snapshot.values())
+            else:
+                rows = (fields(product) for product in snapshot.values())
+            count = export_rows(rows, filepath, columns, chunk_size)
+        if self.instrumentation is not None:
+            self.instrumentation.count("bytes_written", os.path.getsize(filepath))
+        return count
+
 
 def operation_selector():
     print("Welcome to Inventory Managment System!👋🏻")
 
     load_from_backup = input("Would like to load your previous data? (y/n): ")
-    mobile_inventory = Inventory(load_from_backup=(load_from_backup == "y"))
+    mobile_inventory = Inventory(load_from_backup=(load_from_backup == "y"),
+                                 journal=True)
     while (1):
         print(
             "Please select an operation that you want to perform on your inventory"
@@ -349,6 +2614,7 @@ def operation_selector():
             mobile_inventory.export_to_excel()
         elif choice == "0":
             mobile_inventory.save_data()
+            mobile_inventory.close()
             break
         else:
             print("Invalid choice! Enter again")
@@ -0,0 +1,479 @@
+import heapq
+import multiprocessing
+import os
+import zlib
+from collections.abc import ItemsView, Mapping, ValuesView
+from itertools import islice
+
+from inventory_management_search_optimized import (WORD_REGEX, Inventory, InventoryTotals,
+                                                    Product, WordIndex, checksum_matches,
+                                                    first_matches, iter_backup, synchronized,
+                                                    to_columns, validate_columns)
+
+LOAD_BATCH_SIZE = 10000  # Products sent to a shard per message while loading
+
+
+# Which shard owns a product id. crc32 rather than hash() so the split is the same
+# in every process and every run.
+def shard_of(key, shards):
+    return zlib.crc32(key.encode("utf-8")) % shards
+
+
+def _row(product: Product):
+    return (product.id, product.name, product.price, product.quantity)
+
+
+# One shard: a plain Inventory plus the global insertion number of each product,
+# so results from all shards can be merged back into Inventory order
+class Shard:
+    def __init__(self) -> None:
+        self.inventory = Inventory(load_from_backup=False)
+        self.inventory.low_stock_listeners = []
+        self.seqs = {}  # key -> global insertion number
+        # key -> global number of the put that last re-indexed its words. Only once the
+        # word index exists: it is built in insertion order, later changes go last.
+        self.term_seqs = {}
+
+    # rows are (seq, id, name, price, quantity); returns the old quantity of each (None = new)
+    def put(self, rows):
+        items, seqs = self.inventory.items, self.seqs
+        old_quantities = []
+        for seq, key, name, price, quantity in rows:
+            old = items.get(key)
+            old_quantities.append(None if old is None else old.quantity)
+            if old is None:
+                seqs[key] = seq
+            self._store(seq, old, Product.trusted(key, name, price, quantity))
+        return old_quantities
+
+    # Replace an existing product, None (and no change) if it does not exist
+    def replace(self, seq, row):
+        old = self.inventory.items.get(row[0])
+        if old is None:
+            return None
+        self._store(seq, old, Product.trusted(*row))
+        return old.quantity
+
+    def _store(self, seq, old, product):
+        if self.inventory.word_index is not None and (
+                old is None or WordIndex.terms_of(old) != WordIndex.terms_of(product)):
+            self.term_seqs[product.id] = seq
+        self.inventory._store(product.id, product)
+
+    # Returns the keys that were there and got deleted
+    def delete(self, keys):
+        deleted = []
+        for key in keys:
+            if key in self.inventory.items:
+                self.inventory._unstore(key)
+                del self.seqs[key]
+                self.term_seqs.pop(key, None)
+                deleted.append(key)
+        return deleted
+
+    def clear(self):
+        self.inventory._clear()
+        self.seqs.clear()
+        self.term_seqs.clear()
+
+    def get(self, key):
+        product = self.inventory.items.get(key)
+        return None if product is None else _row(product)
+
+    def missing(self, keys):
+        return [key for key in keys if key not in self.inventory.items]
+
+    def search(self, keyword, limit):
+        seqs = self.seqs
+        return [(seqs[product.id], _row(product))
+                for product in self.inventory.search_everywhere_by_keyboard(keyword, limit)]
+
+    # (order_by value, seq, row) of Inventory.query on this shard, by seq without order_by
+    def query(self, where, order_by, descending, limit):
+        seqs = self.seqs
+        results = [(getattr(product, order_by) if order_by else 0, seqs[product.id], _row(product))
+                   for product in self.inventory.query(where, order_by, descending, limit)]
+        return results if order_by else sorted(results)
+
+    # Best limit matches of a search mode (see Inventory._matches) as (score, order, row),
+    # sorted. order is where Inventory puts the key among equal scores: its posting
+    # order, or its insertion order for ranked tiers 3 and 4.
+    def matches(self, mode, query, limit, options):
+        seqs, term_seqs, items = self.seqs, self.term_seqs, self.inventory.items
+        found = first_matches(self.inventory._matches(mode, query, *options), limit)
+        return sorted(
+            (score, seqs[key] if mode == "ranked" and score[0] >= 3
+             else term_seqs.get(key, seqs[key]), _row(items[key]))
+            for key, score in found.items())
+
+    # Per query word, how many products of this shard have a word close to it
+    def fuzzy_counts(self, query, max_distance):
+        return self.inventory._words().fuzzy_counts(query, max_distance)
+
+    def low_stock(self, threshold):
+        seqs = self.seqs
+        return sorted((product.quantity, seqs[product.id], _row(product))
+                      for product in self.inventory.low_stock_items(threshold))
+
+    def lowest(self, n):
+        seqs = self.seqs
+        return sorted((product.quantity, seqs[product.id], _row(product))
+                      for product in self.inventory.lowest_stock_items(n))
+
+    def items(self):
+        seqs = self.seqs
+        return [(seqs[key], key, _row(product))
+                for key, product in self.inventory.items.items()]
+
+    def totals(self):
+        totals = self.inventory.totals
+        return totals.products, totals.units, totals.value
+
+    def recompute(self):
+        totals = self.inventory.recompute_totals()
+        return totals.products, totals.units, totals.value
+
+
+# Worker process loop: (method name, args) in, (ok, result or exception) out, None stops it
+def _shard_worker(connection):
+    shard = Shard()
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        name, args = message
+        try:
+            reply = (True, getattr(shard, name)(*args))
+        except Exception as error:
+            reply = (False, error)
+        connection.send(reply)
+    connection.close()
+
+
+# Read-only dict-like view over every shard, in Inventory insertion order
+class ShardedItems(Mapping):
+    def __init__(self, inventory) -> None:
+        self._inventory = inventory
+
+    def __getitem__(self, key):
+        product = self._inventory._get(key)
+        if product is None:
+            raise KeyError(key)
+        return product
+
+    def __contains__(self, key):
+        return self._inventory._get(key) is not None
+
+    def __iter__(self):
+        for key, _ in self._inventory._items():
+            yield key
+
+    def __len__(self):
+        return self._inventory.report_summary()["products"]
+
+    def values(self):
+        return ShardedValues(self)
+
+    def items(self):
+        return ShardedItemsView(self)
+
+
+class ShardedValues(ValuesView):
+    def __iter__(self):
+        for _, product in self._mapping._inventory._items():
+            yield product
+
+
+class ShardedItemsView(ItemsView):
+    def __iter__(self):
+        yield from self._mapping._inventory._items()
+
+
+# Inventory split across worker processes so scans use every core. Product ids are
+# hash-partitioned (see shard_of): point operations go to the owning shard, scans and
+# totals are sent to all shards at once and their results merged. The public API is
+# the same as Inventory; results come back in the same order, except that low stock
+# ties are ordered by insertion rather than by when they reached that quantity.
+# Prefix, fuzzy and ranked search ties follow Inventory's posting order (see Shard).
+class ShardedInventory(Inventory):
+    def __init__(self, shards=None, load_from_backup=True, **kwargs) -> None:
+        self.shards = shards or os.cpu_count() or 1
+        super().__init__(load_from_backup=load_from_backup, **kwargs)
+
+    def _init_storage(self):
+        context = multiprocessing.get_context()
+        self._connections, self._workers = [], []
+        for _ in range(self.shards):
+            parent, child = context.Pipe()
+            worker = context.Process(target=_shard_worker, args=(child,), daemon=True)
+            worker.start()
+            child.close()
+            self._connections.append(parent)
+            self._workers.append(worker)
+        self._next_seq = 0
+        self.items = ShardedItems(self)
+        self.search_index = None
+        self.quantity_index = None
+        self.price_index = None
+
+    # Totals live in the shards, summed on demand (the base class' assignment is ignored)
+    @property
+    def totals(self):
+        totals = InventoryTotals()
+        for products, units, value in self._broadcast("totals"):
+            totals.products += products
+            totals.units += units
+            totals.value += value
+        return totals
+
+    @totals.setter
+    def totals(self, value):
+        pass
+
+    # Send to every shard (or the ones in args_by_shard) first, then collect the replies,
+    # so the shards work in parallel
+    @synchronized
+    def _broadcast(self, name, *args, args_by_shard=None):
+        if args_by_shard is None:
+            args_by_shard = {shard: args for shard in range(self.shards)}
+        for shard, shard_args in args_by_shard.items():
+            self._connections[shard].send((name, shard_args))
+        # Every reply is read before raising, or the next call would get a stale one
+        replies = [self._connections[shard].recv() for shard in args_by_shard]
+        for ok, result in replies:
+            if not ok:
+                raise result
+        return [result for _, result in replies]
+
+    @synchronized
+    def _call(self, shard, name, *args):
+        self._connections[shard].send((name, args))
+        ok, result = self._connections[shard].recv()
+        if not ok:
+            raise result
+        return result
+
+    def _shard(self, key):
+        return shard_of(key, self.shards)
+
+    def _get(self, key):
+        row = self._call(self._shard(key), "get", key)
+        return None if row is None else Product.trusted(*row)
+
+    def _items(self):
+        merged = heapq.merge(*self._broadcast("items"))
+        return ((key, Product.trusted(*row)) for _, key, row in merged)
+
+    # Group (id, name, price, quantity) rows by owning shard, each with a fresh insertion number
+    def _route(self, rows):
+        by_shard = {}
+        for row in rows:
+            by_shard.setdefault(self._shard(row[0]), []).append((self._next_seq,) + tuple(row))
+            self._next_seq += 1
+        return by_shard
+
+    # Hooks used by the base class (journal replay, transaction rollback)
+    def _store(self, key, product: Product):
+        self._call(self._shard(key), "put", [(self._next_seq,) + _row(product)])
+        self._next_seq += 1
+
+    def _unstore(self, key):
+        if not self._call(self._shard(key), "delete", [key]):
+            raise KeyError(key)
+
+    def _clear(self):
+        self._broadcast("clear")
+
+    # Shards live in other processes, a snapshot is a copy fetched in one locked broadcast
+    @synchronized
+    def snapshot(self):
+        return self._copied_snapshot()
+
+    def _touch(self, key):
+        if self._undo is not None:
+            self._remember(key)
+
+    # The backup is streamed and sent to the shards in validated batches, keyed by
+    # product id. Batches of a snapshot whose checksum matches are not validated again.
+    # Always loads eagerly, lazy is accepted for compatibility with Inventory.
+    @synchronized
+    def load_data(self, lazy=False, progress=None):
+        if os.path.isfile(self.data_filepath):
+            trusted = checksum_matches(self.data_filepath)
+            entries = iter_backup(self.data_filepath, progress=progress)
+            for batch in iter(lambda: list(islice(entries, LOAD_BATCH_SIZE)), []):
+                columns = to_columns([fields for _, fields in batch])
+                if not trusted:
+                    validate_columns(*columns)
+                self._broadcast("put", args_by_shard={
+                    shard: (rows,) for shard, rows in self._route(zip(*columns)).items()})
+                if self.ledger is not None or self.stock is not None:
+                    self._open([["put", row[0]] + list(row) for row in zip(*columns)])
+        self._replay_journal()
+
+    @synchronized
+    def add_item(self, new_product: Product):
+        self._touch(new_product.id)
+        old_quantity, = self._call(self._shard(new_product.id), "put",
+                                   [(self._next_seq,) + _row(new_product)])
+        self._next_seq += 1
+        self._log("put", new_product.id, new_product)
+        self._check_low_stock_quantity(old_quantity, new_product)
+
+    @synchronized
+    def update_item(self, new_product: Product):
+        self._touch(new_product.id)
+        old_quantity = self._call(self._shard(new_product.id), "replace", self._next_seq,
+                                  _row(new_product))
+        self._next_seq += 1
+        if old_quantity is None:
+            print("Item not found!")
+            return
+        self._log("put", new_product.id, new_product)
+        self._check_low_stock_quantity(old_quantity, new_product)
+
+    def _check_low_stock_quantity(self, old_quantity, product: Product):
+        threshold = self.low_alert_threshold
+        if product.quantity <= threshold and (old_quantity is None or old_quantity > threshold):
+            for listener in self.low_stock_listeners:
+                listener(product)
+
+    @synchronized
+    def delete_item(self, product_id):
+        self._touch(product_id)
+        if self._call(self._shard(product_id), "delete", [product_id]):
+            self._log("del", product_id)
+            return True
+        return False
+
+    def product_exists(self, product_id):
+        return self._get(product_id) is not None
+
+    def search_by_id(self, id):
+        return self._get(id) or False
+
+    @synchronized
+    def update_items(self, products=None, ids=None, names=None, prices=None,
+                     quantities=None, alerts=True):
+        columns = to_columns(products, ids, names, prices, quantities)
+        validate_columns(*columns)
+        by_shard = {}
+        for id in columns[0]:
+            by_shard.setdefault(self._shard(id), []).append(id)
+        missing = [id for ids in self._broadcast(
+            "missing", args_by_shard={shard: (ids,) for shard, ids in by_shard.items()})
+            for id in ids]
+        if missing:
+            raise KeyError("Items not found: {0}".format(", ".join(missing)))
+        return self._put_batch(columns, alerts)
+
+    def _put_batch(self, columns, alerts, reason=None):
+        rows = list(zip(*columns))
+        if self._undo is not None:
+            for row in rows:
+                self._remember(row[0])
+        by_shard = self._route(rows)
+        replies = self._broadcast("put", args_by_shard={
+            shard: (shard_rows,) for shard, shard_rows in by_shard.items()})
+        threshold = self.low_alert_threshold
+        crossed = []
+        for shard_rows, old_quantities in zip(by_shard.values(), replies):
+            for (_, id, name, price, quantity), old_quantity in zip(shard_rows, old_quantities):
+                if quantity <= threshold and (old_quantity is None or old_quantity > threshold):
+                    crossed.append(Product.trusted(id, name, price, quantity))
+        if self._journal is not None or self.ledger is not None or self.stock is not None:
+            self._log_records([self._journal_record("put", row[0], Product.trusted(*row))
+                               for row in rows], reason)
+        if alerts:
+            for product in crossed:
+                for listener in self.low_stock_listeners:
+                    listener(product)
+        return len(rows)
+
+    @synchronized
+    def delete_items(self, product_ids):
+        product_ids = list(product_ids)
+        if self._undo is not None:
+            for product_id in product_ids:
+                self._remember(product_id)
+        by_shard = {}
+        for product_id in product_ids:
+            by_shard.setdefault(self._shard(product_id), []).append(product_id)
+        deleted = [key for keys in self._broadcast(
+            "delete", args_by_shard={shard: (ids,) for shard, ids in by_shard.items()})
+            for key in keys]
+        self._log_records([self._journal_record("del", key) for key in deleted])
+        return len(deleted)
+
+    @synchronized
+    def recompute_totals(self):
+        totals = InventoryTotals()
+        for products, units, value in self._broadcast("recompute"):
+            totals.products += products
+            totals.units += units
+            totals.value += value
+        return totals
+
+    @synchronized
+    def search_everywhere_by_keyboard(self, keyword: str, limit=None):
+        merged = heapq.merge(*self._broadcast("search", keyword.lower(), limit))
+        return Product.trusted_many(row for _, row in islice(merged, limit))
+
+    # Each shard sends its best limit matches, the best limit of all of them are kept
+    def _merged_matches(self, mode, query, limit, *options):
+        merged = heapq.merge(*self._broadcast("matches", mode, query, limit, options))
+        return Product.trusted_many(row for _, _, row in islice(merged, limit))
+
+    # Every shard runs the query with the limit, the results are merged by order_by
+    # (insertion order without it). Not lazy: each shard sends its whole result.
+    @synchronized
+    def query(self, where=None, order_by=None, descending=False, limit=None):
+        if descending and order_by is not None:
+            merged = heapq.merge(*self._broadcast("query", where, order_by, descending, limit),
+                                 key=lambda result: result[0], reverse=True)
+        else:
+            merged = heapq.merge(*self._broadcast("query", where, order_by, descending, limit))
+        return (Product.trusted(*row) for _, _, row in islice(merged, limit))
+
+    @synchronized
+    def search_prefix(self, prefix: str, limit=10):
+        return self._merged_matches("prefix", prefix.lower(), limit)
+
+    # With several query words every shard must drive the search from the same one, the
+    # rarest over all shards, for results to come in Inventory order
+    @synchronized
+    def search_fuzzy(self, query: str, limit=10, max_distance=None):
+        query = query.lower()
+        counts = None
+        if len(WORD_REGEX.findall(query)) > 1:
+            counts = [sum(word_counts) for word_counts
+                      in zip(*self._broadcast("fuzzy_counts", query, max_distance))]
+            if not all(counts):
+                return []
+        return self._merged_matches("fuzzy", query, limit, max_distance, counts)
+
+    @synchronized
+    def search_ranked(self, keyword: str, limit=10):
+        return self._merged_matches("ranked", keyword.lower(), limit)
+
+    @synchronized
+    def low_stock_items(self, threshold=None):
+        if threshold is None:
+            threshold = self.low_alert_threshold
+        merged = heapq.merge(*self._broadcast("low_stock", threshold))
+        return Product.trusted_many(row for _, _, row in merged)
+
+    @synchronized
+    def lowest_stock_items(self, n):
+        merged = heapq.merge(*self._broadcast("lowest", n))
+        return Product.trusted_many(row for _, _, row in islice(merged, n))
+
+    @synchronized
+    def close(self):
+        super().close()
+        for connection, worker in zip(self._connections, self._workers):
+            if worker.is_alive():
+                connection.send(None)
+                worker.join()
+            connection.close()
+        self._connections, self._workers = [], []
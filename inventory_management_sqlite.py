@@ -0,0 +1,307 @@
+import sqlite3
+from itertools import islice
+from collections.abc import ItemsView, MutableMapping, ValuesView
+from contextlib import contextmanager
+
+from inventory_management_search_optimized import (NGRAM_SIZE, Inventory, InventorySnapshot,
+                                                    InventoryTotals, Product, searchable_fields,
+                                                    synchronized)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,  -- Insertion order, same as dict order
+    key TEXT NOT NULL UNIQUE,
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    price NOT NULL,  -- No type affinity so 300 and 300.0 come back as they went in
+    quantity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS products_quantity ON products (quantity);
+"""
+# Lower-cased searchable fields, rowid = products.seq
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS products_search
+USING fts5(id, name, quantity, price, tokenize = 'trigram');
+"""
+COLUMNS = "id, name, price, quantity"
+
+
+# dict-like view of the products table, so Inventory code written against
+# self.items works unchanged
+class SqliteItems(MutableMapping):
+    def __init__(self, inventory) -> None:
+        self._inventory = inventory
+        self._connection = inventory.connection
+
+    def __getitem__(self, key):
+        row = self._connection.execute(
+            "SELECT {0} FROM products WHERE key = ?".format(COLUMNS), (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return Product(*row)
+
+    def __setitem__(self, key, product):
+        self._inventory._store(key, product)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._inventory._unstore(key)
+
+    def __contains__(self, key):
+        return self._connection.execute(
+            "SELECT 1 FROM products WHERE key = ?", (key,)).fetchone() is not None
+
+    def __iter__(self):
+        for (key,) in self._connection.execute("SELECT key FROM products ORDER BY seq"):
+            yield key
+
+    def __len__(self):
+        return self._connection.execute("SELECT count(*) FROM products").fetchone()[0]
+
+    # One query for the whole scan instead of a lookup per key
+    def rows(self, where="", parameters=(), order="seq"):
+        cursor = self._connection.execute(
+            "SELECT key, {0} FROM products {1} ORDER BY {2}".format(COLUMNS, where, order),
+            parameters)
+        for key, *fields in cursor:
+            yield key, Product(*fields)
+
+    def values(self):
+        return SqliteValues(self)
+
+    def items(self):
+        return SqliteItemsView(self)
+
+    def clear(self):
+        self._inventory._clear()
+
+
+class SqliteValues(ValuesView):
+    def __iter__(self):
+        for _, product in self._mapping.rows():
+            yield product
+
+
+class SqliteItemsView(ItemsView):
+    def __iter__(self):
+        yield from self._mapping.rows()
+
+
+# Snapshot served by its own connection holding a read transaction open: in WAL mode it
+# keeps seeing the database as it was when the transaction started, whatever is written
+class SqliteSnapshot(InventorySnapshot):
+    def __init__(self, connection, totals) -> None:
+        super().__init__({}, [], totals)
+        self._connection = connection
+
+    def __getitem__(self, key):
+        row = self._connection.execute(
+            "SELECT {0} FROM products WHERE key = ?".format(COLUMNS), (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return Product.trusted(*row)
+
+    def _walk(self):
+        cursor = self._connection.execute(
+            "SELECT key, {0} FROM products ORDER BY seq".format(COLUMNS))
+        for key, *fields in cursor:
+            yield key, Product.trusted(*fields)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+# Inventory that keeps its products in a local SQLite database instead of a dict.
+# Id lookups use the unique index on key, low-stock queries the index on quantity
+# and keyword search an FTS5 trigram table. The public API is the same as Inventory.
+class SqliteInventory(Inventory):
+    def __init__(self, database="data/inventory.db", load_from_backup=False,
+                 **kwargs) -> None:
+        self.database = database
+        super().__init__(load_from_backup=load_from_backup, **kwargs)
+
+    def _init_storage(self):
+        # With thread_safe=True every thread shares the connection, behind the writer lock
+        self.connection = sqlite3.connect(self.database, isolation_level=None,
+                                          check_same_thread=not self.thread_safe)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+        try:
+            self.connection.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:  # SQLite built without FTS5 / trigram tokenizer
+            self.has_fts = False
+        self.items = SqliteItems(self)
+        self.search_index = None
+        self.quantity_index = None  # The products_quantity index does this job
+        self.price_index = None
+        self.totals = self._sum_totals()
+
+    # Running totals start from what is already in the database
+    def _sum_totals(self):
+        totals = InventoryTotals()
+        totals.products, totals.units, totals.value = self.connection.execute(
+            "SELECT count(*), coalesce(sum(quantity), 0), coalesce(sum(price * quantity), 0) "
+            "FROM products").fetchone()
+        return totals
+
+    # Inventory.transaction backed by a database transaction (nested calls join the outer one)
+    @contextmanager
+    def transaction(self):
+        if self.connection.in_transaction:
+            yield
+            return
+        with super().transaction():
+            self.connection.execute("BEGIN")
+            try:
+                yield
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    # The database rolls back on its own, no undo log needed
+    def _remember(self, key):
+        pass
+
+    # Without an undo log there is no telling which words to take back, the word index
+    # is dropped and rebuilt on the next prefix/fuzzy/ranked search
+    def _restore(self, undo):
+        self.totals = self._sum_totals()
+        self.word_index = None
+
+    def _store(self, key, product: Product):
+        fields = (product.id, product.name, product.price, product.quantity)
+        with self.transaction():
+            row = self.connection.execute(
+                "SELECT seq, price, quantity FROM products WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                seq = self.connection.execute(
+                    "INSERT INTO products (key, {0}) VALUES (?, ?, ?, ?, ?)".format(COLUMNS),
+                    (key,) + fields).lastrowid
+            else:
+                seq, price, quantity = row
+                self.totals.remove(price, quantity)
+                self.connection.execute(
+                    "UPDATE products SET id = ?, name = ?, price = ?, quantity = ? "
+                    "WHERE seq = ?", fields + (seq,))
+                if self.has_fts:
+                    self.connection.execute(
+                        "DELETE FROM products_search WHERE rowid = ?", (seq,))
+            if self.has_fts:
+                self.connection.execute(
+                    "INSERT INTO products_search (rowid, id, name, quantity, price) "
+                    "VALUES (?, ?, ?, ?, ?)", (seq,) + searchable_fields(product))
+        self.totals.add(product.price, product.quantity)
+        if self.word_index is not None:
+            self.word_index.add(key, product)
+
+    def _store_batch(self, pairs):
+        for key, product in pairs:
+            self._store(key, product)
+
+    def _unstore(self, key):
+        with self.transaction():
+            row = self.connection.execute(
+                "SELECT seq, price, quantity FROM products WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                raise KeyError(key)
+            seq, price, quantity = row
+            self.connection.execute("DELETE FROM products WHERE seq = ?", (seq,))
+            if self.has_fts:
+                self.connection.execute("DELETE FROM products_search WHERE rowid = ?", (seq,))
+        self.totals.remove(price, quantity)
+        if self.word_index is not None:
+            self.word_index.discard(key)
+
+    def _clear(self):
+        with self.transaction():
+            self.connection.execute("DELETE FROM products")
+            if self.has_fts:
+                self.connection.execute("DELETE FROM products_search")
+        self.totals = InventoryTotals()
+        if self.word_index is not None:
+            self.word_index.clear()
+
+    # A private in-memory database can't be opened twice, and a second connection would not
+    # see the changes of a transaction still running, snapshots of those are copies
+    @synchronized
+    def snapshot(self):
+        if self.database == ":memory:" or self.connection.in_transaction:
+            return self._copied_snapshot()
+        connection = sqlite3.connect(self.database, check_same_thread=False)
+        connection.execute("BEGIN")
+        connection.execute("SELECT 1 FROM products LIMIT 1")  # Starts the read transaction
+        return SqliteSnapshot(connection, self.totals.copy())
+
+    # Later writes don't break a cursor the way they break dict iteration, and a snapshot
+    # can mean copying the database, so queries read the live table
+    def _query_items(self):
+        return self.items
+
+    # Loading many products is one transaction instead of one per product
+    def load_data(self, lazy=False, progress=None):
+        with self.transaction():
+            super().load_data(lazy=lazy, progress=progress)
+
+    def add_items(self, *args, **kwargs):
+        with self.transaction():
+            return super().add_items(*args, **kwargs)
+
+    def update_items(self, *args, **kwargs):
+        with self.transaction():
+            return super().update_items(*args, **kwargs)
+
+    def import_file(self, *args, **kwargs):
+        with self.transaction():
+            return super().import_file(*args, **kwargs)
+
+    def delete_items(self, product_ids):
+        with self.transaction():
+            return super().delete_items(product_ids)
+
+    def _ensure_loaded(self):
+        if self._pending is None:
+            return
+        with self.transaction():
+            super()._ensure_loaded()
+
+    # FTS narrows down the candidates, the same substring check as Inventory decides
+    @synchronized
+    def search_everywhere_by_keyboard(self, keyword: str, limit=None):
+        self._ensure_loaded()
+        keyword = keyword.lower()  # To make the search case-insensitive
+        if self.has_fts and len(keyword) >= NGRAM_SIZE:
+            cursor = self.connection.execute(
+                "SELECT {0} FROM products_search s JOIN products p ON p.seq = s.rowid "
+                "WHERE products_search MATCH ? ORDER BY p.seq".format(
+                    ", ".join("p." + column for column in COLUMNS.split(", "))),
+                ('"{0}"'.format(keyword.replace('"', '""')),))
+            candidates = (Product(*row) for row in cursor)
+        else:
+            candidates = self.items.values()
+        matches = (product for product in candidates
+                   if any(keyword in text for text in searchable_fields(product)))
+        return list(islice(matches, limit))
+
+    @synchronized
+    def low_stock_items(self, threshold=None):
+        self._ensure_loaded()
+        if threshold is None:
+            threshold = self.low_alert_threshold
+        return [product for _, product in self.items.rows(
+            "WHERE quantity <= ?", (threshold,), order="quantity, seq")]
+
+    @synchronized
+    def lowest_stock_items(self, n):
+        self._ensure_loaded()
+        return [product for _, product in self.items.rows(
+            order="quantity, seq LIMIT {0:d}".format(n))]
+
+    def close(self):
+        super().close()
+        self.connection.close()
@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import json
+import time
+
+from inventory_management_search_optimized import Inventory, LatencyHistogram, Product
+
+WRITE_BUFFER_LIMIT = 1 << 16  # Bytes of queued responses before waiting for the client
+LINE_LIMIT = 1 << 16  # Longest request line read, longer ones get an error response
+
+
+# asyncio front-end serving one shared Inventory over TCP or a Unix socket.
+# Line protocol: every request is one JSON object per line, e.g.
+#   {"op": "get", "id": "A1"}
+#   {"op": "add", "product": {"id": "A9", "name": "Pixel", "price": 500.0, "quantity": 3}}
+# and every response one JSON line, {"ok": true, "result": ...} or {"ok": false, "error": ...},
+# sent in request order, so clients can pipeline many requests without waiting.
+# A "tag" given with a request is echoed back in its response.
+class InventoryServer:
+    def __init__(self, inventory: Inventory) -> None:
+        self.inventory = inventory
+        self.latency = {}  # op -> LatencyHistogram
+        self.connections = 0
+        self._server = None
+        self.operations = {
+            "add": self.add,
+            "update": self.update,
+            "delete": self.delete,
+            "get": self.get,
+            "search": self.search,
+            "low_stock": self.low_stock,
+            "report": self.report,
+            "stats": self.stats,
+        }
+
+    # request[name] after checking its type, TypeError otherwise (None if optional and missing)
+    @staticmethod
+    def field(request, name, types, optional=False):
+        if optional and request.get(name) is None:
+            return None
+        value = request[name]
+        if not isinstance(value, types) or isinstance(value, bool):
+            raise TypeError("{0} must be {1}".format(
+                name, " or ".join(kind.__name__ for kind in
+                                  (types if isinstance(types, tuple) else (types,)))))
+        return value
+
+    # Operations, each takes the decoded request and returns a JSON-able result
+    def add(self, request):
+        self.inventory.add_item(Product(**self.field(request, "product", dict)))
+        return True
+
+    def update(self, request):
+        product = Product(**self.field(request, "product", dict))
+        if not self.inventory.product_exists(product.id):
+            raise KeyError(product.id)
+        self.inventory.update_item(product)
+        return True
+
+    def delete(self, request):
+        return self.inventory.delete_item(self.field(request, "id", str))
+
+    def get(self, request):
+        product = self.inventory.search_by_id(self.field(request, "id", str))
+        return product.to_dict() if product else None
+
+    def search(self, request):
+        matches = self.inventory.search_everywhere_by_keyboard(
+            self.field(request, "keyword", str), self.field(request, "limit", int, optional=True))
+        return [product.to_dict() for product in matches]
+
+    def low_stock(self, request):
+        return [product.to_dict() for product in
+                self.inventory.low_stock_items(
+                    self.field(request, "threshold", int, optional=True))]
+
+    def report(self, request):
+        return self.inventory.report_summary()
+
+    def stats(self, request):
+        return {op: histogram.to_dict() for op, histogram in self.latency.items()}
+
+    # Run one request line and return the response line
+    def dispatch(self, line):
+        start = time.perf_counter()
+        request = {}
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict) or request.get("op") not in self.operations:
+                raise ValueError("Unknown op, expected one of: {0}".format(
+                    ", ".join(self.operations)))
+            response = {"ok": True, "result": self.operations[request["op"]](request)}
+        except KeyError as error:
+            response = {"ok": False, "error": "Not found: {0}".format(error)}
+        except (ValueError, TypeError) as error:
+            response = {"ok": False, "error": str(error)}
+        except Exception as error:  # One bad request must not end the client's pipeline
+            response = {"ok": False, "error": "Internal error: {0!r}".format(error)}
+        if isinstance(request, dict):
+            if "tag" in request:
+                response["tag"] = request["tag"]
+            if request.get("op") in self.operations:
+                self.latency.setdefault(request["op"], LatencyHistogram()).record(
+                    time.perf_counter() - start)
+        return (json.dumps(response) + "\n").encode("utf-8")
+
+    # Next request line, None for one over LINE_LIMIT: that one is read through and dropped
+    # a buffer at a time, so the requests pipelined after it still get their responses
+    @staticmethod
+    async def _read_line(reader):
+        overlong = False
+        while True:
+            try:
+                line = await reader.readuntil(b"\n")
+            except asyncio.IncompleteReadError as error:
+                line = error.partial  # Last line without a newline, b"" at the end
+            except asyncio.LimitOverrunError as error:
+                await reader.readexactly(error.consumed)  # Already buffered, no newline in it
+                overlong = True
+                continue
+            return None if overlong else line
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                line = await self._read_line(reader)
+                if line is None:
+                    writer.write((json.dumps({"ok": False, "error": "Request longer than {0} bytes"
+                                              .format(LINE_LIMIT)}) + "\n").encode("utf-8"))
+                    continue
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                writer.write(self.dispatch(line))
+                # Only wait on the client when it stops reading its responses
+                if writer.transport.get_write_buffer_size() > WRITE_BUFFER_LIMIT:
+                    await writer.drain()
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8765, path=None):
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path=path,
+                                                           limit=LINE_LIMIT)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port,
+                                                      limit=LINE_LIMIT)
+        return self._server
+
+    @property
+    def address(self):
+        return self._server.sockets[0].getsockname()
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+
+async def serve(inventory, host, port, path=None):
+    server = InventoryServer(inventory)
+    await server.start(host, port, path)
+    print("Serving inventory on {0}".format(path or "{0}:{1}".format(*server.address)))
+    await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve an Inventory over TCP or a Unix socket")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--data", default="data/backup_test.json", help="JSON backup to load")
+    parser.add_argument("--journal", action="store_true", help="journal every mutation")
+    args = parser.parse_args()
+
+    inventory = Inventory(data_filepath=args.data, journal=args.journal)
+    inventory.low_stock_listeners = []
+    try:
+        asyncio.run(serve(inventory, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        inventory.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,25 @@
 import unittest
+import asyncio
+import sys
+import threading
+from itertools import islice
 import json
-import pandas as pd
-from inventory_management_search_optimized import Inventory, Product
+import os
+import random
+import tempfile
+import gzip
+import importlib.util
+import subprocess
+from unittest import mock
+from inventory_management_search_optimized import (Inventory, Product, BinarySnapshot, SortedList,
+                                                    WordIndex, edit_distance, iter_backup,
+                                                    json_to_binary, binary_to_json)
+from inventory_management_sqlite import SqliteInventory
+from inventory_management_sharded import ShardedInventory
+from inventory_management_query import Field, Range
+from inventory_management_ledger import MovementLedger
+from inventory_management_locations import LocationStock
+from inventory_service import InventoryServer
 
 
 class TestProduct(unittest.TestCase):
@@ -29,6 +47,77 @@ class TestProduct(unittest.TestCase):
         with self.assertRaises(ValueError):
             Product("A10","TestName",300,-1)
 
+    def test_trusted(self):
+        """Test for Product built without validation, same fields as a validated one"""
+        product=Product.trusted("A10","TestName",300,1)
+        self.assertEqual(str(product),str(Product("A10","TestName",300,1)))
+        products=Product.trusted_many([("A10","TestName",300,1),("A11","Other",2.5,0)])
+        self.assertEqual([p.id for p in products],["A10","A11"])
+        self.assertEqual(products[1].price,2.5)
+
+    def test_slots(self):
+        """Test for Product compact storage, no per-instance __dict__"""
+        product=Product("A10","TestName",300,1)
+        self.assertFalse(hasattr(product,"__dict__"))
+        with self.assertRaises(AttributeError):
+            product.color="red"
+
+class TestSortedList(unittest.TestCase):
+    def test_add_remove_irange(self):
+        """Test for SortedList against sorted(), with enough values to split chunks"""
+        rng=random.Random(1)
+        values=SortedList()
+        expected=[]
+        for _ in range(5000):
+            value=rng.randint(0,300)
+            if expected and rng.random()<0.3:
+                value=rng.choice(expected)
+                values.remove(value)
+                expected.remove(value)
+            else:
+                values.add(value)
+                expected.append(value)
+        expected.sort()
+        self.assertEqual(list(values),expected)
+        self.assertEqual(len(values),len(expected))
+        for low,high in [(None,None),(10,20),(None,50),(250,None),(40,40),(30,10)]:
+            for inclusive in [(True,True),(False,False),(True,False)]:
+                result=list(values.irange(low,high,inclusive))
+                self.assertEqual(result,[v for v in expected
+                                         if (low is None or v>low or (inclusive[0] and v==low))
+                                         and (high is None or v<high or (inclusive[1] and v==high))])
+        with self.assertRaises(ValueError):
+            values.remove(1000)
+
+class TestMovementLedger(unittest.TestCase):
+    def setUp(self):
+        self.ledger=MovementLedger()
+        for day,(product_id,delta,reason) in enumerate([("A1",10,"receive"),("A2",5,"receive"),("A1",-3,"sale"),
+                                                        ("A1",-2,"sale"),("A2",-5,"sale"),("A1",4,"return")]):
+            self.ledger.append(product_id,delta,reason,timestamp=float(day))
+
+    def test_range_queries(self):
+        """Test for ledger time range, per-product history and rollups"""
+        self.assertEqual(self.ledger.balance("A1"),9)
+        self.assertEqual([m[2] for m in self.ledger.movements("A1",start=1,end=4)],[-3,-2])
+        self.assertEqual(self.ledger.rollup("A1",start=2,end=6),{"movements":3,"units_in":4,"units_out":5,"net":-1})
+        self.assertEqual(self.ledger.rollups(start=2,end=5),{"A1":-5,"A2":-5})
+        self.assertEqual(self.ledger.replay(until=3),{"A1":7,"A2":5})
+        self.assertEqual(list(self.ledger.movements("B1")),[])
+        with self.assertRaises(ValueError):
+            self.ledger.append("A1",1,"late",timestamp=1.0)
+
+    def test_save_load(self):
+        """Test for ledger columns written to disk and read back"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"ledger.bin")
+            self.ledger.save(path)
+            loaded=MovementLedger.load(path)
+        self.assertEqual(list(loaded.movements()),list(self.ledger.movements()))
+        self.assertEqual(loaded.balance("A1"),9)
+        self.assertEqual(list(loaded.movements("A2",start=4)),[(4.0,"A2",-5,"sale")])
+
+
 class TestInventory(unittest.TestCase):
 
     def setUp(self):
@@ -48,6 +137,702 @@ class TestInventory(unittest.TestCase):
             data=json.load(file)
         self.assertEqual(len(mobile_inventory.items),len(data))
 
+    def test_running_totals(self):
+        """Test for Inventory running totals, same as a full recompute"""
+        self.test_inventory.add_item(Product("A10","TestName",0.1,3))
+        self.test_inventory.update_item(Product("A1","iPhone 18",300,1))
+        self.test_inventory.delete_item("A6")
+        self.test_inventory.check_totals()
+        summary=self.test_inventory.report_summary()
+        self.assertEqual(summary["products"],len(self.test_inventory.items))
+        self.assertEqual(summary["units"],sum(item.quantity for item in self.test_inventory.items.values()))
+        self.assertAlmostEqual(summary["total_value"],
+                               sum(item.price*item.quantity for item in self.test_inventory.items.values()))
+
+    def test_low_stock_items(self):
+        """Test for Inventory low stock index with any threshold"""
+        for threshold in [0,1,2,3,10,100]:
+            expected=sorted((item for item in self.test_inventory.items.values() if item.quantity<=threshold),
+                            key=lambda item:item.quantity)
+            self.assertEqual([item.quantity for item in self.test_inventory.low_stock_items(threshold)],
+                             [item.quantity for item in expected])
+        self.test_inventory.update_item(Product("A1","iPhone 16",2000.0,0))
+        self.assertEqual([item.id for item in self.test_inventory.lowest_stock_items(2)],["A1","A4"])
+
+    def test_low_stock_events(self):
+        """Test for Inventory low stock events, only sent when the threshold is crossed"""
+        alerts=[]
+        self.test_inventory.low_stock_listeners=[alerts.append]
+        self.test_inventory.update_item(Product("A1","iPhone 16",2000.0,2))
+        self.test_inventory.update_item(Product("A1","iPhone 16",2000.0,1))
+        self.test_inventory.update_item(Product("A1","iPhone 16",2000.0,5))
+        self.test_inventory.low_alert_threshold=5
+        self.test_inventory.update_item(Product("A1","iPhone 16",2000.0,4))
+        self.test_inventory.add_item(Product("A10","TestName",300,1))
+        self.assertEqual([(item.id,item.quantity) for item in alerts],[("A1",2),("A10",1)])
+
+    def test_add_items(self):
+        """Test for Inventory bulk add from rows and from columns"""
+        import pandas as pd
+        self.assertEqual(self.test_inventory.add_items([Product("B1","Pixel",500.0,4),("B2","Nokia",50,1),
+                                                        {"id":"B3","name":"Sony","price":700.5,"quantity":9}]),3)
+        self.assertEqual(self.test_inventory.add_items(ids=pd.Series(["C1","C2"]),names=["Asus","Honor"],
+                                                       prices=pd.Series([10.0,20.0]),quantities=pd.Series([7,8])),2)
+        self.assertIsInstance(self.test_inventory.search_by_id("C2").quantity,int)
+        self.assertEqual(self.test_inventory.search_everywhere_by_keyboard("nokia")[0].id,"B2")
+        self.assertIn("B2",[item.id for item in self.test_inventory.low_stock_items()])
+        self.test_inventory.check_totals()
+
+    def test_add_items_indexes(self):
+        """Test for Inventory bulk add, indexes and totals same as adding row by row"""
+        rows=[("B1","Pixel",500.0,4),("A1","iPhone 18",900.0,1),("B2","Nokia",50,1),("B1","Pixel 2",450.0,6)]
+        one_by_one=Inventory(load_from_backup=True,data_filepath=self.backupFilePath)
+        for inventory in (self.test_inventory,one_by_one):
+            inventory.low_stock_listeners=[]
+        self.test_inventory.add_items(rows)
+        for row in rows:
+            if row[0] in one_by_one.items:
+                one_by_one.update_item(Product(*row))
+            else:
+                one_by_one.add_item(Product(*row))
+        self.assertEqual(self.test_inventory.totals,one_by_one.totals)
+        self.assertEqual(list(self.test_inventory.price_index.values),list(one_by_one.price_index.values))
+        self.assertEqual(sorted(item.id for item in self.test_inventory.low_stock_items()),
+                         sorted(item.id for item in one_by_one.low_stock_items()))
+        self.assertEqual([item.id for item in self.test_inventory.search_everywhere_by_keyboard("pixel")],["B1"])
+        self.assertEqual(self.test_inventory.search_index.postings,one_by_one.search_index.postings)
+        self.test_inventory.check_totals()
+
+    def test_add_items_all_or_nothing(self):
+        """Test for Inventory bulk add, a bad row rejects the whole batch"""
+        before=list(self.test_inventory.items)
+        for bad_row,error in [(("B 2","Nokia",50,1),ValueError),(("B2",5,50,1),TypeError),
+                              (("B2","Nokia",-1,1),ValueError),(("B2","Nokia",50,1.5),TypeError),
+                              (("B\n2","Nokia",50,1),ValueError),(("B2\n","Nokia",50,1),ValueError)]:
+            with self.assertRaisesRegex(error,"Row 1"):
+                self.test_inventory.add_items([("B1","Pixel",500.0,4),bad_row])
+        self.assertEqual(list(self.test_inventory.items),before)
+
+    def test_update_delete_items(self):
+        """Test for Inventory bulk update and delete"""
+        with self.assertRaises(KeyError):
+            self.test_inventory.update_items([("A1","iPhone 18",1.0,1),("B1","Pixel",1.0,1)])
+        self.assertEqual(self.test_inventory.search_by_id("A1").name,"iPhone 16")
+        self.test_inventory.update_items([("A1","iPhone 18",1.0,1),("A2","Galaxy",1.0,7)])
+        self.assertEqual(self.test_inventory.search_by_id("A2").name,"Galaxy")
+        self.assertEqual(self.test_inventory.delete_items(["A1","A2","B1"]),2)
+        self.assertFalse(self.test_inventory.search_by_id("A1"))
+        self.test_inventory.check_totals()
+
+    def test_search_prefix(self):
+        """Test for Inventory prefix search over ids and name words"""
+        self.test_inventory.add_item(Product("B1","Apple iPad Air",800.0,5))
+        # Ordered by the matching word, "ipad" before "iphone"
+        self.assertEqual([item.id for item in self.test_inventory.search_prefix("IP")],["B1","A1"])
+        self.assertEqual([item.id for item in self.test_inventory.search_prefix("a",limit=3)],["A1","A2","A3"])
+        self.assertEqual(self.test_inventory.search_prefix("xyz"),[])
+
+    def test_search_fuzzy(self):
+        """Test for Inventory typo tolerant search"""
+        self.assertEqual(edit_distance("iphne","iphone"),1)
+        self.assertEqual(edit_distance("smasung","samsung"),1)
+        self.assertEqual([item.id for item in self.test_inventory.search_fuzzy("iphne")],["A1"])
+        self.assertEqual([item.id for item in self.test_inventory.search_fuzzy("Smasung")],["A2"])
+        self.assertEqual([item.id for item in self.test_inventory.search_fuzzy("onplus 8")],["A3"])
+        self.assertEqual(self.test_inventory.search_fuzzy("iphne",max_distance=0),[])
+        self.test_inventory.update_item(Product("A1","Galaxy",2000.0,12))
+        self.assertEqual(self.test_inventory.search_fuzzy("iphne"),[])
+        self.assertEqual([item.id for item in self.test_inventory.search_fuzzy("galaxi")],["A1"])
+
+    def test_search_ranked(self):
+        """Test for Inventory ranked search, best matches first and numeric matches last"""
+        self.test_inventory.add_item(Product("B1","Phone case",9.0,20))
+        self.test_inventory.add_item(Product("B2","Smartphone",300.0,20))
+        self.test_inventory.add_item(Product("B20","Cable",5.0,1))
+        # Whole word, then inside a word in insertion order
+        self.assertEqual([item.id for item in self.test_inventory.search_ranked("phone")],["B1","A1","B2"])
+        self.assertEqual([item.id for item in self.test_inventory.search_ranked("b2",limit=None)],["B2","B20"])
+        # Id prefix first, matches only in price or quantity after it
+        self.assertEqual([item.id for item in self.test_inventory.search_ranked("20",limit=None)],
+                         ["B20","A1","A2","A5","B1","B2"])
+        self.assertEqual(len(self.test_inventory.search_ranked("20",limit=2)),2)
+
+    def test_search_modes_follow_changes(self):
+        """Test for Inventory word index, kept in sync with the products"""
+        self.test_inventory.search_prefix("a")
+        self.test_inventory.add_items([("B{0}".format(i),"Item {0} Pro".format(i),1.0,5) for i in range(50)])
+        self.test_inventory.update_item(Product("B3","Renamed",1.0,5))
+        self.test_inventory.delete_items(["B4","A1"])
+        rebuilt=WordIndex()
+        rebuilt.build(self.test_inventory.items.items())
+        self.assertEqual(self.test_inventory.word_index.postings,rebuilt.postings)
+        self.assertEqual(list(self.test_inventory.word_index.terms),list(rebuilt.terms))
+        self.assertEqual(self.test_inventory.word_index.deletes,rebuilt.deletes)
+
+    def test_query(self):
+        """Test for Inventory structured query, same results as a scan"""
+        price,quantity,name=Field("price"),Field("quantity"),Field("name")
+        self.test_inventory.add_items([("B{0}".format(i),"Item {0}".format(i%7),float(i%50),i%13) for i in range(200)])
+        self.test_inventory.update_item(Product("B3","Item 3",700.0,1))
+        for where in [price.between(10,20)&(quantity<5),(price>1000)|(quantity==0),
+                      name.contains("item 3")&(price<=30),~(quantity>=2),Field("id").isin(["A1","B7","C1"]),None]:
+            expected=[item for item in self.test_inventory.items.values() if where is None or where.matches(item)]
+            self.assertEqual(sorted(item.id for item in self.test_inventory.query(where)),
+                             sorted(item.id for item in expected))
+            self.assertEqual([item.price for item in self.test_inventory.query(where,order_by="price",descending=True,limit=5)],
+                             sorted((item.price for item in expected),reverse=True)[:5])
+        self.assertEqual([item.id for item in self.test_inventory.query(price.between(900,1200),order_by="price")],
+                         ["A3","A4","A2"])
+        with self.assertRaises(ValueError):
+            Field("colour")
+
+    def test_query_is_lazy(self):
+        """Test for Inventory structured query, products are only read as the result is consumed"""
+        self.test_inventory.add_items([("B{0}".format(i),"Item",float(i),5) for i in range(1000)])
+        with mock.patch.object(Range,"matches",autospec=True,return_value=True) as matches:
+            result=self.test_inventory.query(Field("price")>=0)
+            self.assertEqual(matches.call_count,0)
+            self.assertEqual([item.price for item in islice(result,3)],[0.0,1.0,2.0])
+            self.assertEqual(matches.call_count,3)
+
+    def test_query_changes_while_consumed(self):
+        """Test for Inventory structured query, changes made while the result is consumed don't show up"""
+        self.test_inventory.add_items([("B{0}".format(i),"Item",float(i),5) for i in range(100)])
+        for where,options in [(Field("price")>=0,{}),(None,{"order_by":"price"}),(None,{}),
+                              (Field("id").isin(["A1","B3","B4"]),{})]:
+            expected=[item.id for item in self.test_inventory.query(where,**options)]
+            result=self.test_inventory.query(where,**options)
+            first=next(result)
+            self.test_inventory.add_item(Product("C1","Item",3.5,5))
+            self.test_inventory.update_item(Product("B4","Item",4.0,99))
+            self.test_inventory.delete_item(expected[1])
+            self.assertEqual([first.id]+[item.id for item in result],expected)
+            self.assertEqual(len(self.test_inventory._snapshots),0)
+            self.test_inventory.delete_item("C1")
+            self.test_inventory.add_item(Product(expected[1],"Item",1.0,5))
+
+    def test_search_cache(self):
+        """Test for Inventory search cache, only queries a mutation affects are dropped"""
+        mobile_inventory=Inventory(load_from_backup=True,search_cache_size=3)
+        mobile_inventory.low_stock_listeners=[]
+        cache=mobile_inventory.search_cache
+        for keyword in ["iPhone","sams","00.0"]:
+            self.assertEqual([str(item) for item in mobile_inventory.search_everywhere_by_keyboard(keyword)],
+                             [str(item) for item in self.test_inventory.search_everywhere_by_keyboard(keyword)])
+        mobile_inventory.search_everywhere_by_keyboard("IPHONE")
+        self.assertEqual((cache.hits,cache.misses),(1,3))
+        mobile_inventory.update_item(Product("A3","Oneplus 9",900.0,10))  # Matches none of them before or after
+        mobile_inventory.update_item(Product("A1","iPhone 17",1999.0,12))  # Still an iphone, no longer 00.0
+        self.assertEqual(list(cache.entries),["sams","iphone"])
+        self.assertEqual(mobile_inventory.search_everywhere_by_keyboard("iphone")[0].name,"iPhone 17")
+        mobile_inventory.add_item(Product("A10","Samsung S30",10.0,4))
+        mobile_inventory.delete_item("A6")
+        self.assertEqual(list(cache.entries),["iphone"])
+        for keyword in ["a","b","c"]:
+            mobile_inventory.search_everywhere_by_keyboard(keyword)
+        self.assertEqual(list(cache.entries),["a","b","c"])
+        self.assertEqual(cache.to_dict()["evictions"],1)
+        self.assertEqual(cache.to_dict()["invalidations"],2)
+
+    def test_search_cache_bulk_add(self):
+        """Test for Inventory search cache, bulk adds and clear drop only the keywords they change"""
+        mobile_inventory=Inventory(load_from_backup=True,search_cache_size=10)
+        cache=mobile_inventory.search_cache
+        iphones=len(mobile_inventory.search_everywhere_by_keyboard("iphone"))
+        for keyword in ["sams","zzz"]:
+            mobile_inventory.search_everywhere_by_keyboard(keyword)
+        mobile_inventory.add_items([Product("B9","Nokia 3310",1.0,1)])
+        self.assertEqual(list(cache.entries),["iphone","sams","zzz"])
+        self.assertEqual(cache.to_dict()["invalidations"],0)
+        mobile_inventory.add_items([Product("B10","iPhone 18",1.0,1),Product("B11","Pixel",1.0,1)])
+        self.assertEqual(list(cache.entries),["sams","zzz"])
+        self.assertEqual(cache.to_dict()["invalidations"],1)
+        self.assertEqual(len(mobile_inventory.search_everywhere_by_keyboard("iphone")),iphones+1)
+        mobile_inventory._clear()
+        self.assertEqual(list(cache.entries),["zzz"])
+        self.assertEqual(cache.to_dict()["invalidations"],3)
+
+    def test_search_cache_ttl(self):
+        """Test for Inventory search cache, entries expire after the ttl"""
+        mobile_inventory=Inventory(load_from_backup=True,search_cache_size=10,search_cache_ttl=60)
+        with mock.patch("time.monotonic",return_value=1000.0):
+            mobile_inventory.search_everywhere_by_keyboard("iphone")
+            mobile_inventory.search_everywhere_by_keyboard("iphone")
+        with mock.patch("time.monotonic",return_value=1061.0):
+            mobile_inventory.search_everywhere_by_keyboard("iphone")
+        self.assertEqual(mobile_inventory.search_cache.to_dict()["hits"],1)
+        self.assertEqual(mobile_inventory.search_cache.to_dict()["expirations"],1)
+
+    def test_transaction(self):
+        """Test for Inventory transaction, all changes or none of them"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"backup.json")
+            mobile_inventory=Inventory(load_from_backup=False,data_filepath=path,journal=True)
+            mobile_inventory.add_items([("A1","iPhone 16",2000.0,12),("A2","Samsung",1200.0,5)])
+            before=[item.to_dict() for item in mobile_inventory.items.values()]
+            with self.assertRaises(RuntimeError):
+                with mobile_inventory.transaction():
+                    mobile_inventory.update_item(Product("A1","iPhone 17",10.0,1))
+                    mobile_inventory.delete_item("A2")
+                    mobile_inventory.add_item(Product("A3","Pixel",500.0,2))
+                    raise RuntimeError("abort")
+            self.assertEqual([item.to_dict() for item in mobile_inventory.items.values()],before)
+            self.assertEqual(mobile_inventory.low_stock_items(),[])
+            mobile_inventory.check_totals()
+            keys=list(mobile_inventory.items)
+            self.assertEqual([item.id for item in mobile_inventory.search_prefix("a")],keys)
+            with self.assertRaises(RuntimeError):
+                with mobile_inventory.transaction():
+                    mobile_inventory.delete_item("A1")
+                    mobile_inventory.add_item(Product("A1","iPhone 16",2000.0,12))
+                    mobile_inventory.delete_item("A1")
+                    raise RuntimeError("abort")
+            self.assertEqual(list(mobile_inventory.items),keys)
+            self.assertEqual([item.id for item in mobile_inventory.search_everywhere_by_keyboard("")],keys)
+            self.assertEqual([item.id for item in mobile_inventory.search_prefix("a")],keys)
+            with mobile_inventory.snapshot() as snapshot:
+                self.assertEqual(list(snapshot),keys)
+            with mobile_inventory.transaction():
+                mobile_inventory.update_item(Product("A1","iPhone 17",10.0,11))
+                mobile_inventory.update_item(Product("A2","Samsung",1200.0,6))
+            mobile_inventory.close()
+            restored=Inventory(load_from_backup=True,data_filepath=path)
+            self.assertEqual([item.to_dict() for item in restored.items.values()],
+                             [item.to_dict() for item in mobile_inventory.items.values()])
+
+    def test_thread_safe_stress(self):
+        """Test for thread_safe Inventory, invariants hold under concurrent writers"""
+        mobile_inventory=Inventory(load_from_backup=False,thread_safe=True)
+        mobile_inventory.low_stock_listeners=[]
+        # The name always spells out the quantity, a half-applied update would break it
+        mobile_inventory.add_items([("P{0}".format(i),"Item 10",2.0,10) for i in range(20)])
+        errors=[]
+
+        def transfer(seed):
+            rng=random.Random(seed)
+            for _ in range(300):
+                source,target=rng.sample(range(20),2)
+                with mobile_inventory.transaction():
+                    a=mobile_inventory.search_by_id("P{0}".format(source))
+                    b=mobile_inventory.search_by_id("P{0}".format(target))
+                    moved=min(a.quantity,rng.randint(1,3))
+                    mobile_inventory.update_item(Product(a.id,"Item {0}".format(a.quantity-moved),2.0,a.quantity-moved))
+                    mobile_inventory.update_item(Product(b.id,"Item {0}".format(b.quantity+moved),2.0,b.quantity+moved))
+                if rng.random()<0.1:
+                    mobile_inventory.add_item(Product("T{0}".format(seed),"Item 1",2.0,1))
+                    mobile_inventory.delete_item("T{0}".format(seed))
+
+        def read():
+            for _ in range(2000):
+                product=mobile_inventory.search_by_id("P{0}".format(random.randrange(20)))
+                if product.name!="Item {0}".format(product.quantity):
+                    errors.append(product.to_dict())
+                mobile_inventory.search_everywhere_by_keyboard("ite")
+                summary=mobile_inventory.report_summary()
+                if abs(summary["total_value"]-2*summary["units"])>1e-6:
+                    errors.append(summary)
+
+        def run(target,*args):
+            try:
+                target(*args)
+            except Exception as error:
+                errors.append(repr(error))
+
+        interval=sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads=[threading.Thread(target=run,args=(transfer,seed)) for seed in range(4)]
+            threads+=[threading.Thread(target=run,args=(read,)) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(errors,[])
+        mobile_inventory.check_totals()
+        self.assertEqual(mobile_inventory.report_summary()["units"],200)
+        self.assertEqual(len(mobile_inventory.items),20)
+
+    def test_iter_backup(self):
+        """Test for streaming backup reader, same entries as json.load"""
+        data={"A1":{"id":"A1","name":"Café \u00e9 \"1\"","price":2.5,"quantity":1},
+              "B2":{"id":"B2","name":"x","price":3,"quantity":0}}
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"backup.json")
+            with open(path,"w",encoding="utf-8") as file:
+                json.dump(data,file,indent=2,ensure_ascii=False)
+            progress=[]
+            entries=list(iter_backup(path,chunk_size=5,progress=lambda done,total:progress.append(done)))
+            self.assertEqual(dict(entries),data)
+            self.assertEqual(progress[-1],os.path.getsize(path))
+
+    def test_load_data_lazy(self):
+        """Test for lazy load, lookups are served before the whole backup is read"""
+        mobile_inventory=Inventory(load_from_backup=False,data_filepath=self.backupFilePath)
+        mobile_inventory.load_data(lazy=True)
+        self.assertFalse(mobile_inventory.loaded)
+        self.assertTrue(mobile_inventory.search_by_id("A1"))
+        self.assertEqual(len(mobile_inventory.items),1)
+        mobile_inventory.delete_item("A3")
+        mobile_inventory.update_item(Product("A4","Redmi 20",900.0,5))
+        mobile_inventory.generate_report()
+        self.assertTrue(mobile_inventory.loaded)
+        self.assertFalse(mobile_inventory.search_by_id("A3"))
+        self.assertEqual(mobile_inventory.search_by_id("A4").name,"Redmi 20")
+        self.assertEqual(len(mobile_inventory.items),len(self.test_inventory.items)-1)
+
+    def test_journal_replay(self):
+        """Test for journal, unsaved changes survive a restart"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"backup.json")
+            mobile_inventory=Inventory(load_from_backup=False,data_filepath=path,journal=True)
+            mobile_inventory.add_item(Product("A1","iPhone 16",2000.0,12))
+            mobile_inventory.add_item(Product("A2","Samsung",1200.0,5))
+            mobile_inventory.update_item(Product("A1","iPhone 17",2000.0,3))
+            mobile_inventory.delete_item("A2")
+            mobile_inventory.close()
+            with open(mobile_inventory.journal_filepath,"a") as file:
+                file.write('["put","A9"')  # Torn record from a crash
+            restored=Inventory(load_from_backup=True,data_filepath=path)
+            self.assertEqual(list(restored.items),["A1"])
+            self.assertEqual(restored.search_by_id("A1").name,"iPhone 17")
+            self.assertEqual(restored.search_by_id("A1").quantity,3)
+
+    def test_journal_compaction(self):
+        """Test for journal compaction into the snapshot"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"backup.json")
+            mobile_inventory=Inventory(load_from_backup=False,data_filepath=path,journal=True,compact_every=3)
+            for i in range(4):
+                mobile_inventory.add_item(Product("A{0}".format(i),"Phone",100.0,5))
+            with open(path) as file:
+                self.assertEqual(len(json.load(file)),2)
+            with open(mobile_inventory.journal_filepath) as file:
+                self.assertEqual(len(file.readlines()),2)
+            mobile_inventory.save_data()
+            mobile_inventory.close()
+            self.assertEqual(os.path.getsize(mobile_inventory.journal_filepath),0)
+            self.assertEqual(len(Inventory(data_filepath=path).items),4)
+
+    def test_save_data_atomic(self):
+        """Test for snapshot write, a failed save leaves the old snapshot intact"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"backup.json")
+            mobile_inventory=Inventory(load_from_backup=False,data_filepath=path)
+            mobile_inventory.add_item(Product("A1","iPhone 16",2000.0,12))
+            mobile_inventory.save_data()
+            mobile_inventory.add_item(Product("A2","Samsung",1200.0,5))
+            with mock.patch.object(Product,"to_dict",side_effect=OSError("disk full")):
+                with self.assertRaises(OSError):
+                    mobile_inventory.save_data()
+            self.assertEqual(sorted(os.listdir(tmp)),["backup.json","backup.json.crc"])
+            self.assertEqual(list(Inventory(data_filepath=path).items),["A1"])
+
+    def test_load_trusted_snapshot(self):
+        """Test for checksummed snapshot, our own snapshot skips validation and a tampered one does not"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"backup.json")
+            mobile_inventory=Inventory(load_from_backup=False,data_filepath=path)
+            mobile_inventory.add_item(Product("A1","iPhone 16",2000.0,12))
+            mobile_inventory.save_data()
+            with mock.patch.object(Product,"__init__",side_effect=AssertionError("validated")):
+                self.assertEqual(Inventory(data_filepath=path).search_by_id("A1").quantity,12)
+            with open(path) as file:
+                tampered=file.read().replace("12","-1")
+            with open(path,"w") as file:
+                file.write(tampered)
+            with self.assertRaises(ValueError):
+                Inventory(load_from_backup=False,data_filepath=path).load_data()
+
+    def test_instrumentation(self):
+        """Test for opt-in instrumentation, method timings and I/O counters"""
+        self.assertIs(self.test_inventory.search_by_id.__func__,Inventory.search_by_id)
+        self.assertIsNone(self.test_inventory.instrumentation)
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"backup.json")
+            mobile_inventory=Inventory(load_from_backup=False,data_filepath=path,instrument=True)
+            mobile_inventory.add_items([("A1","iPhone 16",2000.0,12),("A2","Samsung",1200.0,5)])
+            mobile_inventory.save_data()
+            written=os.path.getsize(path)
+            self.assertEqual(mobile_inventory.instrumentation.counters["bytes_written"],written)
+            mobile_inventory=Inventory(data_filepath=path,instrument=True)
+            mobile_inventory.search_by_id("A1")
+            mobile_inventory.search_by_id("A3")
+            mobile_inventory.search_everywhere_by_keyboard("samsung")
+            mobile_inventory.export(os.path.join(tmp,"export.csv"))  # Takes a snapshot inside
+            mobile_inventory.check_totals()  # Calls recompute_totals
+            mobile_inventory.instrumentation.dump(os.path.join(tmp,"stats.json"))
+            with open(os.path.join(tmp,"stats.json")) as file:
+                stats=json.load(file)
+        self.assertEqual(stats["methods"]["search_by_id"]["count"],2)
+        self.assertEqual(stats["methods"]["load_data"]["count"],1)
+        self.assertEqual(stats["counters"]["bytes_read"],written)
+        self.assertEqual(stats["counters"]["items_scanned"],1)
+        self.assertEqual((stats["methods"]["export"]["count"],stats["methods"]["check_totals"]["count"]),(1,1))
+        self.assertNotIn("snapshot",stats["methods"])
+        self.assertNotIn("recompute_totals",stats["methods"])
+        self.assertIs(mobile_inventory.prompt_to_get_id.__func__,Inventory.prompt_to_get_id)
+        self.assertIs(mobile_inventory.generate_report.__func__,Inventory.generate_report)
+
+    def test_profile_hook(self):
+        """Test for profiling hook, every n-th call runs under cProfile and tracemalloc"""
+        hook=self.test_inventory.profile("search_everywhere_by_keyboard",every=2,memory=True)
+        for _ in range(4):
+            self.assertEqual(len(self.test_inventory.search_everywhere_by_keyboard("a1")),1)
+        self.assertEqual(hook.to_dict()["sampled"],2)
+        self.assertGreater(hook.memory_peak,0)
+        self.assertGreater(hook.stats().total_calls,0)
+
+    def test_ledger(self):
+        """Test for Inventory movement ledger, every quantity change is recorded and replays to the quantities"""
+        mobile_inventory=Inventory(load_from_backup=True,data_filepath=self.backupFilePath,ledger=True)
+        mobile_inventory.low_stock_listeners=[]
+        ledger=mobile_inventory.ledger
+        self.assertEqual(ledger.rollup()["movements"],len(mobile_inventory.items))
+        self.assertEqual(mobile_inventory.move_stock("A1",-5,"sale").quantity,7)
+        with self.assertRaises(ValueError):
+            mobile_inventory.move_stock("A1",-8,"sale")
+        mobile_inventory.update_item(Product("A2","Samsung",1200.0,9))
+        mobile_inventory.delete_item("A3")
+        mobile_inventory.add_items([("B1","Pixel",500.0,4)])
+        with self.assertRaises(RuntimeError):
+            with mobile_inventory.transaction():
+                mobile_inventory.move_stock("A1",-7,"sale")
+                raise RuntimeError("abort")
+        with mobile_inventory.transaction():
+            mobile_inventory.move_stock("A5",3,"receive")
+            mobile_inventory.move_stock("A5",-1,"sale")
+        self.assertEqual([(m[1],m[2],m[3]) for m in list(ledger.movements())[6:]],
+                         [("A1",-5,"sale"),("A2",7,"set"),("A3",-10,"delete"),("B1",4,"set"),
+                          ("A5",3,"receive"),("A5",-1,"sale")])
+        self.assertEqual(ledger.rollup("A5"),{"movements":3,"units_in":15,"units_out":1,"net":14})
+        replayed=ledger.replay()
+        self.assertEqual({id:replayed[id] for id in mobile_inventory.items},
+                         {id:item.quantity for id,item in mobile_inventory.items.items()})
+        self.assertEqual(replayed["A3"],0)
+
+    def test_ledger_after_load(self):
+        """Test for Inventory movement ledger, products loaded after construction open their balance first"""
+        for lazy in (False,True):
+            mobile_inventory=Inventory(load_from_backup=False,data_filepath=self.backupFilePath,ledger=True)
+            mobile_inventory.low_stock_listeners=[]
+            mobile_inventory.load_data(lazy=lazy)
+            mobile_inventory.move_stock("A1",-1,"sale")
+            self.assertEqual([(m[1],m[2],m[3]) for m in mobile_inventory.ledger.movements("A1")],
+                             [("A1",12,"opening"),("A1",-1,"sale")])
+            self.assertEqual(mobile_inventory.ledger.balance("A1"),11)
+
+    def test_locations(self):
+        """Test for Inventory per-location stock, transfers and per-location low stock"""
+        mobile_inventory=Inventory(load_from_backup=True,data_filepath=self.backupFilePath,locations=["north","south"])
+        mobile_inventory.low_stock_listeners=[]
+        alerts=[]
+        mobile_inventory.location_low_stock_listeners=[lambda product,location: alerts.append((product.id,location))]
+        stock=mobile_inventory.stock
+        self.assertEqual(stock.quantities("A1"),{"north":12})
+        self.assertEqual(mobile_inventory.transfer_stock("A1","north","south",10),{"north":2,"south":10})
+        self.assertEqual(alerts,[("A1","north")])
+        with self.assertRaises(ValueError):
+            mobile_inventory.transfer_stock("A1","north","south",3)
+        self.assertEqual(mobile_inventory.set_stock("A1","south",4).quantity,6)
+        self.assertEqual(mobile_inventory.move_stock("A1",-3,"sale",location="south").quantity,3)
+        mobile_inventory.update_item(Product("A1","iPhone 16",2000.0,1))  # Taken from north first
+        self.assertEqual(stock.quantities("A1"),{"south":1})
+        with self.assertRaises(RuntimeError):
+            with mobile_inventory.transaction():
+                mobile_inventory.transfer_stock("A3","north","south",5)
+                mobile_inventory.set_stock("A5","south",20)
+                raise RuntimeError("abort")
+        self.assertEqual((stock.quantities("A3"),stock.quantities("A5")),({"north":10},{"north":12}))
+        self.assertEqual(mobile_inventory.search_by_id("A5").quantity,12)
+        mobile_inventory.delete_item("A2")
+        mobile_inventory.add_item(Product("B1","Pixel",500.0,4))
+        self.assertEqual((stock.quantities("A2"),stock.quantities("B1")),({},{"north":4}))
+        self.assertEqual(sorted(item.id for item in mobile_inventory.low_stock_at("south")),["A1","A3","A4","A5","A6","B1"])
+        self.assertEqual(stock.location_total("north")+stock.location_total("south"),mobile_inventory.totals.units)
+        self.assertEqual(stock.rollup()["south"],{"units":1,"value":2000.0})
+        with self.assertRaises(RuntimeError):
+            with mobile_inventory.transaction():
+                mobile_inventory.delete_item("A3")
+                mobile_inventory.add_item(Product("B2","Nokia",50.0,3))
+                raise RuntimeError("abort")
+        self.assertEqual((stock.quantities("A3"),stock.quantities("B2")),({"north":10},{}))
+        self.assertNotIn("B2",stock.rows)
+        mobile_inventory.add_item(Product("B3","Nokia",50.0,5))  # Takes the row A2 left free
+        self.assertEqual(stock.quantities("B3"),{"north":5})
+        self.assertEqual(sorted(item.id for item in mobile_inventory.low_stock_at("north")),["A1","A4"])
+        with tempfile.TemporaryDirectory() as tmp:
+            stock.save(os.path.join(tmp,"stock.bin"))
+            loaded=LocationStock.load(os.path.join(tmp,"stock.bin"))
+        self.assertEqual({id:loaded.quantities(id) for id in mobile_inventory.items},
+                         {id:stock.quantities(id) for id in mobile_inventory.items})
+        self.assertEqual(loaded.rollup(),stock.rollup())
+        before={id:stock.quantities(id) for id in mobile_inventory.items}
+        stock.add_location("east")  # Every row gets one cell wider
+        stock.set("B3","east",2)
+        before["B3"]["east"]=2
+        self.assertEqual({id:stock.quantities(id) for id in mobile_inventory.items},before)
+        self.assertEqual(stock.rollup()["east"],{"units":2,"value":100.0})
+        self.assertEqual(stock.low_stock("east",0),sorted(set(mobile_inventory.items)-{"B3"},key=stock.rows.get))
+
+    def test_locations_after_load(self):
+        """Test for Inventory per-location stock of products loaded after construction"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"backup.bin")
+            self.test_inventory.save_binary(path)
+            for load in (lambda inventory: inventory.load_data(),lambda inventory: inventory.load_binary(path)):
+                mobile_inventory=Inventory(load_from_backup=False,data_filepath=self.backupFilePath,locations=["north","south"])
+                mobile_inventory.low_stock_listeners=mobile_inventory.location_low_stock_listeners=[]
+                load(mobile_inventory)
+                self.assertEqual(mobile_inventory.transfer_stock("A1","north","south",5),{"north":7,"south":5})
+                with self.assertRaises(RuntimeError):
+                    with mobile_inventory.transaction():
+                        mobile_inventory.delete_item("A3")
+                        mobile_inventory.set_stock("A5","south",20)  # Loads A5, which the rollback keeps
+                        raise RuntimeError("abort")
+                stock=mobile_inventory.stock
+                self.assertEqual((stock.quantities("A3"),stock.quantities("A5")),({"north":10},{"north":12}))
+                self.assertEqual(sorted(item.id for item in mobile_inventory.low_stock_at("south")),
+                                 ["A2","A3","A4","A5","A6"])
+                self.assertEqual(stock.location_total("north")+stock.location_total("south"),mobile_inventory.totals.units)
+
+    def test_save_atomic(self):
+        """Test for binary snapshot, ledger and stock saves, a failed save leaves the old file whole"""
+        mobile_inventory=Inventory(load_from_backup=True,ledger=True,locations=["north"])
+        mobile_inventory.low_stock_listeners=mobile_inventory.location_low_stock_listeners=[]
+        with tempfile.TemporaryDirectory() as tmp:
+            saves={"backup.bin":mobile_inventory.save_binary,"ledger.bin":mobile_inventory.ledger.save,
+                   "stock.bin":mobile_inventory.stock.save}
+            for name,save in saves.items():
+                save(os.path.join(tmp,name))
+            before={name:open(os.path.join(tmp,name),"rb").read() for name in saves}
+            mobile_inventory.update_item(Product("A1","iPhone 18",300,1))
+            for name,save in saves.items():
+                with mock.patch("os.fsync",side_effect=OSError("disk full")):
+                    with self.assertRaises(OSError):
+                        save(os.path.join(tmp,name))
+                self.assertEqual(open(os.path.join(tmp,name),"rb").read(),before[name])
+            self.assertEqual(sorted(os.listdir(tmp)),sorted(saves))
+            # Saving over the snapshot a lazy load is still reading from
+            path=os.path.join(tmp,"backup.bin")
+            lazy_inventory=Inventory(load_from_backup=False)
+            lazy_inventory.load_binary(path,lazy=True)
+            mobile_inventory.save_binary(path)
+            self.assertEqual(lazy_inventory.search_by_id("A1").name,"iPhone 16")
+            self.assertEqual(len(lazy_inventory.search_everywhere_by_keyboard("")),len(mobile_inventory.items))
+
+    def test_snapshot(self):
+        """Test for Inventory snapshot, unchanged by writes made while it is read"""
+        mobile_inventory=Inventory(load_from_backup=True,data_filepath=self.backupFilePath)
+        mobile_inventory.low_stock_listeners=[]
+        before=[str(item) for item in mobile_inventory.items.values()]
+        totals=mobile_inventory.totals.copy()
+        with mobile_inventory.snapshot() as snapshot:
+            walk=iter(snapshot.items())
+            first=next(walk)
+            mobile_inventory.update_item(Product("A1","iPhone 18",300,1))
+            mobile_inventory.delete_item("A2")
+            mobile_inventory.add_items([("B{0}".format(i),"Pixel",500.0,4) for i in range(50)])
+            mobile_inventory.delete_items(["B{0}".format(i) for i in range(50)])  # Compacts the key log
+            mobile_inventory.delete_item("A4")
+            mobile_inventory.add_item(Product("A4","Nokia",50.0,7))
+            self.assertEqual([str(item) for _,item in [first]+list(walk)],before)
+            self.assertEqual(str(snapshot["A2"]),before[1])
+            self.assertNotIn("B1",snapshot)
+            self.assertEqual(snapshot.totals,totals)
+            self.assertEqual(len(snapshot),6)
+        mobile_inventory.update_item(Product("A5","Samsung",1200.0,1))
+        self.assertEqual(len(mobile_inventory._snapshots),0)
+        with mobile_inventory.snapshot() as snapshot:
+            self.assertEqual([str(item) for item in snapshot.values()],
+                             [str(item) for item in mobile_inventory.items.values()])
+
+    def test_journal_group_commit(self):
+        """Test for journal fsync batching, one fsync per fsync_every mutations"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"backup.json")
+            mobile_inventory=Inventory(load_from_backup=True,data_filepath=path,journal=True,fsync_every=3)
+            with mock.patch("os.fsync") as fsync:
+                for i in range(7):
+                    mobile_inventory.add_item(Product("A{0}".format(i),"Phone",100.0,5))
+                self.assertEqual(fsync.call_count,2)
+                mobile_inventory.close()
+                self.assertEqual(fsync.call_count,3)
+
+    def test_journal_idle_tail_sync(self):
+        """Test for journal records left when writes stop, synced once fsync_interval_ms is up"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"backup.json")
+            mobile_inventory=Inventory(load_from_backup=False,data_filepath=path,journal=True,
+                                       fsync_interval_ms=50,thread_safe=True)
+            with mock.patch("os.fsync") as fsync:
+                for i in range(3):
+                    mobile_inventory.add_item(Product("A{0}".format(i),"Phone",100.0,5))
+                timer=mobile_inventory._sync_timer
+                self.assertIsNotNone(timer)
+                timer.join(5)
+                self.assertEqual(fsync.call_count,1)
+                self.assertEqual(mobile_inventory._unsynced,0)
+                mobile_inventory.close()
+                self.assertEqual(fsync.call_count,1)
+
+    def test_binary_snapshot_roundtrip(self):
+        """Test for binary snapshot, converting back and forth keeps every product"""
+        with tempfile.TemporaryDirectory() as tmp:
+            binary_path=os.path.join(tmp,"backup.bin")
+            json_path=os.path.join(tmp,"backup.json")
+            json_to_binary(self.backupFilePath,binary_path)
+            binary_to_json(binary_path,json_path)
+            with open(self.backupFilePath) as expected, open(json_path) as result:
+                self.assertEqual(json.load(result),json.load(expected))
+            snapshot=BinarySnapshot(binary_path)
+            self.assertTrue(snapshot.verify())
+            self.assertEqual(len(snapshot),len(self.test_inventory.items))
+            snapshot.close()
+
+    def test_load_binary(self):
+        """Test for Inventory served lazily from a memory-mapped binary snapshot"""
+        self.test_inventory.add_item(Product("Z1","Café",300,1))
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"backup.bin")
+            self.test_inventory.save_binary(path)
+            mobile_inventory=Inventory(load_from_backup=False)
+            mobile_inventory.load_binary(path)
+            self.assertEqual(mobile_inventory.search_by_id("Z1").price,300)
+            self.assertIsInstance(mobile_inventory.search_by_id("Z1").price,int)
+            self.assertFalse(mobile_inventory.search_by_id("B1"))
+            self.assertEqual(len(mobile_inventory.items),1)
+            mobile_inventory.delete_item("A2")
+            self.assertEqual(len(mobile_inventory.search_everywhere_by_keyboard("")),len(self.test_inventory.items)-1)
+            self.assertTrue(mobile_inventory.loaded)
+            self.assertEqual(str(mobile_inventory.search_by_id("A1")),str(self.test_inventory.search_by_id("A1")))
+
+    def test_load_binary_report_summary(self):
+        """Test for report summary served from the binary columns while the load is pending"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"backup.bin")
+            self.test_inventory.save_binary(path)
+            mobile_inventory=Inventory(load_from_backup=False)
+            mobile_inventory.load_binary(path)
+            expected_inventory=Inventory(load_from_backup=False)
+            expected_inventory.load_binary(path,lazy=False)
+            self.assertEqual(mobile_inventory.report_summary(),expected_inventory.report_summary())
+            self.assertEqual(len(mobile_inventory.items),0)
+            mobile_inventory._load_next()
+            for inventory in (mobile_inventory,expected_inventory):
+                product=inventory.search_by_id("A1")
+                inventory.update_item(Product(product.id,product.name,product.price,product.quantity+7))
+                inventory.delete_item("A2")
+                inventory.add_item(Product("Z1","Café",300,1))
+            result,expected=mobile_inventory.report_summary(),expected_inventory.report_summary()
+            self.assertFalse(mobile_inventory.loaded)
+            self.assertEqual(result["products"],expected["products"])
+            self.assertEqual(result["units"],expected["units"])
+            self.assertAlmostEqual(result["total_value"],expected["total_value"])
+            mobile_inventory._ensure_loaded()
+            self.assertEqual(mobile_inventory.report_summary(),result)
+
     def test_save_data(self):
         """Test to save Inventory data to backup"""
         mobile_inventory=Inventory(load_from_backup=True)
@@ -74,6 +859,7 @@ class TestInventory(unittest.TestCase):
         self.test_inventory.update_item(Product("A1","iPhone 18",300,1))
         result=self.test_inventory.search_by_id("A1")
         self.assertEqual(result.name,"iPhone 18")
+        self.assertEqual(result.price,300)
     
     def test_delete_item(self):
         """Test for Inventory delete item"""
@@ -84,17 +870,423 @@ class TestInventory(unittest.TestCase):
         """Test for Inventory search globally by keyword"""
         result=self.test_inventory.search_everywhere_by_keyboard("iPhone")
         self.assertEqual(len(result),1)
+
+    def test_search_index_matches_scan(self):
+        """Test for Inventory keyword search index, same results as a full scan"""
+        self.test_inventory.add_item(Product("A10","iPhone 15 Mini",99.5,4))
+        self.test_inventory.update_item(Product("A2","Galaxy",1200.0,20))
+        self.test_inventory.delete_item("A3")
+        for keyword in ["", "a", "A1", "iph", "phone", "ALAX", "00.0", "99.5", "sams", "xyz"]:
+            expected=[item for item in self.test_inventory.items.values()
+                      if any(keyword.lower() in str(value).lower()
+                             for value in (item.id,item.name,item.quantity,item.price))]
+            self.assertEqual(self.test_inventory.search_everywhere_by_keyboard(keyword),expected)
     
     def test_export_to_excel(self):
         """Test for Inventory export to excel"""
+        import pandas as pd
         self.test_inventory.export_to_excel()
         excel_data=pd.read_csv("exported_output.csv")
         self.assertEqual(len(self.test_inventory.items),len(excel_data))
 
+    def test_export_columns_gzip(self):
+        """Test for Inventory streaming export, gzip output and column selection"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"export.csv.gz")
+            self.assertEqual(self.test_inventory.export(path,columns=["quantity","id"],chunk_size=4),6)
+            with gzip.open(path,"rt") as file:
+                lines=file.read().splitlines()
+        self.assertEqual(lines[:2],["Quantity,ID","12,A1"])
+        self.assertEqual(len(lines),7)
+        with self.assertRaises(ValueError):
+            self.test_inventory.export("export.csv",columns=["color"])
+
+    def test_export_matches_pandas(self):
+        """Test for Inventory CSV export, same bytes as the pandas DataFrame export it replaced"""
+        import pandas as pd
+        self.test_inventory.update_item(Product("A1","iPhone, 18 \"Pro\"",300,1))
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"export.csv")
+            self.test_inventory.export(path)
+            pd.DataFrame.from_records([product.to_dict() for product in self.test_inventory.items.values()]).to_csv(
+                os.path.join(tmp,"pandas.csv"),index=False,header=["ID","Name","Price","Quantity"])
+            with open(path,"rb") as exported,open(os.path.join(tmp,"pandas.csv"),"rb") as expected:
+                self.assertEqual(exported.read(),expected.read())
+
+    def test_import_file(self):
+        """Test for Inventory import of an exported CSV, bad rows reported with line numbers"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"export.csv")
+            self.test_inventory.export(path)
+            with open(path,"a") as file:
+                file.write("B 2,Nokia,50,1\nB3,Sony,-1,2\nB4,Asus,10,1.5\nB5,Honor,10,3\n")
+            mobile_inventory=Inventory(load_from_backup=False)
+            report=mobile_inventory.import_file(path,chunk_size=4)
+        self.assertEqual(report.imported,len(self.test_inventory.items)+1)
+        self.assertEqual([line for line,_ in report.errors],[8,9,10])
+        self.assertEqual(str(mobile_inventory.search_by_id("A1")),str(self.test_inventory.search_by_id("A1")))
+        self.assertEqual(mobile_inventory.search_by_id("B5").quantity,3)
+        mobile_inventory.check_totals()
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"),"pyarrow not installed")
+    def test_export_parquet(self):
+        """Test for Inventory streaming export to Parquet"""
+        import pandas as pd
+        with tempfile.TemporaryDirectory() as tmp:
+            path=os.path.join(tmp,"export.parquet")
+            self.test_inventory.export(path,chunk_size=4)
+            self.assertEqual(len(pd.read_parquet(path)),len(self.test_inventory.items))
+
+class TestSqliteInventory(unittest.TestCase):
+
+    def setUp(self):
+        self.backupFilePath="data/backup_test.json"
+        self.test_inventory=SqliteInventory(":memory:",load_from_backup=True,data_filepath=self.backupFilePath)
+        self.dict_inventory=Inventory(load_from_backup=True,data_filepath=self.backupFilePath)
+
+    def tearDown(self):
+        self.test_inventory.close()
+
+    def assertSameProducts(self,result,expected):
+        self.assertEqual([str(item) for item in result],[str(item) for item in expected])
+
+    def test_init_load_from_backup(self):
+        """Test for SQLite Inventory load from backup"""
+        self.assertEqual(list(self.test_inventory.items),list(self.dict_inventory.items))
+
+    def test_add_update_delete(self):
+        """Test for SQLite Inventory add, update and delete"""
+        for inventory in (self.test_inventory,self.dict_inventory):
+            inventory.add_item(Product("A10","TestName",300,1))
+            inventory.update_item(Product("A1","iPhone 18",300,1))
+            self.assertTrue(inventory.delete_item("A6"))
+            self.assertFalse(inventory.delete_item("A6"))
+        self.assertEqual(self.test_inventory.search_by_id("A1").name,"iPhone 18")
+        self.assertIsInstance(self.test_inventory.search_by_id("A10").price,int)
+        self.assertSameProducts(self.test_inventory.items.values(),self.dict_inventory.items.values())
+
+    def test_search_everywhere_by_keyboard(self):
+        """Test for SQLite Inventory keyword search, same results as the dict backend"""
+        for keyword in ["", "a", "iPhone", "PHONE 1", "00.0", "sams", "xyz", '"']:
+            self.assertSameProducts(self.test_inventory.search_everywhere_by_keyboard(keyword),
+                                    self.dict_inventory.search_everywhere_by_keyboard(keyword))
+
+    def test_running_totals(self):
+        """Test for SQLite Inventory running totals"""
+        self.test_inventory.add_item(Product("A10","TestName",0.1,3))
+        self.test_inventory.update_item(Product("A1","iPhone 18",300,1))
+        self.test_inventory.delete_item("A6")
+        self.test_inventory.check_totals()
+        self.assertEqual(self.test_inventory.totals,self.test_inventory._sum_totals())
+
+    def test_transaction(self):
+        """Test for SQLite Inventory transaction rollback"""
+        before=[item.to_dict() for item in self.test_inventory.items.values()]
+        with self.assertRaises(RuntimeError):
+            with self.test_inventory.transaction():
+                self.test_inventory.update_item(Product("A1","iPhone 18",300,1))
+                self.test_inventory.delete_item("A2")
+                raise RuntimeError("abort")
+        self.assertEqual([item.to_dict() for item in self.test_inventory.items.values()],before)
+        self.test_inventory.check_totals()
+
+    def test_query(self):
+        """Test for SQLite Inventory structured query, scans without price index"""
+        where=(Field("price")<=900)&(Field("quantity")>1)
+        self.assertSameProducts(self.test_inventory.query(where,order_by="price"),
+                                self.dict_inventory.query(where,order_by="price"))
+
+    def test_low_stock_items(self):
+        """Test for SQLite Inventory low stock query"""
+        self.assertSameProducts(self.test_inventory.low_stock_items(),self.dict_inventory.low_stock_items())
+
+    def test_export_to_excel(self):
+        """Test for SQLite Inventory export to excel"""
+        import pandas as pd
+        self.test_inventory.export_to_excel()
+        excel_data=pd.read_csv("exported_output.csv")
+        self.assertEqual(len(self.test_inventory.items),len(excel_data))
+
+
+    def test_transaction_rollback_word_index(self):
+        """Test for SQLite Inventory prefix search after a rolled back transaction"""
+        self.assertEqual(self.test_inventory.search_prefix("ip")[0].id,"A1")
+        with self.assertRaises(RuntimeError):
+            with self.test_inventory.transaction():
+                self.test_inventory.add_item(Product("B2","ipad",300.0,5))
+                raise RuntimeError("abort")
+        self.assertEqual([item.id for item in self.test_inventory.search_prefix("ip")],["A1"])
+
+    def test_snapshot(self):
+        """Test for SQLite Inventory snapshot, a read transaction on a database file"""
+        with tempfile.TemporaryDirectory() as tmp:
+            inventory=SqliteInventory(os.path.join(tmp,"inventory.db"),load_from_backup=True,
+                                      data_filepath=self.backupFilePath)
+            inventory.low_stock_listeners=[]
+            before=[str(item) for item in inventory.items.values()]
+            with inventory.snapshot() as snapshot:
+                inventory.update_item(Product("A1","iPhone 18",300,1))
+                inventory.delete_item("A2")
+                self.assertEqual([str(item) for item in snapshot.values()],before)
+                self.assertEqual(snapshot["A1"].name,"iPhone 16")
+                self.assertEqual(len(snapshot),6)
+            inventory.close()
+        with self.test_inventory.snapshot() as snapshot:
+            self.test_inventory.delete_item("A1")
+            self.assertIn("A1",snapshot)
+
+
+class TestShardedInventory(unittest.TestCase):
+
+    def setUp(self):
+        self.backupFilePath="data/backup_test.json"
+        self.test_inventory=ShardedInventory(shards=3,load_from_backup=True,data_filepath=self.backupFilePath)
+        self.dict_inventory=Inventory(load_from_backup=True,data_filepath=self.backupFilePath)
+
+    def tearDown(self):
+        self.test_inventory.close()
+
+    def assertSameProducts(self,result,expected):
+        self.assertEqual([str(item) for item in result],[str(item) for item in expected])
+
+    def test_init_load_from_backup(self):
+        """Test for sharded Inventory load from backup, same order as Inventory"""
+        self.assertSameProducts(self.test_inventory.items.values(),self.dict_inventory.items.values())
+
+    def test_add_update_delete(self):
+        """Test for sharded Inventory point and bulk operations"""
+        for inventory in (self.test_inventory,self.dict_inventory):
+            inventory.add_item(Product("A10","TestName",300,1))
+            inventory.update_item(Product("A1","iPhone 18",300,1))
+            self.assertTrue(inventory.delete_item("A6"))
+            self.assertFalse(inventory.delete_item("A6"))
+            inventory.add_items([("B1","Pixel",500.0,4),("B2","Nokia",50,1)])
+            with self.assertRaises(KeyError):
+                inventory.update_items([("B1","Pixel 2",500.0,4),("B9","Nope",1.0,1)])
+            self.assertEqual(inventory.delete_items(["B2","B9"]),1)
+        self.assertEqual(self.test_inventory.search_by_id("A1").name,"iPhone 18")
+        self.assertFalse(self.test_inventory.search_by_id("A6"))
+        self.assertSameProducts(self.test_inventory.items.values(),self.dict_inventory.items.values())
+
+    def test_scans(self):
+        """Test for sharded Inventory search, low stock and totals, merged from every shard"""
+        for keyword in ["", "a", "iPhone", "00.0", "sams", "xyz"]:
+            self.assertSameProducts(self.test_inventory.search_everywhere_by_keyboard(keyword),
+                                    self.dict_inventory.search_everywhere_by_keyboard(keyword))
+        self.assertEqual([item.quantity for item in self.test_inventory.low_stock_items(10)],
+                         [item.quantity for item in self.dict_inventory.low_stock_items(10)])
+        self.assertEqual(self.test_inventory.totals,self.dict_inventory.totals)
+        self.test_inventory.check_totals()
+
+    def test_search_modes(self):
+        """Test for sharded Inventory prefix, fuzzy and ranked search, same as Inventory"""
+        for inventory in (self.test_inventory,self.dict_inventory):
+            inventory.add_items([("B{0}".format(i),"Phone {0}".format(i),1.0,5) for i in range(20)])
+        for search,query in [("search_prefix","b1"),("search_fuzzy","phine"),("search_ranked","phone"),
+                             ("search_everywhere_by_keyboard","phone")]:
+            self.assertSameProducts(getattr(self.test_inventory,search)(query,limit=5),
+                                    getattr(self.dict_inventory,search)(query,limit=5))
+
+    def test_search_modes_order(self):
+        """Test for sharded Inventory prefix, fuzzy and ranked search ties, in the same order as Inventory"""
+        rng=random.Random(7)
+        words=["phone","phon","iphone","pro","max","galaxy","pixel","phones","photo"]
+        rows=[("P{0}".format(i)," ".join(rng.choice(words) for _ in range(rng.randint(1,3))),float(i%17),i%9)
+              for i in range(300)]
+        self.test_inventory.close()
+        self.test_inventory=ShardedInventory(shards=4,load_from_backup=False)
+        self.dict_inventory=Inventory(load_from_backup=False)
+        for step in range(2):
+            for inventory in (self.test_inventory,self.dict_inventory):
+                inventory.low_stock_listeners=[]
+                if step==0:
+                    inventory.add_items(rows[:250],alerts=False)
+                else:  # Words indexed after the word index was built go last
+                    inventory.add_items(rows[250:],alerts=False)
+                    inventory.update_item(Product("P3","phone pro",1.0,1))
+                    inventory.delete_item("P7")
+                    inventory.add_item(Product("P7","phone",1.0,1))
+            for search in ("search_prefix","search_fuzzy","search_ranked"):
+                for query in ("phone","phon","p","phne max","pro phone"):
+                    for limit in (5,50,None):
+                        self.assertEqual([item.id for item in getattr(self.test_inventory,search)(query,limit=limit)],
+                                         [item.id for item in getattr(self.dict_inventory,search)(query,limit=limit)],
+                                         (search,query,limit))
+
+    def test_query(self):
+        """Test for sharded Inventory structured query, merged from every shard"""
+        where=(Field("price")<=1200)|Field("name").contains("phone")
+        self.assertEqual(sorted(str(item) for item in self.test_inventory.query(where)),
+                         sorted(str(item) for item in self.dict_inventory.query(where)))
+        for order_by,descending in [("price",False),("quantity",True)]:
+            self.assertEqual([getattr(item,order_by) for item in self.test_inventory.query(where,order_by,descending,limit=4)],
+                             [getattr(item,order_by) for item in self.dict_inventory.query(where,order_by,descending,limit=4)])
+
+    def test_transaction(self):
+        """Test for sharded Inventory transaction rollback"""
+        with self.assertRaises(RuntimeError):
+            with self.test_inventory.transaction():
+                self.test_inventory.update_item(Product("A1","iPhone 18",300,1))
+                self.test_inventory.add_item(Product("A10","TestName",300,1))
+                raise RuntimeError("abort")
+        self.assertEqual(self.test_inventory.search_by_id("A1").name,"iPhone 16")
+        self.assertFalse(self.test_inventory.product_exists("A10"))
+
+
+    def test_snapshot(self):
+        """Test for sharded Inventory snapshot"""
+        with self.test_inventory.snapshot() as snapshot:
+            self.test_inventory.delete_items(["A1","A2"])
+            self.assertSameProducts(snapshot.values(),self.dict_inventory.items.values())
+            self.assertEqual(snapshot.totals,self.dict_inventory.totals)
+
+    def test_ledger(self):
+        """Test for sharded Inventory movement ledger"""
+        self.test_inventory.close()
+        self.test_inventory=ShardedInventory(shards=3,load_from_backup=True,data_filepath=self.backupFilePath,ledger=True)
+        self.test_inventory.low_stock_listeners=[]
+        self.test_inventory.move_stock("A1",-2,"sale")
+        self.test_inventory.update_items([("A2","Samsung",1200.0,4)])
+        self.test_inventory.delete_items(["A3"])
+        self.assertEqual(self.test_inventory.search_by_id("A1").quantity,10)
+        replayed=self.test_inventory.ledger.replay()
+        self.assertEqual({id:replayed[id] for id in self.test_inventory.items},
+                         {id:item.quantity for id,item in self.test_inventory.items.items()})
+        self.assertEqual(replayed["A3"],0)
+
+
+class TestInventoryService(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.test_inventory=Inventory(load_from_backup=True)
+        self.test_inventory.low_stock_listeners=[]
+        self.server=InventoryServer(self.test_inventory)
+        await self.server.start(port=0)
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def request_all(self, requests):
+        reader,writer=await asyncio.open_connection(*self.server.address)
+        writer.write(b"".join((json.dumps(request)+"\n").encode() for request in requests))
+        await writer.drain()
+        responses=[json.loads(await reader.readline()) for _ in requests]
+        writer.close()
+        await writer.wait_closed()
+        return responses
+
+    async def test_pipelined_requests(self):
+        """Test for pipelined requests answered in order"""
+        responses=await self.request_all([
+            {"op":"get","id":"A1","tag":1},
+            {"op":"add","product":{"id":"Z9","name":"Pixel 9","price":500.0,"quantity":1},"tag":2},
+            {"op":"search","keyword":"pixel","tag":3},
+            {"op":"low_stock","threshold":1,"tag":4},
+            {"op":"report","tag":5},
+        ])
+        self.assertEqual([response["tag"] for response in responses],[1,2,3,4,5])
+        self.assertTrue(all(response["ok"] for response in responses))
+        self.assertEqual(responses[0]["result"]["name"],"iPhone 16")
+        self.assertEqual([product["id"] for product in responses[2]["result"]],["Z9"])
+        self.assertIn("Z9",[product["id"] for product in responses[3]["result"]])
+        self.assertEqual(responses[4]["result"],self.test_inventory.report_summary())
+
+    async def test_bad_requests(self):
+        """Test for errors returned without closing the connection"""
+        responses=await self.request_all([
+            {"op":"fly"},
+            {"op":"update","product":{"id":"NOPE","name":"x","price":1.0,"quantity":1}},
+            {"op":"add","product":{"id":"A1","name":"x","price":1.0}},
+            {"op":"search","keyword":5},
+            {"op":"get","id":["A1"]},
+            {"op":"low_stock","threshold":"2"},
+            {"op":"add","product":[1,2]},
+            {"op":"get","id":"A1"},
+        ])
+        self.assertEqual([response["ok"] for response in responses],[False]*7+[True])
+        self.assertEqual(responses[3]["error"],"keyword must be str")
+        with mock.patch.object(self.test_inventory,"report_summary",side_effect=AttributeError("boom")):
+            responses=await self.request_all([{"op":"report"},{"op":"get","id":"A1"}])
+        self.assertEqual([response["ok"] for response in responses],[False,True])
+
+    async def test_overlong_request(self):
+        """Test for a request line over the limit answered with an error, the pipeline goes on"""
+        responses=await self.request_all([{"op":"search","keyword":"x"*200000,"tag":1},{"op":"get","id":"A1","tag":2}])
+        self.assertEqual([(response["ok"],response.get("tag")) for response in responses],[(False,None),(True,2)])
+        self.assertIn("longer than",responses[0]["error"])
+        reader,writer=await asyncio.open_connection(*self.server.address)
+        writer.write(b"{"*100000)  # Cut short by the client hanging up
+        writer.write_eof()
+        self.assertFalse(json.loads(await reader.readline())["ok"])
+        self.assertEqual(await reader.read(),b"")
+        writer.close()
+        await writer.wait_closed()
+
+    async def test_concurrent_clients(self):
+        """Test for several clients writing at once"""
+        await asyncio.gather(*(self.request_all(
+            [{"op":"add","product":{"id":"C{0}".format(i),"name":"c","price":1.0,"quantity":5}}])
+            for i in range(10)))
+        self.assertEqual(self.test_inventory.report_summary()["products"],16)
+        stats=(await self.request_all([{"op":"stats"}]))[0]["result"]
+        self.assertEqual(stats["add"]["count"],10)
+
+class TestStartup(unittest.TestCase):
+    # Optional or backend-only modules that importing the inventory must not pull in
+    HEAVY_MODULES={"pandas","numpy","pyarrow","sqlite3","multiprocessing","asyncio","tempfile","csv","gzip"}
+    IMPORT_BUDGET_MS=250
+
+    # {module: cumulative microseconds} from python -X importtime in a fresh interpreter
+    def import_times(self,module):
+        output=subprocess.run([sys.executable,"-X","importtime","-c","import "+module],
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True,text=True,check=True).stderr
+        times={}
+        for line in output.splitlines():
+            fields=line.split("|")
+            if len(fields)==3 and fields[1].strip().isdigit():
+                times[fields[2].strip()]=int(fields[1])
+        return times
+
+    def test_import_skips_heavy_modules(self):
+        """Test for lazy imports, the inventory and query modules load no optional dependency"""
+        for module in ("inventory_management_search_optimized","inventory_management_query"):
+            imported={name.split(".")[0] for name in self.import_times(module)}
+            self.assertFalse(imported&self.HEAVY_MODULES,module)
+
+    def test_import_time(self):
+        """Test for startup time, importing the inventory stays within budget"""
+        times=self.import_times("inventory_management_search_optimized")
+        self.assertLess(times["inventory_management_search_optimized"]/1000,self.IMPORT_BUDGET_MS)
+
+
 # Test product class
 suite = unittest.TestLoader().loadTestsFromTestCase(TestProduct)
 unittest.TextTestRunner(verbosity=2,buffer=True).run(suite)
 
+# Test sorted list used by the indexes
+suite = unittest.TestLoader().loadTestsFromTestCase(TestSortedList)
+unittest.TextTestRunner(verbosity=2,buffer=True).run(suite)
+
+# Test stock movement ledger
+suite = unittest.TestLoader().loadTestsFromTestCase(TestMovementLedger)
+unittest.TextTestRunner(verbosity=2,buffer=True).run(suite)
+
 # Test Inventory class
 suite = unittest.TestLoader().loadTestsFromTestCase(TestInventory)
 unittest.TextTestRunner(verbosity=2,buffer=True).run(suite)
+
+# Test SQLite Inventory class
+suite = unittest.TestLoader().loadTestsFromTestCase(TestSqliteInventory)
+unittest.TextTestRunner(verbosity=2,buffer=True).run(suite)
+
+# Test sharded Inventory class
+suite = unittest.TestLoader().loadTestsFromTestCase(TestShardedInventory)
+unittest.TextTestRunner(verbosity=2,buffer=True).run(suite)
+
+# Test the network service
+suite = unittest.TestLoader().loadTestsFromTestCase(TestInventoryService)
+unittest.TextTestRunner(verbosity=2,buffer=True).run(suite)
+
+# Test import time
+suite = unittest.TestLoader().loadTestsFromTestCase(TestStartup)
+unittest.TextTestRunner(verbosity=2,buffer=True).run(suite)